@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(DIRECTORY)
+
+from benchmarks.fake_salesforce import connect_to_fake, SESSION_ID
+from jira2gus.salesforce.async_rest_client import AsyncRestClient
+from jira2gus.salesforce.bulk import LegacyBulkBackend
+from jira2gus.salesforce.rest_client import RestClient
+from jira2gus.salesforce.transport import build_http_session
+
+
+RECORDS = int(os.environ.get("benchmark_records", 2000))
+LATENCY = os.environ.get("benchmark_latency", "0.05")
+CONCURRENCY_LEVELS = [int(level) for level in os.environ.get("benchmark_concurrency", "10,100,500").split(',')]
+ATTACHMENT = b"x" * 16 * 1024
+
+
+def connect(address, pool_size=10):
+    return RestClient(instance=address, session_id=SESSION_ID, http_session=connect_to_fake(build_http_session(pool_size=pool_size)))
+
+
+def run_threaded(address, concurrency, ids):
+    # what the sync client does today: a thread per request in flight
+    client = connect(address, concurrency)
+
+    def migrate(record_id):
+        client.ADM_Work__c.get(record_id)
+        client.chatter_on_object_with_attachment("migrated from Jira", record_id, file_name="notes.txt", file_data=ATTACHMENT)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(migrate, ids))
+
+
+async def run_async(address, concurrency, ids):
+    client = AsyncRestClient(address, SESSION_ID, max_in_flight=concurrency, scheme='http')
+
+    async def migrate(record_id):
+        await client.get('ADM_Work__c', record_id)
+        await client.chatter_on_object_with_attachment("migrated from Jira", record_id, file_name="notes.txt", file_data=ATTACHMENT)
+
+    try:
+        await asyncio.gather(*(migrate(record_id) for record_id in ids))
+    finally:
+        await client.close()
+
+
+def measure(variant, concurrency, address, ids_path):
+    # runs in its own process, ru_maxrss is the peak of the whole process
+    with open(ids_path) as f:
+        ids = json.load(f)
+
+    peak_threads = [threading.active_count()]
+
+    def sample_threads():
+        while True:
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+            time.sleep(0.01)
+
+    threading.Thread(target=sample_threads, daemon=True).start()
+    concurrency = int(concurrency)
+
+    start = time.perf_counter()
+    if variant == 'threaded':
+        run_threaded(address, concurrency, ids)
+    else:
+        asyncio.run(run_async(address, concurrency, ids))
+    seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        'variant': variant,
+        'concurrency': concurrency,
+        'requests': len(ids) * 2,
+        'seconds': round(seconds, 2),
+        'requests_per_second': round(len(ids) * 2 / seconds, 1),
+        # the sampler thread itself is not counted
+        'peak_threads': peak_threads[0] - 1,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+def run():
+    env = dict(os.environ, fake_latency=LATENCY)
+    server = subprocess.Popen([sys.executable, os.path.join(DIRECTORY, "benchmarks", "fake_salesforce.py")], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=env)
+    address = server.stdout.readline().strip()
+    ids_path = os.path.join(DIRECTORY, "benchmarks", "async_client_benchmark_ids.json")
+
+    try:
+        results = LegacyBulkBackend(connect(address)).insert('ADM_Work__c', [{'Subject__c': f"Work {i}", 'ftest__c': f"BENCH-{i}"} for i in range(RECORDS)])
+        with open(ids_path, "w") as f:
+            json.dump([result['id'] for result in results], f)
+
+        results = []
+        for concurrency in CONCURRENCY_LEVELS:
+            for variant in ('threaded', 'async'):
+                output = subprocess.run([sys.executable, __file__, variant, str(concurrency), address, ids_path], stdout=subprocess.PIPE, text=True, check=True).stdout
+                results.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        server.stdin.close()
+        server.wait()
+        if os.path.exists(ids_path):
+            os.remove(ids_path)
+
+    print(json.dumps({'records': RECORDS, 'latency': float(LATENCY), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5:
+        measure(*sys.argv[1:])
+    else:
+        run()
@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(DIRECTORY)
+
+from benchmarks.fake_salesforce import connect_to_fake, SESSION_ID
+from jira2gus.salesforce.rest_client import RestClient
+from jira2gus.salesforce.transport import build_http_session
+
+
+SIZES_MB = [int(size) for size in os.environ.get("benchmark_sizes_mb", "16,64,256").split(",")]
+WORK_ID = 'a07000000000001AAA'
+
+
+def legacy_upload(client, file_path):
+    # the body as it was built before streaming, the whole file and two copies of the body in memory
+    with open(file_path, "rb") as f:
+        file_data = f.read()
+    head = b'--boundary\r\nContent-Disposition: form-data; name="json"\r\n\r\n{}\r\n'
+    body = head + b'--boundary\r\nContent-Disposition: form-data; name="feedItemFileUpload"\r\n\r\n'
+    body += file_data
+    body += b'\r\n--boundary--\r\n'
+    url = client.base_url + f'chatter/feeds/record/{WORK_ID}/feed-items'
+    headers = {'Content-Type': 'multipart/form-data; boundary=boundary', 'Authorization': 'Bearer ' + client.session_id}
+    client.session.post(url, data=body, headers=headers).raise_for_status()
+
+
+def streaming_upload(client, file_path):
+    client.chatter_on_object_with_attachment("attachment", WORK_ID, file_name=os.path.basename(file_path), file_path=file_path)
+
+
+def measure_peak(upload, client, file_path):
+    tracemalloc.start()
+    upload(client, file_path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round(peak / 1024 / 1024, 2)
+
+
+def run():
+    server = subprocess.Popen([sys.executable, os.path.join(DIRECTORY, "benchmarks", "fake_salesforce.py")], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    address = server.stdout.readline().strip()
+    client = RestClient(instance=address, session_id=SESSION_ID, http_session=connect_to_fake(build_http_session()))
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for size in SIZES_MB:
+                file_path = os.path.join(directory, f"synthetic_{size}mb.mov")
+                with open(file_path, "wb") as f:
+                    for _ in range(size):
+                        f.write(os.urandom(1024 * 1024))
+
+                results.append({
+                    'file_size_mb': size,
+                    'legacy_peak_mb': measure_peak(legacy_upload, client, file_path),
+                    'streaming_peak_mb': measure_peak(streaming_upload, client, file_path),
+                })
+                os.remove(file_path)
+    finally:
+        server.stdin.close()
+        server.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(DIRECTORY)
+
+from benchmarks.fake_salesforce import connect_to_fake, SESSION_ID
+from jira2gus.salesforce.bulk import LegacyBulkBackend
+from jira2gus.salesforce.bulk2 import Bulk2Backend
+from jira2gus.salesforce.rest_client import RestClient
+from jira2gus.salesforce.transport import build_http_session
+
+
+RECORDS = int(os.environ.get("benchmark_records", 100000))
+
+
+def synthetic_work_items(count):
+    for i in range(count):
+        yield {
+            'Subject__c': f"Synthetic issue {i}",
+            'Details__c': "Lorem ipsum dolor sit amet, " * 8,
+            'Ftest__c': f"SYN-{i}",
+            'Status__c': 'New',
+            'Story_Points__c': i % 13,
+            'Scrum_Team__c': 'a00000000000001AAA',
+        }
+
+
+def measure(backend):
+    work_items = list(synthetic_work_items(RECORDS))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = backend.insert('ADM_Work__c', work_items)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert all(result['success'] for result in response) and len(response) == RECORDS
+    return {'seconds': round(seconds, 2), 'records_per_second': round(RECORDS / seconds), 'peak_mb': round(peak / 1024 / 1024, 2)}
+
+
+def run():
+    server = subprocess.Popen([sys.executable, os.path.join(DIRECTORY, "benchmarks", "fake_salesforce.py")], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    address = server.stdout.readline().strip()
+    client = RestClient(instance=address, session_id=SESSION_ID, http_session=connect_to_fake(build_http_session()))
+
+    try:
+        results = {
+            'records': RECORDS,
+            'bulk_api_1': measure(LegacyBulkBackend(client)),
+            'bulk_api_2': measure(Bulk2Backend(client)),
+        }
+    finally:
+        server.stdin.close()
+        server.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    run()
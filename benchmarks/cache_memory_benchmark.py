@@ -0,0 +1,115 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(DIRECTORY)
+
+from jira2gus.salesforce.compact_map import CompactMap
+
+
+USERS = int(os.environ.get("benchmark_records", 100000))
+WORKERS = int(os.environ.get("benchmark_workers", 2))
+LOOKUPS = 100000
+VARIANTS = ('dict', 'compact', 'compact_mmap')
+
+
+def iter_users():
+    # what the User lookup table holds: email -> 18 character id
+    for i in range(USERS):
+        yield f"user{i}@example.com", f"005{i:012d}AAA"
+
+
+def get_memory_kb(field):
+    # Rss counts every page a process maps, Pss splits the pages shared by n processes n ways
+    path = "/proc/self/smaps_rollup" if field == 'Pss' else "/proc/self/status"
+    with open(path) as f:
+        for line in f:
+            if line.startswith(f"{field}:" if field == 'Pss' else "VmRSS:"):
+                return int(line.split()[1])
+
+
+def load(variant, path):
+    if variant == 'dict':
+        return dict(iter_users())
+    if variant == 'compact':
+        return CompactMap(iter_users())
+    return CompactMap.open(path)
+
+
+def measure(variant, path):
+    # runs in its own process, next to the other workers of the variant
+    baseline_rss, baseline_pss = get_memory_kb('Rss'), get_memory_kb('Pss')
+    users = load(variant, path)
+
+    # every entry is read once, so all the pages of a mapped file are resident
+    assert sum(1 for _ in users.items()) == USERS
+
+    # measured once all the workers hold their copy, or map the same file
+    print("ready", flush=True)
+    sys.stdin.readline()
+    rss, pss = get_memory_kb('Rss'), get_memory_kb('Pss')
+
+    keys = [f"user{random.randrange(USERS)}@example.com" for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for key in keys:
+        users[key]
+    lookup_ns = (time.perf_counter() - start) / LOOKUPS * 1e9
+
+    print(json.dumps({'variant': variant, 'rss_above_baseline_mb': round((rss - baseline_rss) / 1024, 1), 'pss_above_baseline_mb': round((pss - baseline_pss) / 1024, 1),
+                      'lookup_ns': round(lookup_ns)}), flush=True)
+
+
+def measure_heap(variant, path):
+    tracemalloc.start()
+    users = load(variant, path)
+    heap_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del users
+    return round(heap_bytes / 1024 / 1024, 1)
+
+
+def run_workers(variant, path):
+    workers = [subprocess.Popen([sys.executable, __file__, variant, path], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) for _ in range(WORKERS)]
+    for worker in workers:
+        assert worker.stdout.readline().strip() == "ready"
+    for worker in workers:
+        worker.stdin.write("\n")
+        worker.stdin.flush()
+
+    results = []
+    for worker in workers:
+        results.append(json.loads(worker.stdout.readline()))
+        worker.wait()
+    return results
+
+
+def run():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "User.Email.map")
+        CompactMap(iter_users()).save(path)
+
+        results = []
+        for variant in VARIANTS:
+            workers = run_workers(variant, path)
+            results.append({
+                'variant': variant,
+                'heap_mb': measure_heap(variant, path),
+                'rss_per_worker_mb': workers[0]['rss_above_baseline_mb'],
+                'pss_per_worker_mb': round(sum(worker['pss_above_baseline_mb'] for worker in workers) / len(workers), 1),
+                'lookup_ns': workers[0]['lookup_ns'],
+            })
+
+        print(json.dumps({'users': USERS, 'workers': WORKERS, 'map_file_mb': round(os.path.getsize(path) / 1024 / 1024, 1), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        measure(*sys.argv[1:])
+    else:
+        run()
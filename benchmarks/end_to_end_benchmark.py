@@ -0,0 +1,88 @@
+import json
+import os
+import platform
+import sys
+import time
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(DIRECTORY)
+
+from benchmarks.fake_salesforce import FakeSalesforce, connect_to_fake
+from jira2gus.migration.attachments import Attachment, AttachmentItem, AttachmentMigrator
+from jira2gus.salesforce.gus_client import GusClient
+from jira2gus.salesforce.transport import build_http_session
+
+
+SIZES = [int(size) for size in os.environ.get("benchmark_sizes", "1000,10000,100000").split(",")]
+LATENCY = float(os.environ.get("benchmark_latency", 0))
+FAILURE_RATE = float(os.environ.get("benchmark_failure_rate", 0))
+OUTPUT = os.environ.get("benchmark_output", "end_to_end_benchmark.json")
+
+CLOUD_ID = 'a3m000000000001AAA'
+TEAMS = 100
+USERS = 1000
+ATTACHMENT_SIZE = 4 * 1024
+
+
+def seed_org(fake):
+    teams = fake.seed('ADM_Scrum_Team__c', [{'Name': f"Team {i}", 'Cloud_LU__c': CLOUD_ID} for i in range(TEAMS)])
+    fake.seed('User', [{'Email': f"user{i}@example.com"} for i in range(USERS)])
+    fake.seed('RecordType', [{'Name': name} for name in ('Bug', 'User Story', 'Investigation')])
+    fake.seed('ADM_Impact__c', [{'Name': name} for name in ('Malfunctioning', 'Crash', 'Performance')])
+    fake.seed('ADM_Frequency__c', [{'Name': name} for name in ('Always', 'Often', 'Rarely')])
+    return teams
+
+
+def timed(fake, results, name, action):
+    requests_before = fake.request_count
+    start = time.perf_counter()
+    value = action()
+    results[name] = {'seconds': time.perf_counter() - start, 'requests': fake.request_count - requests_before}
+    return value
+
+
+def run_size(size):
+    fake = FakeSalesforce(latency=LATENCY, failure_rate=FAILURE_RATE).start()
+    results = {}
+
+    try:
+        teams = seed_org(fake)
+        gus_client = timed(fake, results, 'construction', lambda: GusClient(instance=fake.address, user='benchmark@example.com', password='password', cloud_id=CLOUD_ID, http_session=connect_to_fake(build_http_session())))
+
+        work_items = [{'Ftest__c': f"SYN-{i}", 'Subject__c': f"Synthetic issue {i}", 'Scrum_Team__c': teams[i % TEAMS], 'Test_Failure_Status__c': 'Blocking'} for i in range(size)]
+        work_ids = timed(fake, results, 'create_work_items', lambda: gus_client.create_work_items(work_items))
+        timed(fake, results, 'get_existing_keys', lambda: gus_client.get_existing_keys(list(work_ids)))
+
+        sprints = [{'Name': f"Sprint {i}", 'Scrum_Team__c': teams[i % TEAMS], 'Start_Date__c': None, 'End_Date__c': None} for i in range(max(size // 100, 1))]
+        timed(fake, results, 'create_sprints', lambda: gus_client.create_sprints(sprints))
+
+        attachment_items = [AttachmentItem(jira_key, work_id, [Attachment(f"{jira_key}.txt", ATTACHMENT_SIZE, lambda: b'x' * ATTACHMENT_SIZE)])
+                            for jira_key, work_id in list(work_ids.items())[:max(size // 100, 1)]]
+        timed(fake, results, 'upload_attachments', lambda: AttachmentMigrator(gus_client).migrate(attachment_items))
+
+        # one task per work item, so clearing has rows to find and delete besides the feed items
+        fake.seed('ADM_Task__c', [{'Work__c': work_id, 'Subject__c': 'Synthetic task'} for work_id in work_ids.values()])
+        timed(fake, results, 'clear_work_items', lambda: gus_client.clear_work_items(list(work_ids.values())))
+    finally:
+        fake.stop()
+
+    return results
+
+
+def run():
+    report = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        'python': platform.python_version(),
+        'latency': LATENCY,
+        'failure_rate': FAILURE_RATE,
+        'results': {str(size): run_size(size) for size in SIZES},
+    }
+
+    with open(OUTPUT, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,559 @@
+import collections
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests.adapters import HTTPAdapter
+
+
+SESSION_ID = '00D000000000001!FAKESESSION'
+
+ID_PREFIXES = {
+    'User': '005',
+    'ADM_Work__c': 'a07',
+    'ADM_Work__Feed': '0D5',
+    'FeedItem': '0D5',
+    'ContentDocument': '069',
+    'ContentVersion': '068',
+    'ADM_Sprint__c': 'a0l',
+    'ADM_Epic__c': 'a3Q',
+    'ADM_Theme__c': 'a0d',
+    'ADM_Scrum_Team__c': 'a00',
+    'ADM_Product_Tag__c': 'a1a',
+    'ADM_Task__c': 'a0e',
+}
+
+QUERY_PAGE_SIZE = 2000
+FEED_PAGE_SIZE = 25
+DAILY_API_LIMIT = 15000
+
+# a field compared to a value or a list of values, the only conditions jira2gus queries use
+CONDITION = re.compile(r"(?P<field>\w+)\s*(?:(?P<operator>=|!=|>=|<=|>|<)\s*(?P<value>.+)|(?i:in)\s*\((?P<values>.*)\))", re.DOTALL)
+SOQL = re.compile(r"select\s+(?P<fields>.+?)\s+from\s+(?P<table>\w+)(?:\s+where\s+(?P<where>.+))?", re.IGNORECASE | re.DOTALL)
+SOQL_STRING = re.compile(r"'((?:[^'\\]|\\.)*)'")
+
+
+class FakeSalesforce:
+    '''
+    A local stand-in for the salesforce endpoints used by jira2gus, for benchmarks.
+    latency is added to every response, failure_rate answers that share of requests with a 503,
+    throttle_rate with a 403 REQUEST_LIMIT_EXCEEDED and lock_failure_rate fails that share of
+    written records with UNABLE_TO_LOCK_ROW.
+    expire_sessions() makes every issued session id invalid until the next soap login.
+    '''
+
+    def __init__(self, latency=0.0, failure_rate=0.0, throttle_rate=0.0, lock_failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.lock_failure_rate = lock_failure_rate
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.feed_items = {}
+        self.contents = {}
+        self.tables = collections.defaultdict(dict)
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.sessions = {SESSION_ID}
+        self.field_names = collections.defaultdict(dict)
+        self.indexes = {}
+        self.cursors = {}
+        self.routes = [
+            ('POST', r'/services/Soap/c/[^/]+', self.soap_login),
+            ('GET', r'/services/data/v[^/]+/query', self.query),
+            ('GET', r'/services/data/v[^/]+/query/(?P<locator>[^/]+)', self.query_more),
+            ('GET', r'/services/data/v[^/]+/sobjects/(?P<table>[^/]+)/(?P<record_id>[^/]+)', self.get_record),
+            ('GET', r'/services/data/v[^/]+/chatter/users/me', self.chatter_me),
+            ('GET', r'/services/data/v[^/]+/chatter/feeds/(?:news/me|record/(?P<obj>[^/]+))/feed-items', self.get_feed_items),
+            ('POST', r'/services/data/v[^/]+/chatter/feeds/(?:news/me|record/(?P<obj>[^/]+))/feed-items', self.post_feed_item),
+            ('POST', r'/services/data/v[^/]+/composite/sobjects', self.collection_create),
+            ('PATCH', r'/services/data/v[^/]+/composite/sobjects', self.collection_update),
+            ('DELETE', r'/services/data/v[^/]+/composite/sobjects', self.collection_delete),
+            ('POST', r'/services/async/[^/]+/job', self.bulk_create_job),
+            ('POST', r'/services/async/[^/]+/job/(?P<job_id>[^/]+)', self.bulk_close_job),
+            ('POST', r'/services/async/[^/]+/job/(?P<job_id>[^/]+)/batch', self.bulk_add_batch),
+            ('GET', r'/services/async/[^/]+/job/(?P<job_id>[^/]+)/batch/(?P<batch_id>[^/]+)', self.bulk_get_batch),
+            ('GET', r'/services/async/[^/]+/job/(?P<job_id>[^/]+)/batch/(?P<batch_id>[^/]+)/result', self.bulk_get_batch_result),
+            ('POST', r'/services/data/v[^/]+/jobs/ingest', self.ingest_create_job),
+            ('PUT', r'/services/data/v[^/]+/jobs/ingest/(?P<job_id>[^/]+)/batches', self.ingest_upload),
+            ('PATCH', r'/services/data/v[^/]+/jobs/ingest/(?P<job_id>[^/]+)', self.ingest_close_job),
+            ('GET', r'/services/data/v[^/]+/jobs/ingest/(?P<job_id>[^/]+)', self.ingest_get_job),
+            ('GET', r'/services/data/v[^/]+/jobs/ingest/(?P<job_id>[^/]+)/(?P<result_type>successfulResults|failedResults|unprocessedrecords)', self.ingest_get_results),
+        ]
+        self.server = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.build_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def address(self):
+        return f"127.0.0.1:{self.server.server_port}"
+
+    @property
+    def url(self):
+        return f"http://{self.address}"
+
+    def build_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self):
+                fake.dispatch(self, 'GET')
+
+            def do_POST(self):
+                fake.dispatch(self, 'POST')
+
+            def do_PATCH(self):
+                fake.dispatch(self, 'PATCH')
+
+            def do_PUT(self):
+                fake.dispatch(self, 'PUT')
+
+            def do_DELETE(self):
+                fake.dispatch(self, 'DELETE')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def dispatch(self, handler, method):
+        body = read_body(handler)
+        with self.lock:
+            self.request_count += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.failure_rate and random.random() < self.failure_rate:
+            return respond(handler, 503, {'message': 'injected failure'})
+
+        if self.throttle_rate and random.random() < self.throttle_rate:
+            return respond(handler, 403, [{'errorCode': 'REQUEST_LIMIT_EXCEEDED', 'message': 'ConcurrentPerOrgLongTxn Limit exceeded.'}])
+
+        path, _, query = handler.path.partition('?')
+        path = path.rstrip('/')
+        if not path.startswith('/services/Soap/') and not self.is_authorized(handler):
+            return respond(handler, 401, [{'errorCode': 'INVALID_SESSION_ID', 'message': 'Session expired or invalid'}])
+
+        for route_method, pattern, route in self.routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                status, payload, *content_type = route(handler, body, query, **match.groupdict())
+                handler.extra_headers = {'Sforce-Limit-Info': f"api-usage={self.request_count}/{DAILY_API_LIMIT}"}
+                return respond(handler, status, payload, *content_type)
+
+        respond(handler, 404, [{'errorCode': 'NOT_FOUND', 'message': f"{method} {path}"}])
+
+    def is_authorized(self, handler):
+        authorization = handler.headers.get('Authorization', '')
+        session_id = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else handler.headers.get('X-SFDC-Session')
+        with self.lock:
+            return session_id in self.sessions
+
+    def expire_sessions(self):
+        with self.lock:
+            self.sessions.clear()
+
+    def soap_login(self, handler, body, query):
+        with self.lock:
+            session_id = SESSION_ID if not self.sessions else f"00D000000000001!FAKESESSION{next(self.ids)}"
+            self.sessions.add(session_id)
+        payload = f"<soapenv:Envelope><soapenv:Body><loginResponse><result><sessionId>{session_id}</sessionId></result></loginResponse></soapenv:Body></soapenv:Envelope>"
+        return 200, payload, 'text/xml'
+
+    def seed(self, table, records):
+        return [self.apply(table, 'insert', record)['id'] for record in records]
+
+    def get_record(self, handler, body, query, table, record_id):
+        with self.lock:
+            record = self.tables[table].get(record_id)
+        if record is None:
+            return 404, [{'errorCode': 'NOT_FOUND', 'message': 'The requested resource does not exist'}]
+        return 200, dict(record, attributes={'type': table})
+
+    def query(self, handler, body, query):
+        soql = urllib.parse.parse_qs(query)['q'][0]
+        match = SOQL.fullmatch(soql.strip())
+        table = match.group('table')
+        fields = [field.strip() for field in match.group('fields').split(',')]
+        conditions = [parse_condition(condition) for condition in split_conditions(match.group('where') or '')]
+
+        records = [{'attributes': {'type': table}, **{field: record.get(self.get_field_name(table, field)) for field in fields}}
+                   for record in self.find_records(table, conditions)]
+
+        with self.lock:
+            locator = f"01g{next(self.ids):015d}"
+            self.cursors[locator] = records
+        return self.query_page(handler, locator, 0)
+
+    def query_more(self, handler, body, query, locator):
+        locator, _, offset = locator.partition('-')
+        return self.query_page(handler, locator, int(offset))
+
+    def query_page(self, handler, locator, offset):
+        with self.lock:
+            records = self.cursors[locator]
+        page = records[offset:offset + QUERY_PAGE_SIZE]
+        done = offset + QUERY_PAGE_SIZE >= len(records)
+        result = {'totalSize': len(records), 'done': done, 'records': page}
+        if done:
+            with self.lock:
+                self.cursors.pop(locator, None)
+        else:
+            version = handler.path.split('/')[3]
+            result['nextRecordsUrl'] = f"/services/data/{version}/query/{locator}-{offset + QUERY_PAGE_SIZE}"
+        return 200, result
+
+    def find_records(self, table, conditions):
+        with self.lock:
+            candidate_ids = None
+            # the most selective equality or IN condition picks the candidates, the rest are checked per record
+            for field, operator, value in conditions:
+                if operator in ('=', 'in'):
+                    index = self.get_index(table, self.get_field_name(table, field))
+                    ids = set().union(*(index.get(item, ()) for item in (value if operator == 'in' else [value])))
+                    if candidate_ids is None or len(ids) < len(candidate_ids):
+                        candidate_ids = ids
+
+            if candidate_ids is None:
+                candidates = list(self.tables[table].values())
+            else:
+                candidates = [self.tables[table][record_id] for record_id in sorted(candidate_ids)]
+
+            return [record for record in candidates if all(self.matches(table, record, condition) for condition in conditions)]
+
+    def get_index(self, table, field):
+        # built on the first query by the field and kept up to date by apply(), so lookups stay cheap for big tables
+        if (table, field) not in self.indexes:
+            index = collections.defaultdict(set)
+            for record_id, record in self.tables[table].items():
+                index[fold(record.get(field))].add(record_id)
+            self.indexes[(table, field)] = index
+        return self.indexes[(table, field)]
+
+    def matches(self, table, record, condition):
+        field, operator, value = condition
+        actual = fold(record.get(self.get_field_name(table, field)))
+        if operator == 'in':
+            return actual in value
+        if operator == '=':
+            return actual == value
+        if operator == '!=':
+            return actual != value
+        if actual is None or value is None:
+            return False
+        return {'>=': actual >= value, '<=': actual <= value, '>': actual > value, '<': actual < value}[operator]
+
+    def get_field_name(self, table, field):
+        return self.field_names[table].get(field.lower(), field)
+
+    def chatter_me(self, handler, body, query):
+        return 200, {'id': '005000000000001AAA', 'name': 'Fake User'}
+
+    def get_feed_items(self, handler, body, query, obj=None):
+        with self.lock:
+            # feed items deleted as ADM_Work__Feed rows (e.g. by an overwrite) are gone from the feed
+            items = [item for item in self.feed_items.get(obj or 'me', []) if not obj or item['id'] in self.tables['ADM_Work__Feed']]
+
+        # newest first, pageSize items a page
+        params = urllib.parse.parse_qs(query)
+        page_size = int(params.get('pageSize', [FEED_PAGE_SIZE])[0])
+        start = int(params.get('page', [0])[0])
+        next_page_url = f"{handler.path.partition('?')[0]}?page={start + page_size}&pageSize={page_size}" if start + page_size < len(items) else None
+        return 200, {'elements': items[::-1][start:start + page_size], 'nextPageUrl': next_page_url}
+
+    def post_feed_item(self, handler, body, query, obj=None):
+        message, file_data = parse_feed_item(body)
+        attachment = message.get('attachment') or {}
+        if attachment.get('attachmentType') == 'ExistingContent':
+            with self.lock:
+                content = self.contents.get(attachment['contentDocumentId'])
+            if content is None:
+                return 404, [{'errorCode': 'NOT_FOUND', 'message': 'File not found'}]
+        elif file_data is not None:
+            # the file lives on as a content document when its feed item is deleted, like in gus
+            content = {'id': self.new_id('ContentDocument'), 'versionId': self.new_id('ContentVersion'), 'title': attachment.get('title'),
+                       'checksum': hashlib.md5(file_data).hexdigest(), 'fileSize': len(file_data)}
+            with self.lock:
+                self.contents[content['id']] = content
+        else:
+            content = None
+
+        # feed items on a work item are also rows of ADM_Work__Feed, like in gus
+        item_id = self.apply('ADM_Work__Feed', 'insert', {'ParentId': obj})['id'] if obj else self.new_id('FeedItem')
+        item = {'id': item_id, 'parent': {'id': obj}, 'attachment': content}
+        with self.lock:
+            self.feed_items.setdefault(obj or 'me', []).append(item)
+        return 201, item
+
+    def new_id(self, table):
+        return f"{ID_PREFIXES.get(table, 'a00')}{next(self.ids):015d}"
+
+    def apply(self, table, operation, record):
+        record = {key: value for key, value in record.items() if key != 'attributes'}
+        record['LastModifiedDate'] = time.strftime("%Y-%m-%dT%H:%M:%S.000+0000", time.gmtime())
+        if self.lock_failure_rate and random.random() < self.lock_failure_rate:
+            return {'success': False, 'created': False, 'id': None, 'errors': [{'statusCode': 'UNABLE_TO_LOCK_ROW', 'message': 'unable to obtain exclusive access to this record', 'fields': []}]}
+
+        with self.lock:
+            for key in record:
+                self.field_names[table].setdefault(key.lower(), key)
+
+            if operation == 'delete':
+                stored = self.tables[table].pop(record.get('Id'), None)
+                if stored is None:
+                    return {'success': False, 'created': False, 'id': record.get('Id'), 'errors': [{'statusCode': 'ENTITY_IS_DELETED', 'message': 'entity is deleted', 'fields': []}]}
+                self.unindex(table, stored)
+                return {'success': True, 'created': False, 'id': record['Id'], 'errors': []}
+
+            if operation == 'insert' or not record.get('Id'):
+                record['Id'] = self.new_id(table)
+                self.tables[table][record['Id']] = record
+                self.index(table, record)
+                return {'success': True, 'created': True, 'id': record['Id'], 'errors': []}
+
+            stored = self.tables[table].get(record['Id'])
+            if stored is None:
+                return {'success': False, 'created': False, 'id': None, 'errors': [{'statusCode': 'INVALID_CROSS_REFERENCE_KEY', 'message': 'invalid cross reference id', 'fields': []}]}
+
+            self.unindex(table, stored)
+            stored.update(record)
+            self.index(table, stored)
+            return {'success': True, 'created': False, 'id': record['Id'], 'errors': []}
+
+    def index(self, table, record):
+        for (index_table, field), index in self.indexes.items():
+            if index_table == table:
+                index[fold(record.get(field))].add(record['Id'])
+
+    def unindex(self, table, record):
+        for (index_table, field), index in self.indexes.items():
+            if index_table == table:
+                index[fold(record.get(field))].discard(record['Id'])
+
+    def collection_create(self, handler, body, query):
+        records = json.loads(body)['records']
+        return 200, [self.apply(record['attributes']['type'], 'insert', record) for record in records]
+
+    def collection_update(self, handler, body, query):
+        records = json.loads(body)['records']
+        return 200, [self.apply(record['attributes']['type'], 'update', record) for record in records]
+
+    def collection_delete(self, handler, body, query):
+        ids = urllib.parse.parse_qs(query)['ids'][0].split(',')
+        return 200, [self.apply(self.find_table(record_id), 'delete', {'Id': record_id}) for record_id in ids]
+
+    def find_table(self, record_id):
+        with self.lock:
+            for table, records in self.tables.items():
+                if record_id in records:
+                    return table
+        return None
+
+    def bulk_create_job(self, handler, body, query):
+        job = json.loads(body)
+        job.update({'id': f"750{next(self.ids):015d}", 'state': 'Open', 'batches': {}})
+        self.jobs[job['id']] = job
+        return 201, {'id': job['id'], 'state': 'Open', 'object': job['object'], 'operation': job['operation']}
+
+    def bulk_close_job(self, handler, body, query, job_id):
+        self.jobs[job_id]['state'] = json.loads(body)['state']
+        return 200, {'id': job_id, 'state': self.jobs[job_id]['state']}
+
+    def bulk_add_batch(self, handler, body, query, job_id):
+        job = self.jobs[job_id]
+        batch_id = f"751{next(self.ids):015d}"
+        # batches are processed on arrival, so the first status poll already sees them completed
+        job['batches'][batch_id] = [self.apply(job['object'], job['operation'], record) for record in json.loads(body)]
+        return 201, {'id': batch_id, 'jobId': job_id, 'state': 'Queued'}
+
+    def bulk_get_batch(self, handler, body, query, job_id, batch_id):
+        return 200, {'id': batch_id, 'jobId': job_id, 'state': 'Completed'}
+
+    def bulk_get_batch_result(self, handler, body, query, job_id, batch_id):
+        return 200, self.jobs[job_id]['batches'][batch_id]
+
+    def ingest_create_job(self, handler, body, query):
+        job = json.loads(body)
+        job.update({'id': f"750{next(self.ids):015d}", 'state': 'Open', 'csv': b'', 'results': []})
+        self.jobs[job['id']] = job
+        return 200, {key: value for key, value in job.items() if key not in ('csv', 'results')}
+
+    def ingest_upload(self, handler, body, query, job_id):
+        self.jobs[job_id]['csv'] += body
+        return 201, ''
+
+    def ingest_close_job(self, handler, body, query, job_id):
+        job = self.jobs[job_id]
+        for row in csv.DictReader(io.StringIO(job.pop('csv').decode('utf-8'))):
+            # an empty cell keeps the field as it is, #N/A clears it
+            record = {key: None if value == '#N/A' else value for key, value in row.items() if value != ''}
+            job['results'].append((row, self.apply(job['object'], job['operation'], record)))
+        job['state'] = 'JobComplete'
+        return 200, {'id': job_id, 'state': 'UploadComplete'}
+
+    def ingest_get_job(self, handler, body, query, job_id):
+        job = self.jobs[job_id]
+        return 200, {'id': job_id, 'state': job['state'], 'object': job['object'], 'operation': job['operation'], 'numberRecordsProcessed': len(job['results'])}
+
+    def ingest_get_results(self, handler, body, query, job_id, result_type):
+        results = self.jobs[job_id]['results']
+        columns = list(results[0][0]) if results else []
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+
+        if result_type == 'successfulResults':
+            writer.writerow(['sf__Id', 'sf__Created'] + columns)
+            for row, result in results:
+                if result['success']:
+                    writer.writerow([result['id'], 'true' if result['created'] else 'false'] + list(row.values()))
+        elif result_type == 'failedResults':
+            writer.writerow(['sf__Id', 'sf__Error'] + columns)
+            for row, result in results:
+                if not result['success']:
+                    error = result['errors'][0]
+                    writer.writerow([result['id'] or '', f"{error['statusCode']}:{error['message']}:--"] + list(row.values()))
+        else:
+            writer.writerow(columns)
+
+        return 200, buffer.getvalue(), 'text/csv'
+
+
+class PlainHttpAdapter(HTTPAdapter):
+    '''
+    Sends the https urls built by the clients over plain http to the local stand-in.
+    '''
+
+    def send(self, request, **kwargs):
+        request.url = 'http://' + request.url[len('https://'):]
+        return HTTPAdapter.send(self, request, **kwargs)
+
+
+def connect_to_fake(http_session):
+    # keeps the retry policy of the session under test
+    max_retries = http_session.get_adapter('https://').max_retries
+    http_session.mount('https://', PlainHttpAdapter(pool_connections=10, pool_maxsize=100, max_retries=max_retries))
+    return http_session
+
+
+def split_conditions(where):
+    conditions, start, quoted, depth, i = [], 0, False, 0, 0
+    while i < len(where):
+        char = where[i]
+        if quoted:
+            if char == '\\':
+                i += 1
+            elif char == "'":
+                quoted = False
+        elif char == "'":
+            quoted = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0 and where[i:i + 5].lower() == ' and ':
+            conditions.append(where[start:i])
+            start = i + 5
+            i += 4
+        i += 1
+
+    if where.strip():
+        conditions.append(where[start:])
+    return conditions
+
+
+def parse_condition(condition):
+    match = CONDITION.fullmatch(condition.strip())
+    if match.group('values') is not None:
+        return match.group('field'), 'in', {fold(unquote(value)) for value in SOQL_STRING.findall(match.group('values'))}
+    return match.group('field'), match.group('operator'), fold(parse_value(match.group('value').strip()))
+
+
+def parse_value(value):
+    if value.startswith("'"):
+        return unquote(value[1:-1])
+    if value.lower() == 'null':
+        return None
+    return value
+
+
+def unquote(value):
+    return re.sub(r"\\(.)", lambda match: {'n': '\n', 'r': '\r', 't': '\t'}.get(match.group(1), match.group(1)), value)
+
+
+def fold(value):
+    # soql compares strings case insensitively
+    return value.lower() if isinstance(value, str) else value
+
+
+def parse_feed_item(body):
+    # a json feed item, or a multipart one with a json part and a file part
+    if not body.startswith(b'--'):
+        return json.loads(body or b'{}'), None
+
+    boundary = body[:body.index(b'\r\n')]
+    parts = [part.partition(b'\r\n\r\n')[2] for part in body.split(boundary)[1:-1]]
+    return json.loads(parts[0]), parts[1][:-len(b'\r\n')] if len(parts) > 1 else None
+
+
+def read_body(handler):
+    if handler.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int(handler.rfile.readline().strip(), 16)
+            if size == 0:
+                handler.rfile.readline()
+                return b''.join(chunks)
+            chunks.append(handler.rfile.read(size))
+            handler.rfile.readline()
+
+    length = int(handler.headers.get('Content-Length', 0))
+    return handler.rfile.read(length) if length else b''
+
+
+def respond(handler, status, payload, content_type='application/json'):
+    if isinstance(payload, (dict, list)):
+        payload = json.dumps(payload)
+    if isinstance(payload, str):
+        payload = payload.encode()
+
+    handler.send_response(status)
+    handler.send_header('Content-Type', content_type)
+    handler.send_header('Content-Length', str(len(payload)))
+    for name, value in getattr(handler, 'extra_headers', {}).items():
+        handler.send_header(name, value)
+    handler.end_headers()
+    handler.wfile.write(payload)
+
+
+if __name__ == '__main__':
+    # run the stand-in in its own process so it doesn't skew client side measurements
+    fake = FakeSalesforce(latency=float(os.environ.get("fake_latency", 0))).start()
+    print(fake.address, flush=True)
+    sys.stdin.read()
@@ -0,0 +1,62 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = os.environ.get("benchmark_modules", "jira2gus.migration.migrator_setup,jira2gus.migration.migrator,jira2gus.salesforce.gus_client,jira2gus.migration.attachments,jira2gus.salesforce.rest_client").split(',')
+RUNS = int(os.environ.get("benchmark_runs", 5))
+HEAVY_PACKAGES = ('requests', 'simple_salesforce', 'numpy', 'jira', 'aiohttp')
+
+# import time:  self [us] | cumulative | imported package, nested imports are indented by two spaces
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(module):
+    # a fresh interpreter per run, so nothing is already imported
+    code = f"import sys, json; import {module}; print(json.dumps([name for name in {HEAVY_PACKAGES!r} if name in sys.modules]))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=DIRECTORY, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            imports.append((match.group(4), int(match.group(2)), len(match.group(3))))
+
+    # nested imports are listed before their parent, the module's block ends with its own line
+    end = next(i for i, (name, _, _) in enumerate(imports) if name == module)
+    start = max([i + 1 for i, (_, _, indent) in enumerate(imports[:end]) if indent <= imports[end][2]] or [0])
+    block = imports[start:end + 1]
+
+    # the third party packages imported directly by a jira2gus module, with their own imports
+    packages = {}
+    for i, (name, cumulative, indent) in enumerate(block[:-1]):
+        parent = next(parent_name for parent_name, _, parent_indent in block[i + 1:] if parent_indent < indent)
+        root = name.split('.')[0]
+        if parent.startswith('jira2gus') and root != 'jira2gus':
+            packages[root] = packages.get(root, 0) + cumulative
+
+    total = block[-1][1]
+    return total, packages, json.loads(result.stdout)
+
+
+def run():
+    results = []
+    for module in MODULES:
+        runs = [measure(module) for _ in range(RUNS)]
+        packages = runs[-1][1]
+        results.append({
+            'module': module,
+            'import_ms': round(statistics.median(total for total, _, _ in runs) / 1000, 1),
+            'heaviest_imports_ms': {name: round(cumulative / 1000, 1) for name, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:5]},
+            'heavy_packages_loaded': runs[-1][2],
+        })
+
+    print(json.dumps({'runs': RUNS, 'python': sys.version.split()[0], 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    run()
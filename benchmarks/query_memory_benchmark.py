@@ -0,0 +1,78 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(DIRECTORY)
+
+from benchmarks.fake_salesforce import connect_to_fake, SESSION_ID
+from jira2gus.salesforce.bulk import LegacyBulkBackend
+from jira2gus.salesforce.rest_client import RestClient
+from jira2gus.salesforce.transport import build_http_session
+
+
+RECORDS = int(os.environ.get("benchmark_records", 100000))
+LATENCY = os.environ.get("benchmark_latency", "0.02")
+QUERY = "select Email, Id from User"
+VARIANTS = ('query_all', 'streaming', 'streaming_prefetch')
+
+
+def connect(address):
+    return RestClient(instance=address, session_id=SESSION_ID, http_session=connect_to_fake(build_http_session()))
+
+
+def load_users(client, variant):
+    # what populate_gus_cache did with each variant: a dict of email -> id
+    if variant == 'query_all':
+        result = client.query_all(QUERY)
+        return dict([(record['Email'], record['Id']) for record in result['records']])
+
+    return {record['Email']: record['Id'] for record in client.iter_query(QUERY, prefetch=variant == 'streaming_prefetch')}
+
+
+def get_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+
+
+def measure(variant, address):
+    # runs in its own process, ru_maxrss is the peak of the whole process
+    client = connect(address)
+    baseline = get_rss_mb()
+    start = time.perf_counter()
+    users = load_users(client, variant)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(json.dumps({'variant': variant, 'records': len(users), 'seconds': round(seconds, 2), 'peak_rss_above_baseline_mb': round(peak - baseline, 1)}))
+
+
+def run():
+    env = dict(os.environ, fake_latency=LATENCY)
+    server = subprocess.Popen([sys.executable, os.path.join(DIRECTORY, "benchmarks", "fake_salesforce.py")], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=env)
+    address = server.stdout.readline().strip()
+
+    try:
+        LegacyBulkBackend(connect(address)).insert('User', [{'Email': f"user{i}@example.com", 'Name': f"User {i}"} for i in range(RECORDS)])
+
+        results = []
+        for variant in VARIANTS:
+            output = subprocess.run([sys.executable, __file__, variant, address], stdout=subprocess.PIPE, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        server.stdin.close()
+        server.wait()
+
+    print(json.dumps({'records': RECORDS, 'latency': float(LATENCY), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        measure(*sys.argv[1:])
+    else:
+        run()
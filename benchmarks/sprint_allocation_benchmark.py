@@ -0,0 +1,85 @@
+import json
+import os
+import random
+import sys
+import time
+
+from datetime import date, timedelta
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(DIRECTORY)
+
+from jira2gus.salesforce.sprint_index import SprintIntervalIndex, DEFAULT_HORIZON_START, DEFAULT_HORIZON_END
+
+
+TEAMS = int(os.environ.get("benchmark_teams", 200))
+SPRINTS_PER_TEAM = int(os.environ.get("benchmark_sprints_per_team", 50))
+
+
+class LinearScan:
+    # the allocation GusClient did before the interval index, over the same horizon
+    def __init__(self):
+        self.ranges = []
+
+    def allocate(self, start_date, end_date):
+        for date_range in self.ranges:
+            if start_date == date_range[1]:
+                start_date = start_date + timedelta(days=1)
+            if end_date == date_range[0]:
+                end_date = end_date - timedelta(days=1)
+
+            if date_range[0] <= start_date <= date_range[1] or date_range[0] <= end_date <= date_range[1] or start_date <= date_range[0] <= end_date or start_date <= date_range[1] <= end_date:
+                start_date, end_date = self.find_free_slot()
+                break
+
+        self.ranges.append((start_date, end_date))
+        return start_date, end_date
+
+    def find_free_slot(self):
+        years = range(DEFAULT_HORIZON_START.year, DEFAULT_HORIZON_END.year + 1)
+        optional_date_ranges = set((date(year=year, month=month, day=1), date(year=year, month=month, day=28)) for year in years for month in range(1, 13))
+        return min(optional_date_ranges.difference(self.ranges))
+
+
+def generate_sprints():
+    random.seed(0)
+    days = (DEFAULT_HORIZON_END - DEFAULT_HORIZON_START).days
+    sprints = []
+    for team in range(TEAMS):
+        for _ in range(SPRINTS_PER_TEAM):
+            if random.random() < 0.5:
+                sprints.append((team, None, None))
+            else:
+                start_date = DEFAULT_HORIZON_START + timedelta(days=random.randrange(days - 60))
+                sprints.append((team, start_date, start_date + timedelta(days=14)))
+    return sprints
+
+
+def measure(factory, sprints):
+    indexes = {}
+    start = time.perf_counter()
+    for team, start_date, end_date in sprints:
+        index = indexes.get(team)
+        if index is None:
+            index = indexes[team] = factory()
+        if start_date is None:
+            start_date, end_date = index.find_free_slot()
+        index.allocate(start_date, end_date)
+    return len(sprints) / (time.perf_counter() - start)
+
+
+def run():
+    sprints = generate_sprints()
+
+    results = {
+        'teams': TEAMS,
+        'sprints': len(sprints),
+        'linear_scan_allocations_per_second': measure(LinearScan, sprints),
+        'interval_index_allocations_per_second': measure(SprintIntervalIndex, sprints),
+    }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+import time
+
+import requests
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(DIRECTORY)
+
+from benchmarks.fake_salesforce import FakeSalesforce, SESSION_ID
+from jira2gus.salesforce.transport import build_http_session
+
+
+REQUESTS = int(os.environ.get("benchmark_requests", 2000))
+
+
+def measure(get, url, headers):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        get(url, headers=headers).raise_for_status()
+    return REQUESTS / (time.perf_counter() - start)
+
+
+def run():
+    fake = FakeSalesforce().start()
+    url = f"{fake.url}/services/data/v36.0/chatter/feeds/record/a07000000000001AAA/feed-items"
+    headers = {'Authorization': 'Bearer ' + SESSION_ID}
+
+    try:
+        results = {
+            'requests': REQUESTS,
+            'module_requests_per_second': measure(requests.get, url, headers),
+            'pooled_session_requests_per_second': measure(build_http_session().get, url, headers),
+        }
+    finally:
+        fake.stop()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    run()
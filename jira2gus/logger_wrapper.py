@@ -1,28 +1,44 @@
 import logging
+import os
 
-# Switch 3rd party warnings to be redirected to the logging module
-logging.captureWarnings(True)
+FORMAT = '%(asctime)s p%(process)d-t%(thread)d %(levelname)s [%(name)s]: %(message)s'
 
-formatter = logging.Formatter('%(asctime)s p%(process)d-t%(thread)d %(levelname)s [%(name)s]: %(message)s')
+# Log in critical cases only to prevent over logging
+QUIET_LOGGERS = {
+    'botocore': logging.CRITICAL,
+    'boto3': logging.CRITICAL,
+    's3transfer': logging.CRITICAL,
+    'urllib3': logging.ERROR,
+    'requests': logging.ERROR,
+}
 
-log = logging.getLogger()
-log.setLevel(logging.DEBUG)
+configured = False
 
-# Log in critical cases only to prevent over logging
-logging.getLogger('botocore').setLevel(logging.CRITICAL)
-logging.getLogger('boto3').setLevel(logging.CRITICAL)
-logging.getLogger('s3transfer').setLevel(logging.CRITICAL)
-logging.getLogger('urllib3').setLevel(logging.ERROR)
-logging.getLogger('requests').setLevel(logging.ERROR)
 
+def configure_logging(level=None):
+    '''
+    Sets up the root logger, once, from the entry point. Importing jira2gus configures nothing.
+    '''
+    global configured
+    if configured:
+        return
+    configured = True
 
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
-log.addHandler(console_handler)
+    # Switch 3rd party warnings to be redirected to the logging module
+    logging.captureWarnings(True)
 
+    log = logging.getLogger()
+    log.setLevel(level or os.environ.get("log_level", "DEBUG").upper())
 
-def get_logger(name):
-    return logging.getLogger(name)
+    for name, logger_level in QUIET_LOGGERS.items():
+        logging.getLogger(name).setLevel(logger_level)
 
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(FORMAT))
+    log.addHandler(console_handler)
 
-get_logger('loginit').info('inited')
+    get_logger('loginit').info('inited')
+
+
+def get_logger(name):
+    return logging.getLogger(name)
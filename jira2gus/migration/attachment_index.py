@@ -0,0 +1,158 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+
+from jira2gus import logger_wrapper
+from jira2gus.salesforce.multipart import CHUNK_SIZE, is_seekable, iter_file_object
+
+
+log = logger_wrapper.get_logger(__name__)
+
+
+class AttachmentIndex:
+    '''
+    Append-only jsonl index of the files posted to gus per work item: file name, sha256 and md5
+    of the content, and the feed item and content document they were posted as. The files of a
+    work item are stale when they were not checked against its feed for max_age seconds, or
+    since its feed was cleared. Every line is synced before returning, a torn last line is ignored.
+    '''
+
+    def __init__(self, path, max_age=None):
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.files = {}
+        self.checked = {}
+        self.load()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "a")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated line")
+                    record = json.loads(line)
+                except ValueError:
+                    log.warning(f"Ignoring a torn line at the end of attachment index {self.path}")
+                    break
+                self.apply(record)
+                valid_size += len(line)
+
+        # drop the torn tail so new lines are not appended onto it
+        if valid_size < os.path.getsize(self.path):
+            os.truncate(self.path, valid_size)
+
+        log.info(f"Loaded attachment index {self.path}: {sum(len(files) for files in self.files.values())} files of {len(self.files)} work items")
+
+    def apply(self, record):
+        if record['op'] == 'invalidate':
+            for work_id in record['work_ids']:
+                self.checked[work_id] = 0
+        elif record['op'] == 'replace':
+            self.files[record['work_id']] = record['files']
+            self.checked[record['work_id']] = record['time']
+        else:
+            files = self.files.setdefault(record['work_id'], [])
+            for file in record['files']:
+                files[:] = [known for known in files if not is_same_file(known, file)] + [file]
+
+    def is_fresh(self, work_id):
+        checked = self.checked.get(work_id)
+        return bool(checked) and (self.max_age is None or time.time() - checked < self.max_age)
+
+    def has_file_name(self, work_id, file_name):
+        return any(file['file_name'] == file_name for file in self.files.get(work_id, ()))
+
+    def get_files(self, work_id):
+        return list(self.files.get(work_id, ()))
+
+    def find(self, work_id, file_name, sha256, md5):
+        # files read back from the feed only have the md5 checksum gus keeps
+        for file in self.files.get(work_id, ()):
+            if file['file_name'] == file_name and (file['sha256'] == sha256 if file.get('sha256') else file.get('md5') == md5):
+                return file
+        return None
+
+    def record(self, work_id, file):
+        self.write({'op': 'add', 'work_id': work_id, 'files': [file]})
+
+    def replace(self, work_id, files):
+        self.write({'op': 'replace', 'work_id': work_id, 'files': files, 'time': time.time()})
+
+    def invalidate(self, work_ids):
+        if work_ids:
+            self.write({'op': 'invalidate', 'work_ids': list(work_ids)})
+
+    def write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.apply(record)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class ContentHash:
+    '''
+    sha256 and md5 of a file, updated chunk by chunk as it is read.
+    '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.sha256 = hashlib.sha256()
+        self.md5 = hashlib.md5()
+
+    def update(self, chunk):
+        self.sha256.update(chunk)
+        self.md5.update(chunk)
+
+    def hexdigests(self):
+        return self.sha256.hexdigest(), self.md5.hexdigest()
+
+    def hash(self, data):
+        # bytes and seekable files are hashed at once and returned as they are, anything else
+        # is returned as chunks that are hashed while the upload reads them
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self.update(data)
+            return data
+        if is_seekable(data):
+            position = data.tell()
+            for chunk in iter_file_object(data, CHUNK_SIZE):
+                self.update(chunk)
+            data.seek(position)
+            return data
+        return self.iter_hashed(iter_file_object(data, CHUNK_SIZE) if hasattr(data, 'read') else data)
+
+    def hash_all(self, data):
+        hashed = self.hash(data)
+        if hashed is not data:
+            collections.deque(hashed, maxlen=0)
+
+    def iter_hashed(self, chunks):
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+
+def is_same_file(file, other):
+    return file['file_name'] == other['file_name'] and file.get('md5') == other.get('md5')
+
+
+def get_feed_file(feed_item):
+    # the file of a feed item, under attachment up to api v31 and capabilities.content after
+    return feed_item.get('attachment') or (feed_item.get('capabilities') or {}).get('content')
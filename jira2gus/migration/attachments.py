@@ -0,0 +1,175 @@
+import collections
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from jira2gus import logger_wrapper
+from jira2gus.migration.attachment_index import ContentHash, get_feed_file
+from jira2gus.salesforce.errors import SalesforceMalformedRequest, SalesforceRefusedRequest, SalesforceResourceNotFound
+from jira2gus.salesforce.telemetry import in_context
+
+
+log = logger_wrapper.get_logger(__name__)
+
+# download() returns the file content as bytes, a binary file object or an iterator of chunks,
+# it is called again for every upload attempt
+Attachment = collections.namedtuple('Attachment', ['file_name', 'size', 'download'])
+
+AttachmentItem = collections.namedtuple('AttachmentItem', ['jira_key', 'work_id', 'attachments'])
+
+# skipped are the files already on the work item feed, or linked again from an earlier upload
+AttachmentResult = collections.namedtuple('AttachmentResult', ['jira_key', 'work_id', 'uploaded', 'failed', 'skipped'])
+
+# errors that will fail the same way when the upload is retried
+PERMANENT_ERRORS = (SalesforceMalformedRequest, SalesforceRefusedRequest, SalesforceResourceNotFound)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_IN_FLIGHT_BYTES = 256 * 1024 * 1024
+
+
+class ByteBudget:
+    '''
+    Caps the number of attachment bytes being transferred at once.
+    A single attachment bigger than the budget is let through alone.
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            while self.in_flight > 0 and self.in_flight + size > self.max_bytes:
+                self.condition.wait()
+            self.in_flight += size
+
+    def release(self, size):
+        with self.condition:
+            self.in_flight -= size
+            self.condition.notify_all()
+
+
+class AttachmentMigrator:
+
+    def __init__(self, gus_client, concurrency=DEFAULT_CONCURRENCY, max_in_flight_bytes=DEFAULT_MAX_IN_FLIGHT_BYTES, retries=3, retry_delay=2, message="attachment migrated from Jira", index=None):
+        self.gus_client = gus_client
+        self.concurrency = concurrency
+        self.budget = ByteBudget(max_in_flight_bytes)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.message = message
+        self.index = index
+
+    def migrate(self, items):
+        # work items run in parallel, the attachments of one work item are uploaded in order
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='attachments') as executor:
+            futures = [executor.submit(in_context(self.migrate_item), item) for item in items]
+            return [future.result() for future in futures]
+
+    def migrate_item(self, item):
+        uploaded, failed, skipped = [], [], []
+        for attachment in item.attachments:
+            try:
+                if self.post(item.work_id, attachment):
+                    uploaded.append(attachment.file_name)
+                else:
+                    skipped.append(attachment.file_name)
+            except Exception:
+                log.exception(f"Error while migrating attachment {attachment.file_name} of {item.jira_key} to {item.work_id}")
+                failed.append(attachment.file_name)
+
+        return AttachmentResult(item.jira_key, item.work_id, uploaded, failed, skipped)
+
+    def post(self, work_id, attachment):
+        # returns False when nothing had to be uploaded
+        if self.index is None:
+            self.upload(work_id, attachment)
+            return True
+
+        if not self.index.is_fresh(work_id):
+            self.reconcile(work_id)
+
+        # only a file name the work item already has is worth reading twice, to compare contents
+        if not self.index.has_file_name(work_id, attachment.file_name):
+            content_hash = ContentHash()
+            self.record(work_id, attachment, content_hash, self.upload(work_id, attachment, content_hash))
+            return True
+
+        # the download is hashed chunk by chunk as it streams in, it is not held whole
+        content_hash = ContentHash()
+        content_hash.hash_all(attachment.download())
+        sha256, md5 = content_hash.hexdigests()
+        file = self.index.find(work_id, attachment.file_name, sha256, md5)
+
+        if file and file['feed_item_id']:
+            log.info(f"Skipping attachment {attachment.file_name} of {work_id}, it is already on feed item {file['feed_item_id']}")
+            if not file.get('sha256'):
+                self.index.record(work_id, dict(file, sha256=sha256))
+            return False
+
+        if file and file.get('content_id'):
+            try:
+                result = self.gus_client.create_chatter_file_link(self.message, work_id, file['content_id'])
+            except PERMANENT_ERRORS:
+                log.warning(f"File {file['content_id']} of {attachment.file_name} is gone from gus, uploading it again")
+            else:
+                log.info(f"Linked attachment {attachment.file_name} of {work_id} to its earlier upload {file['content_id']}")
+                self.record(work_id, attachment, content_hash, result)
+                return False
+
+        self.record(work_id, attachment, content_hash, self.upload(work_id, attachment))
+        return True
+
+    def reconcile(self, work_id):
+        # the index is rebuilt from the files on the work item feed. A feed item deleted since
+        # (e.g. by an overwrite) keeps its content document, so the file can be linked again
+        feed_files = []
+        for feed_item in self.gus_client.iter_work_item_feed(work_id):
+            file = get_feed_file(feed_item)
+            if file:
+                feed_files.append(to_index_file(file.get('title'), None, file.get('checksum'), feed_item))
+
+        known_files = {file['feed_item_id']: file for file in self.index.get_files(work_id) if file['feed_item_id']}
+        feed_item_ids = {file['feed_item_id'] for file in feed_files}
+
+        files = [dict(file, sha256=known_files[file['feed_item_id']].get('sha256')) if file['feed_item_id'] in known_files else file for file in feed_files]
+        files += [dict(file, feed_item_id=None) for file in self.index.get_files(work_id) if file['feed_item_id'] not in feed_item_ids and file.get('content_id')]
+        self.index.replace(work_id, files)
+
+    def record(self, work_id, attachment, content_hash, result):
+        sha256, md5 = content_hash.hexdigests()
+        self.index.record(work_id, to_index_file(attachment.file_name, sha256, md5, result))
+
+    def invalidate(self, work_ids):
+        # the feeds of these work items were cleared, they are read again before the next upload
+        if self.index is not None:
+            self.index.invalidate(work_ids)
+
+    def upload(self, work_id, attachment, content_hash=None):
+        # with a content_hash the file is hashed while it is sent
+        size = attachment.size or 0
+        self.budget.acquire(size)
+        try:
+            for attempt in range(1, self.retries + 1):
+                file_data = attachment.download()
+                if content_hash is not None:
+                    content_hash.reset()
+                    file_data = content_hash.hash(file_data)
+                try:
+                    return self.gus_client.create_chatter_attachment(self.message, work_id, file_name=attachment.file_name, file_data=file_data, file_size=attachment.size)
+                except PERMANENT_ERRORS:
+                    raise
+                except Exception:
+                    if attempt == self.retries:
+                        raise
+                    log.warning(f"Upload of {attachment.file_name} to {work_id} failed, retrying ({attempt}/{self.retries})")
+                    time.sleep(self.retry_delay * attempt)
+        finally:
+            self.budget.release(size)
+
+
+def to_index_file(file_name, sha256, md5, feed_item):
+    file = get_feed_file(feed_item) or {}
+    return {'file_name': file_name, 'sha256': sha256, 'md5': md5, 'feed_item_id': feed_item.get('id'), 'content_id': file.get('id'), 'version_id': file.get('versionId')}
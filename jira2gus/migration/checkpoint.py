@@ -0,0 +1,93 @@
+import json
+import os
+import re
+import threading
+
+from jira2gus import logger_wrapper
+
+
+log = logger_wrapper.get_logger(__name__)
+
+PHASE_CLEARED = 'cleared'
+PHASE_WORK_ITEMS = 'work_items'
+PHASE_THEMES = 'themes'
+PHASE_ATTACHMENTS = 'attachments'
+
+
+class CheckpointJournal:
+    '''
+    Append-only jsonl log of the phases completed per jira key during one migration.
+    Every record() is one line, flushed and synced before returning, so a run that dies
+    loses at most the batch it was working on. A torn last line is ignored on load.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.load()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "a")
+
+    @classmethod
+    def open(cls, directory, name):
+        return cls(os.path.join(directory, re.sub(r'[^A-Za-z0-9_.-]', '_', name) + ".jsonl"))
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated line")
+                    record = json.loads(line)
+                except ValueError:
+                    log.warning(f"Ignoring a torn line at the end of checkpoint journal {self.path}")
+                    break
+                self.phases.setdefault(record['phase'], {}).update(record['entries'])
+                valid_size += len(line)
+
+        # drop the torn tail so new lines are not appended onto it
+        if valid_size < os.path.getsize(self.path):
+            os.truncate(self.path, valid_size)
+
+        log.info(f"Resuming from checkpoint journal {self.path}: " + ", ".join(f"{phase} {len(entries)}" for phase, entries in self.phases.items()))
+
+    def is_done(self, phase, key):
+        return key in self.phases.get(phase, ())
+
+    def get(self, phase, key, default=None):
+        return self.phases.get(phase, {}).get(key, default)
+
+    def get_entries(self, phase):
+        return dict(self.phases.get(phase, {}))
+
+    def pending(self, phase, keys):
+        done = self.phases.get(phase, ())
+        return [key for key in keys if key not in done]
+
+    def record(self, phase, entries):
+        # entries is a dict of key -> value (e.g. jira key -> work id) or plain keys
+        if not isinstance(entries, dict):
+            entries = {key: True for key in entries}
+        if not entries:
+            return
+
+        with self.lock:
+            self.file.write(json.dumps({'phase': phase, 'entries': entries}) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.phases.setdefault(phase, {}).update(entries)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def complete(self):
+        # a finished migration starts from scratch next time
+        self.close()
+        os.remove(self.path)
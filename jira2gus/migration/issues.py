@@ -0,0 +1,157 @@
+import collections
+import functools
+import json
+import math
+import os
+import re
+import time
+
+from jira2gus.migration.attachments import Attachment
+from jira2gus.salesforce.multipart import CHUNK_SIZE
+
+DEFAULT_PAGE_SIZE = 100
+ISSUE_FIELDS = 'summary,description,assignee,issuetype'
+
+MAPPING_FILE = 'mapping.json'
+
+# what a migration without a mapping key migrates, and the keys a mapping file leaves out
+DEFAULT_MAPPING = {
+    'fields': {'Subject__c': 'summary', 'Details__c': 'description'},
+    'record_types': {'Bug': 'Bug'},
+    'default_record_type': 'User Story',
+    'assignee_field': 'assignee',
+    'epic_field': None,
+    'theme_field': None,
+}
+
+# a mapped issue: its work item and the epic name, theme names and attachments migrated with it
+MappedIssue = collections.namedtuple('MappedIssue', ['work_item', 'epic', 'themes', 'attachments'])
+
+SUBJECT_MAX_LENGTH = 255
+
+# issues updated this long before a watermark are fetched again, for clock skew between hosts
+DEFAULT_DELTA_OVERLAP_SECONDS = 600
+
+ORDER_BY = re.compile(r'(?:^|\s+)order\s+by\s+', re.IGNORECASE)
+
+
+class JiraIssueSource:
+    '''
+    The issues of a jql query, one page per search request, so no more than a page is held here.
+    '''
+
+    def __init__(self, jira_client, page_size=DEFAULT_PAGE_SIZE, fields=ISSUE_FIELDS):
+        self.jira_client = jira_client
+        self.page_size = page_size
+        self.fields = fields
+
+    def iter_pages(self, jql, fields=None):
+        start = 0
+        while True:
+            issues = self.jira_client.search_issues(jql, startAt=start, maxResults=self.page_size, fields=fields or self.fields)
+            if len(issues) > 0:
+                yield list(issues)
+
+            start += len(issues)
+            if len(issues) == 0 or start >= issues.total:
+                return
+
+
+class IssueMapping:
+    '''
+    The jira fields a migration reads into the work item fields, from `[directory]/[mapping_key]/mapping.json`:
+    fields (work item field -> jira field, dotted for a nested value like `priority.name`), record_types
+    (jira issue type -> gus record type), default_record_type, assignee_field, epic_field (the epic
+    link, its value is the epic name) and theme_field (a list of names, e.g. `labels`, each one a theme).
+    Keys the file leaves out keep the value of defaults, then of DEFAULT_MAPPING.
+    '''
+
+    def __init__(self, config=None):
+        config = dict(DEFAULT_MAPPING, **(config or {}))
+        self.fields = config['fields']
+        self.record_types = config['record_types']
+        self.default_record_type = config['default_record_type']
+        self.assignee_field = config['assignee_field']
+        self.epic_field = config['epic_field']
+        self.theme_field = config['theme_field']
+
+    @classmethod
+    def load(cls, directory, mapping_key, defaults=None):
+        path = os.path.join(directory, mapping_key, MAPPING_FILE)
+        if not os.path.isfile(path):
+            raise ValueError(f"No mapping configuration for mapping key {mapping_key}, expected {path}")
+
+        with open(path) as f:
+            return cls(dict(defaults or {}, **json.load(f)))
+
+    def get_jira_fields(self, attachments=False):
+        jira_fields = list(self.fields.values()) + [self.epic_field, self.theme_field, 'attachment' if attachments else None]
+        fields = {jira_field.split('.')[0] for jira_field in jira_fields if jira_field}
+        fields.update(('issuetype', self.assignee_field))
+        return ','.join(sorted(fields))
+
+    def get_record_type(self, issue):
+        return self.record_types.get(getattr(issue.fields.issuetype, 'name', None), self.default_record_type)
+
+
+class IssueMapper:
+    '''
+    Maps a jira issue to the ADM_Work__c fields, epic and themes of an IssueMapping. Unknown jira
+    users fall back to default_assignee, fields without a value are left out.
+    '''
+
+    def __init__(self, gus_client, default_assignee=None, default_build=None):
+        self.gus_client = gus_client
+        self.default_assignee = default_assignee
+        self.default_build = default_build
+
+    def prepare(self, issues, mapping):
+        # the assignees of a page are resolved in a few queries instead of one lookup each
+        emails = [get_assignee_email(issue, mapping.assignee_field) for issue in issues]
+        self.gus_client.prefetch_user_ids([email for email in emails if email])
+
+    def map(self, issue, product_tag_record, mapping):
+        assignee_email = get_assignee_email(issue, mapping.assignee_field)
+
+        work_item = {gus_field: get_field_value(issue, jira_field) for gus_field, jira_field in mapping.fields.items()}
+        work_item.update({
+            'Ftest__c': issue.key,
+            'Subject__c': (work_item.get('Subject__c') or issue.key)[:SUBJECT_MAX_LENGTH],
+            'Product_Tag__c': product_tag_record['Id'],
+            'Scrum_Team__c': product_tag_record['Team__c'],
+            'RecordTypeId': self.gus_client.get_record_type_id(mapping.get_record_type(issue)),
+            'Assignee__c': (self.gus_client.get_user_id(assignee_email) if assignee_email else None) or self.default_assignee,
+            'Found_in_Build__c': self.default_build,
+        })
+
+        # an empty field would blank the value an existing work item has in gus
+        work_item = {field: value for field, value in work_item.items() if value not in (None, '')}
+
+        epic = get_field_value(issue, mapping.epic_field) if mapping.epic_field else None
+        themes = get_field_value(issue, mapping.theme_field) if mapping.theme_field else None
+        if isinstance(themes, str):
+            themes = [themes]
+        # downloaded as a stream of chunks for every upload attempt, get() would read the whole file
+        attachments = [Attachment(attachment.filename, attachment.size, functools.partial(attachment.iter_content, CHUNK_SIZE))
+                       for attachment in getattr(issue.fields, 'attachment', None) or ()]
+        return MappedIssue(work_item, epic or None, [theme for theme in themes or () if theme], attachments)
+
+
+def get_field_value(issue, jira_field):
+    value = issue.fields
+    for name in jira_field.split('.'):
+        value = getattr(value, name, None)
+    return value
+
+
+def get_assignee_email(issue, assignee_field='assignee'):
+    assignee = getattr(issue.fields, assignee_field, None)
+    return getattr(assignee, 'emailAddress', None)
+
+
+def build_delta_query(jql, since, overlap=DEFAULT_DELTA_OVERLAP_SECONDS):
+    # a relative date, jql reads absolute ones in the timezone of the jira user
+    minutes = math.ceil((time.time() - since + overlap) / 60)
+    query, *order_by = ORDER_BY.split(jql, maxsplit=1)
+    delta_query = f"({query}) AND updated >= -{minutes}m" if query.strip() else f"updated >= -{minutes}m"
+    return f"{delta_query} ORDER BY {order_by[0]}" if order_by else delta_query
@@ -0,0 +1,80 @@
+import collections
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from jira2gus import logger_wrapper
+from jira2gus.salesforce.telemetry import in_context
+
+
+log = logger_wrapper.get_logger(__name__)
+
+# one row of a job_key csv, a single migration
+JobRow = collections.namedtuple('JobRow', ['row_number', 'product_tag', 'jira_query', 'mapping_key', 'overwrite'])
+
+JobResult = collections.namedtuple('JobResult', ['row_number', 'product_tag', 'team_id', 'succeeded', 'seconds', 'error'])
+
+DEFAULT_JOB_CONCURRENCY = 4
+
+
+class JobScheduler:
+    '''
+    Runs the rows of a multi migration job in parallel threads sharing one migrator,
+    so the gus session, connection pool and lookup caches are shared as well.
+    Rows of the same scrum team run one after the other so sprint allocation does not race.
+    '''
+
+    def __init__(self, migrator, concurrency=DEFAULT_JOB_CONCURRENCY):
+        self.migrator = migrator
+        self.gus_client = migrator.gus_client
+        self.concurrency = concurrency
+
+    def run(self, rows):
+        log.info(f"Starting a job of {len(rows)} migrations with concurrency {self.concurrency}")
+
+        # loaded once here instead of by whichever row gets to a lookup first
+        self.gus_client.warm_lookup_tables()
+
+        team_rows, results = self.group_by_team(rows)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='jobs') as executor:
+            futures = [executor.submit(in_context(self.run_team_rows), team_id, rows) for team_id, rows in team_rows.items()]
+            for future in futures:
+                results.extend(future.result())
+
+        results.sort(key=lambda result: result.row_number)
+
+        failed = [result for result in results if not result.succeeded]
+        log.info(f"Job finished, {len(results) - len(failed)} migrations succeeded, {len(failed)} failed")
+        return results
+
+    def group_by_team(self, rows):
+        team_rows = collections.defaultdict(list)
+        results = []
+
+        product_tag_teams = self.gus_client.get_product_tag_teams(row.product_tag for row in rows)
+
+        for row in rows:
+            team_id = product_tag_teams.get(row.product_tag)
+            if team_id is None:
+                log.error(f"Product tag {row.product_tag} (row {row.row_number}) was not found in gus")
+                results.append(JobResult(row.row_number, row.product_tag, None, False, 0, "product tag not found"))
+                continue
+
+            team_rows[team_id].append(row)
+
+        return team_rows, results
+
+    def run_team_rows(self, team_id, rows):
+        return [self.run_row(team_id, row) for row in rows]
+
+    def run_row(self, team_id, row):
+        start = time.perf_counter()
+        try:
+            succeeded = self.migrator.run(row.product_tag, jira_query=row.jira_query, mapping_key=row.mapping_key, overwrite=row.overwrite)
+            error = None if succeeded else "migration failed, see the log"
+        except Exception as e:
+            log.exception(f"Error while running row {row.row_number} of product tag {row.product_tag}")
+            succeeded, error = False, str(e)
+
+        return JobResult(row.row_number, row.product_tag, team_id, succeeded, time.perf_counter() - start, error)
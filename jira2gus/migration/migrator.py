@@ -1,25 +1,309 @@
-import math
+import time
 
-import numpy
+from datetime import datetime
 
 from jira2gus import logger_wrapper
+from jira2gus.migration.checkpoint import CheckpointJournal, PHASE_CLEARED, PHASE_WORK_ITEMS, PHASE_THEMES, PHASE_ATTACHMENTS
+from jira2gus.migration.attachments import AttachmentItem
+from jira2gus.migration.issues import IssueMapping, build_delta_query, DEFAULT_DELTA_OVERLAP_SECONDS
+from jira2gus.migration.pipeline import Pipeline, Stage, DEFAULT_QUEUE_DEPTH
 
 
 log = logger_wrapper.get_logger(__name__)
 
+# work items per bulk call of the load stage, jira pages are regrouped to this size
+DEFAULT_LOAD_BATCH_SIZE = 2000
+
+# sent with every changed work item of a delta migration, but not compared
+DELTA_KEY_FIELDS = ('Id', 'Ftest__c')
+
+# the status of a created work item until its attachments are migrated, existing ones keep theirs
+NEW_WORK_ITEM_STATUS = 'Blocking'
+
+DEFAULT_MAPPING_DIR = 'mapping'
+
 
 class Migrator:
 
-    def __init__(self, gus_client):
+    def __init__(self, gus_client, attachment_migrator=None,
+                 checkpoint_dir=None, telemetry=None, telemetry_output=None,
+                 issue_source=None, issue_mapper=None, mapping_dir=DEFAULT_MAPPING_DIR, mapping_defaults=None,
+                 queue_depth=DEFAULT_QUEUE_DEPTH, load_batch_size=DEFAULT_LOAD_BATCH_SIZE,
+                 watermarks=None, delta_overlap=DEFAULT_DELTA_OVERLAP_SECONDS):
         self.gus_client = gus_client
+        self.attachment_migrator = attachment_migrator
+        self.checkpoint_dir = checkpoint_dir
+        self.telemetry = telemetry
+        self.telemetry_output = telemetry_output
+        self.issue_source = issue_source
+        self.issue_mapper = issue_mapper
+        self.queue_depth = queue_depth
+        self.load_batch_size = load_batch_size
+        self.watermarks = watermarks
+        self.delta_overlap = delta_overlap
+        self.mapping_dir = mapping_dir
+        self.mapping_defaults = mapping_defaults
 
-    def run(self, product_tag):
-        log.info("Starting to migrate product_tag {product_tag} with issues from jira query {jira_query}")
+    def run(self, product_tag, jira_query=None, mapping_key=None, overwrite=False):
+        log.info(f"Starting to migrate product_tag {product_tag} with issues from jira query {jira_query} and mapping {mapping_key}, overwrite {overwrite}")
+        journal = self.open_journal(product_tag)
+        started = time.time()
+        loaded_all = True
 
         try:
+            mapping = self.get_mapping(mapping_key)
             product_tag_record = self.gus_client.get_product_tag_record(product_tag)
             log.info("Successfully get teams from gus")
             log.info(product_tag_record)
 
+            if jira_query and self.issue_source is not None:
+                # an overwrite migrates the whole query again, whatever changed since the watermark
+                query = jira_query if overwrite else self.get_delta_query(product_tag, jira_query)
+                stats = self.migrate_issues(query, product_tag_record, mapping, journal, overwrite)
+                loaded_all = stats['load']['records_out'] == stats['source']['records_out']
+
         except Exception:
-            log.exception("Error while getting teams from gus")
+            log.exception(f"Error while migrating product_tag {product_tag}")
+            if journal:
+                journal.close()
+            self.export_telemetry()
+            return False
+
+        # the journal of a migration with issues that failed to load is kept for the next run
+        if journal and loaded_all:
+            journal.complete()
+        elif journal:
+            journal.close()
+        if self.watermarks is not None and jira_query and self.issue_source is not None:
+            # issues that failed to load are kept in the next delta by not moving the watermark
+            if loaded_all:
+                self.watermarks.set(product_tag, jira_query, started)
+            else:
+                log.warning(f"Some issues of {product_tag} failed to load, the next delta migration starts from the previous watermark")
+        self.export_telemetry()
+        return True
+
+    def get_mapping(self, mapping_key):
+        if not mapping_key:
+            return IssueMapping(self.mapping_defaults)
+        return IssueMapping.load(self.mapping_dir, mapping_key, self.mapping_defaults)
+
+    def get_delta_query(self, product_tag, jira_query):
+        since = self.watermarks.get(product_tag, jira_query) if self.watermarks is not None else None
+        if since is None:
+            return jira_query
+
+        log.info(f"Migrating the issues updated since the last migration of {product_tag} at {datetime.fromtimestamp(since):%Y-%m-%d %H:%M:%S}")
+        return build_delta_query(jira_query, since, self.delta_overlap)
+
+    def migrate_issues(self, jira_query, product_tag_record, mapping, journal=None, overwrite=False):
+        # jira pages, mapped issues and bulk batches flow through bounded queues, so fetching,
+        # mapping and loading overlap and memory depends on the queue depth, not the query size
+        pipeline = Pipeline([
+            Stage('transform', lambda issues: self.transform_issues(issues, product_tag_record, mapping)),
+            Stage('load', lambda mapped_issues: self.load_issues(mapped_issues, product_tag_record, journal, overwrite), batch_size=self.load_batch_size),
+        ], queue_depth=self.queue_depth)
+
+        stats = pipeline.run(self.issue_source.iter_pages(jira_query, mapping.get_jira_fields(attachments=self.attachment_migrator is not None)))
+
+        log.info(f"Migrated {stats['load']['records_out']} of {stats['source']['records_out']} issues in {stats['seconds']}s")
+        for name in ('source', 'transform', 'load'):
+            stage_stats = stats[name]
+            log.info(f"Stage {name}: {stage_stats['records_out']} records, {stage_stats['records_per_second']}/s, busy {stage_stats['busy_seconds']:.1f}s, waiting on the next stage {stage_stats['blocked_seconds']:.1f}s")
+        return stats
+
+    def transform_issues(self, issues, product_tag_record, mapping):
+        self.issue_mapper.prepare(issues, mapping)
+        return [self.issue_mapper.map(issue, product_tag_record, mapping) for issue in issues]
+
+    def load_issues(self, mapped_issues, product_tag_record, journal=None, overwrite=False):
+        # the phases of a batch in order: epics, clearing, work items, themes, attachments
+        self.set_epics(mapped_issues, product_tag_record)
+
+        # issues migrated before are updated in place instead of duplicated
+        existing_work_items, _ = self.gus_client.get_existing_work_items([mapped_issue.work_item['Ftest__c'] for mapped_issue in mapped_issues])
+        work_ids = self.load_work_items([mapped_issue.work_item for mapped_issue in mapped_issues], existing_work_items, journal, overwrite)
+
+        self.assign_issue_themes(mapped_issues, work_ids, journal, overwrite)
+
+        if self.attachment_migrator is not None:
+            self.migrate_attachments(self.get_attachment_items(mapped_issues, work_ids, existing_work_items, overwrite), journal)
+
+        return list(work_ids.values())
+
+    def get_attachment_items(self, mapped_issues, work_ids, existing_work_items, overwrite=False):
+        # created and cleared work items, and existing ones whose attachments did not all migrate yet.
+        # Work items without attachments are included too, so they are marked as done
+        attachment_items = []
+        for mapped_issue in mapped_issues:
+            jira_key = mapped_issue.work_item['Ftest__c']
+            status = existing_work_items[jira_key]['Test_Failure_Status__c'] if jira_key in existing_work_items and not overwrite else NEW_WORK_ITEM_STATUS
+            if jira_key in work_ids and status == NEW_WORK_ITEM_STATUS:
+                attachment_items.append(AttachmentItem(jira_key, work_ids[jira_key], mapped_issue.attachments))
+        return attachment_items
+
+    def set_epics(self, mapped_issues, product_tag_record):
+        # epics are created before the work items, which are written with their epic
+        epics = sorted({mapped_issue.epic for mapped_issue in mapped_issues if mapped_issue.epic})
+        if not epics:
+            return
+
+        self.gus_client.create_epics([{'Name': epic, 'Team__c': product_tag_record['Team__c']} for epic in epics])
+        for mapped_issue in mapped_issues:
+            if not mapped_issue.epic:
+                continue
+            epic_id = self.gus_client.get_epic_id(product_tag_record['Team__c'], mapped_issue.epic)
+            if epic_id is None:
+                log.warning(f"Epic {mapped_issue.epic} failed to create, {mapped_issue.work_item['Ftest__c']} is written without it")
+                continue
+            mapped_issue.work_item['Epic__c'] = epic_id
+
+    def assign_issue_themes(self, mapped_issues, work_ids, journal=None, overwrite=False):
+        mapped_issues = [mapped_issue for mapped_issue in mapped_issues if mapped_issue.themes and mapped_issue.work_item['Ftest__c'] in work_ids]
+        if not mapped_issues:
+            return
+
+        self.gus_client.create_themes([{'Name': theme} for theme in sorted({theme for mapped_issue in mapped_issues for theme in mapped_issue.themes})])
+
+        # existing work items keep the themes they have, unless they were just cleared
+        existing_ids = [mapped_issue.work_item['Id'] for mapped_issue in mapped_issues if 'Id' in mapped_issue.work_item]
+        assigned = self.gus_client.get_theme_assignments(existing_ids) if existing_ids and not overwrite else set()
+
+        theme_assignments = []
+        for mapped_issue in mapped_issues:
+            work_id = work_ids[mapped_issue.work_item['Ftest__c']]
+            theme_ids = set()
+            for theme in mapped_issue.themes:
+                theme_id = self.gus_client.get_theme_id(theme)
+                if theme_id is None:
+                    log.warning(f"Theme {theme} failed to create, it is not assigned to {mapped_issue.work_item['Ftest__c']}")
+                    continue
+                theme_ids.add(theme_id)
+            theme_assignments.extend({'Work__c': work_id, 'Theme__c': theme_id} for theme_id in sorted(theme_ids) if (work_id, theme_id) not in assigned)
+
+        self.assign_themes(theme_assignments, journal)
+
+    def load_work_items(self, work_items, existing_work_items, journal=None, overwrite=False):
+        # returns the work ids of the loaded work items by jira key
+        for work_item in work_items:
+            if work_item['Ftest__c'] in existing_work_items:
+                work_item['Id'] = existing_work_items[work_item['Ftest__c']]['Id']
+            # an overwritten work item lost its attachments with its feed, they are migrated again
+            if work_item['Ftest__c'] not in existing_work_items or overwrite:
+                work_item['Test_Failure_Status__c'] = NEW_WORK_ITEM_STATUS
+
+        if overwrite:
+            self.clear_work_items({work_item['Ftest__c']: work_item['Id'] for work_item in work_items if 'Id' in work_item}, journal)
+
+        if self.watermarks is None or overwrite:
+            return self.create_work_items(work_items, journal) or {}
+
+        changed_work_items = self.get_changed_work_items(work_items)
+        changed_keys = {work_item['Ftest__c'] for work_item in changed_work_items}
+        unchanged_ids = {work_item['Ftest__c']: work_item['Id'] for work_item in work_items if work_item['Ftest__c'] not in changed_keys}
+        log.info(f"{len(changed_work_items)} of {len(work_items)} work items are new or changed")
+
+        if not changed_work_items:
+            return unchanged_ids
+        return dict(self.create_work_items(changed_work_items, journal) or {}, **unchanged_ids)
+
+    def get_changed_work_items(self, work_items):
+        # existing work items are sent with the fields that differ from gus only, or not at all
+        existing = [work_item for work_item in work_items if 'Id' in work_item]
+        fields = sorted({field for work_item in existing for field in work_item if field not in DELTA_KEY_FIELDS})
+        records = self.gus_client.get_work_item_fields([work_item['Id'] for work_item in existing], fields) if existing else {}
+
+        changed_work_items = [work_item for work_item in work_items if 'Id' not in work_item]
+        for work_item in existing:
+            record = records.get(work_item['Id'], {})
+            changes = {field: value for field, value in work_item.items() if field not in DELTA_KEY_FIELDS and (value or None) != (record.get(field) or None)}
+            if changes:
+                changed_work_items.append(dict(changes, **{field: work_item[field] for field in DELTA_KEY_FIELDS if field in work_item}))
+
+        return changed_work_items
+
+    def export_telemetry(self):
+        if self.telemetry is None or not self.telemetry_output:
+            return
+
+        self.telemetry.write(self.telemetry_output)
+        snapshot = self.telemetry.snapshot()
+        requests = sum(stats['calls'] for stats in snapshot['endpoints'].values())
+        log.info(f"Made {requests} gus requests, org api usage {snapshot['api_usage']}/{snapshot['api_limit']}, telemetry written to {self.telemetry_output}")
+
+    def open_journal(self, name):
+        if not self.checkpoint_dir:
+            return None
+        return CheckpointJournal.open(self.checkpoint_dir, name)
+
+    ###########################################################################
+    # Phases, skipped for the keys the journal has seen completed
+    ###########################################################################
+
+    def clear_work_items(self, work_items, journal=None):
+        # work_items maps jira keys to the work ids whose feeds, tasks and theme assignments are deleted
+        if journal:
+            work_items = {jira_key: work_id for jira_key, work_id in work_items.items() if not journal.is_done(PHASE_CLEARED, jira_key)}
+        if not work_items:
+            return
+
+        work_ids = list(work_items.values())
+        self.gus_client.clear_work_items(work_ids)
+        if self.attachment_migrator is not None:
+            self.attachment_migrator.invalidate(work_ids)
+        if journal:
+            journal.record(PHASE_CLEARED, work_items)
+
+    def create_work_items(self, work_items, journal=None):
+        if not journal:
+            return self.gus_client.create_work_items(work_items)
+
+        work_items = [work_item for work_item in work_items if work_item]
+        pending_work_items = [work_item for work_item in work_items if not journal.is_done(PHASE_WORK_ITEMS, work_item['Ftest__c'])]
+
+        if pending_work_items:
+            journal.record(PHASE_WORK_ITEMS, self.gus_client.create_work_items(pending_work_items))
+
+        return {work_item['Ftest__c']: journal.get(PHASE_WORK_ITEMS, work_item['Ftest__c']) for work_item in work_items if journal.is_done(PHASE_WORK_ITEMS, work_item['Ftest__c'])}
+
+    def assign_themes(self, theme_assignments, journal=None):
+        # all the assignments of a work item are expected in the same call
+        self.run_phase(PHASE_THEMES, theme_assignments, lambda assignment: assignment['Work__c'], self.gus_client.assign_themes, journal)
+
+    def run_phase(self, phase, items, get_key, action, journal=None):
+        if journal:
+            items = [item for item in items if not journal.is_done(phase, get_key(item))]
+        if not items:
+            return
+
+        outcome = action(items)
+        if journal:
+            # keys with a record still failing on contention are left for the next run, the
+            # rejected ones are in the dead letters and would be rejected again
+            pending_keys = {get_key(items[i]) for i in outcome.transient} if outcome else set()
+            journal.record(phase, [get_key(item) for item in items if get_key(item) not in pending_keys])
+
+    def migrate_attachments(self, attachment_items, journal=None):
+        if journal:
+            attachment_items = [item for item in attachment_items if not journal.is_done(PHASE_ATTACHMENTS, item.jira_key)]
+        if not attachment_items:
+            return []
+
+        log.info(f"Starting to migrate attachments of {len(attachment_items)} work items")
+
+        results = self.attachment_migrator.migrate(attachment_items)
+
+        completed = [result for result in results if not result.failed]
+        completed_work_ids = [result.work_id for result in completed]
+        if completed_work_ids:
+            self.gus_client.set_issues_with_attachments(completed_work_ids)
+        if journal:
+            journal.record(PHASE_ATTACHMENTS, {result.jira_key: result.work_id for result in completed})
+
+        failed = [result for result in results if result.failed]
+        for result in failed:
+            log.error(f"Failed to migrate attachments {result.failed} of {result.jira_key}")
+
+        skipped = sum(len(result.skipped) for result in results)
+        log.info(f"Migrated attachments of {len(completed_work_ids)} work items, {len(failed)} work items failed, {skipped} files were already in gus")
+        return results
@@ -2,8 +2,24 @@ import os
 import json
 import csv
 
+from datetime import datetime, timedelta
+
+from jira2gus.migration.attachment_index import AttachmentIndex
+from jira2gus.migration.attachments import AttachmentMigrator, DEFAULT_CONCURRENCY, DEFAULT_MAX_IN_FLIGHT_BYTES
+from jira2gus.migration.issues import IssueMapper, JiraIssueSource, DEFAULT_PAGE_SIZE, DEFAULT_DELTA_OVERLAP_SECONDS
+from jira2gus.migration.job_scheduler import JobScheduler, JobRow, DEFAULT_JOB_CONCURRENCY
+from jira2gus.salesforce.bulk import LegacyBulkBackend, DEFAULT_SMALL_BATCH_THRESHOLD
+from jira2gus.salesforce.bulk2 import Bulk2Backend
+from jira2gus.salesforce.cache_store import CacheStore
+from jira2gus.salesforce.dead_letters import DeadLetterFile
+from jira2gus.salesforce.governor import RequestGovernor, DEFAULT_MAX_CONCURRENCY
 from jira2gus.salesforce.gus_client import GusClient
-from jira2gus.migration.migrator import Migrator
+from jira2gus.salesforce.session_cache import SessionCache
+from jira2gus.salesforce.sprint_index import DEFAULT_HORIZON_START, DEFAULT_HORIZON_END
+from jira2gus.salesforce.telemetry import Telemetry
+from jira2gus.migration.migrator import Migrator, DEFAULT_LOAD_BATCH_SIZE
+from jira2gus.migration.pipeline import DEFAULT_QUEUE_DEPTH
+from jira2gus.migration.watermarks import WatermarkStore
 
 
 DIRECTORY = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -26,18 +42,152 @@ def load_from_properties():
 
 
 
-def setup_gus_client():
+def setup_cache_store(gus_instance):
+    cache_dir = os.environ.get("gus_cache_dir")
+    if not cache_dir:
+        return None
+
+    ttl = timedelta(hours=float(os.environ.get("gus_cache_ttl_hours", 24)))
+    return CacheStore(cache_dir, gus_instance, ttl, compact=is_compact_cache())
+
+
+def is_compact_cache():
+    return os.environ.get("gus_compact_cache", "false").lower() == "true"
+
+
+def setup_session_cache():
+    session_cache_file = os.environ.get("gus_session_cache_file")
+    if not session_cache_file:
+        return None
+
+    return SessionCache(os.path.expanduser(session_cache_file))
+
+
+def setup_bulk_backend():
+    bulk_api = os.environ.get("gus_bulk_api", "1.0")
+    if bulk_api == "2.0":
+        return Bulk2Backend
+    return LegacyBulkBackend
+
+
+def setup_sprint_horizon():
+    start = os.environ.get("gus_sprint_horizon_start")
+    end = os.environ.get("gus_sprint_horizon_end")
+    start = datetime.strptime(start, "%Y-%m-%d").date() if start else DEFAULT_HORIZON_START
+    end = datetime.strptime(end, "%Y-%m-%d").date() if end else DEFAULT_HORIZON_END
+    return start, end
+
+
+def setup_governor():
+    # off unless asked for, runs keep the pace they had before the governor
+    rate = float(os.environ.get("gus_max_requests_per_second", 0))
+    if not rate:
+        return None
+
+    max_concurrency = int(os.environ.get("gus_max_concurrent_requests", DEFAULT_MAX_CONCURRENCY))
+    return RequestGovernor(rate=rate, max_concurrency=max_concurrency)
+
+
+def setup_telemetry():
+    if not os.environ.get("telemetry_output"):
+        return None
+    return Telemetry()
+
+
+def setup_gus_client(telemetry=None):
+    from jira2gus.salesforce.transport import build_http_session, DEFAULT_POOL_SIZE
+
     gus_instance = os.environ["gus_server"]
     gus_user = os.environ["gus_user"]
     gus_password = os.environ["gus_password"]
     cloud_id = os.environ["gus_cloud_id"]
-    return GusClient(instance=gus_instance, user=gus_user, password=gus_password, cloud_id=cloud_id)
+    cache_store = setup_cache_store(gus_instance)
+    lazy = os.environ.get("gus_lazy_cache", "false").lower() == "true"
+    session_cache = setup_session_cache()
+    http_session = build_http_session(pool_size=int(os.environ.get("gus_pool_size", DEFAULT_POOL_SIZE)), telemetry=telemetry, governor=setup_governor())
+    bulk_backend = setup_bulk_backend()
+    small_batch_threshold = int(os.environ.get("gus_small_batch_threshold", DEFAULT_SMALL_BATCH_THRESHOLD))
+    sprint_horizon = setup_sprint_horizon()
+    query_prefetch = os.environ.get("gus_query_prefetch", "true").lower() == "true"
+    feed_page_size = int(os.environ["gus_feed_page_size"]) if os.environ.get("gus_feed_page_size") else None
+    gus_client = GusClient(instance=gus_instance, user=gus_user, password=gus_password, cloud_id=cloud_id,
+                           cache_store=cache_store, lazy=lazy, compact_cache=is_compact_cache(),
+                           session_cache=session_cache, http_session=http_session,
+                           bulk_backend=bulk_backend, small_batch_threshold=small_batch_threshold, dead_letters=setup_dead_letters(),
+                           sprint_horizon=sprint_horizon,
+                           query_prefetch=query_prefetch, feed_page_size=feed_page_size)
+
+    if telemetry is not None:
+        telemetry.instrument(gus_client)
+    return gus_client
+
+
+def setup_dead_letters():
+    dead_letter_file = os.environ.get("dead_letter_file")
+    if not dead_letter_file:
+        return None
+
+    return DeadLetterFile(os.path.expanduser(dead_letter_file))
+
+
+def setup_attachment_migrator(gus_client):
+    concurrency = int(os.environ.get("attachment_concurrency", DEFAULT_CONCURRENCY))
+    max_in_flight_mb = int(os.environ.get("attachment_max_in_flight_mb", DEFAULT_MAX_IN_FLIGHT_BYTES // 1024 // 1024))
+    return AttachmentMigrator(gus_client, concurrency=concurrency, max_in_flight_bytes=max_in_flight_mb * 1024 * 1024, index=setup_attachment_index())
+
+
+def setup_attachment_index():
+    index_file = os.environ.get("attachment_index_file")
+    if not index_file:
+        return None
+
+    max_age = float(os.environ.get("attachment_index_ttl_hours", 24)) * 3600
+    return AttachmentIndex(os.path.expanduser(index_file), max_age=max_age)
+
+
+def setup_issue_source():
+    if not os.environ.get("jira_server"):
+        return None
+
+    # the jira package is slow to import and only needed when there are issues to fetch
+    from jira import JIRA
+
+    jira_client = JIRA(os.environ["jira_server"], basic_auth=(os.environ["jira_user"], os.environ["jira_password"]))
+    return JiraIssueSource(jira_client, page_size=int(os.environ.get("jira_page_size", DEFAULT_PAGE_SIZE)))
 
 
 def setup_migrator():
     load_from_properties()
 
-    gus_client = setup_gus_client()
+    telemetry = setup_telemetry()
+    gus_client = setup_gus_client(telemetry)
+
+    checkpoint_dir = os.environ.get("checkpoint_dir")
+    issue_mapper = IssueMapper(gus_client, default_assignee=os.environ.get("default_assignee"), default_build=os.environ.get("default_build"))
+    queue_depth = int(os.environ.get("pipeline_queue_depth", DEFAULT_QUEUE_DEPTH))
+    load_batch_size = int(os.environ.get("pipeline_load_batch_size", DEFAULT_LOAD_BATCH_SIZE))
+    delta_state_dir = os.environ.get("delta_state_dir")
+    watermarks = WatermarkStore(os.path.expanduser(delta_state_dir)) if delta_state_dir else None
+    delta_overlap = int(os.environ.get("delta_overlap_minutes", DEFAULT_DELTA_OVERLAP_SECONDS // 60)) * 60
+    return Migrator(gus_client, setup_attachment_migrator(gus_client),
+                    checkpoint_dir=checkpoint_dir, telemetry=telemetry, telemetry_output=os.environ.get("telemetry_output"),
+                    issue_source=setup_issue_source(), issue_mapper=issue_mapper,
+                    mapping_dir=os.path.join(DIRECTORY, "mapping"), mapping_defaults={'epic_field': os.environ.get("epic_field")},
+                    queue_depth=queue_depth, load_batch_size=load_batch_size,
+                    watermarks=watermarks, delta_overlap=delta_overlap)
+
+
+def load_job_rows(job_key):
+    job_file_path = os.path.join(DIRECTORY, "jobs", f"{job_key}.csv")
+
+    with open(job_file_path, "r", newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    return [JobRow(row_number, row["product_tag"], row.get("jira_query"), row.get("mapping_key"), row.get("overwrite", "false").lower() == "true")
+            for row_number, row in enumerate(rows, start=1)]
 
-    return Migrator(gus_client)
 
+def setup_job_scheduler():
+    migrator = setup_migrator()
+    concurrency = int(os.environ.get("job_concurrency", DEFAULT_JOB_CONCURRENCY))
+    return JobScheduler(migrator, concurrency=concurrency)
@@ -0,0 +1,144 @@
+import queue
+import threading
+import time
+
+from jira2gus import logger_wrapper
+from jira2gus.salesforce.telemetry import in_context
+
+
+log = logger_wrapper.get_logger(__name__)
+
+DEFAULT_QUEUE_DEPTH = 4
+
+# how often a blocked stage checks whether another stage failed
+POLL_INTERVAL = 0.5
+
+END = object()
+
+
+class Stage:
+    '''
+    One step of a pipeline. function gets a list of records and returns the list passed on
+    (or None to pass nothing). With a batch_size the incoming lists are regrouped into lists
+    of that size first, so e.g. jira pages of 100 become bulk batches of 2000.
+    '''
+
+    def __init__(self, name, function, batch_size=None):
+        self.name = name
+        self.function = function
+        self.batch_size = batch_size
+        self.stats = {'batches': 0, 'records_in': 0, 'records_out': 0, 'busy_seconds': 0.0, 'starved_seconds': 0.0, 'blocked_seconds': 0.0}
+
+
+class Pipeline:
+    '''
+    Runs a source and its stages in threads of their own, connected by queues of at most
+    queue_depth batches, so extract, transform and load overlap and no more than a few batches
+    per stage are held in memory. The first error stops every stage and is raised by run().
+    '''
+
+    def __init__(self, stages, queue_depth=DEFAULT_QUEUE_DEPTH):
+        self.stages = stages
+        self.queue_depth = queue_depth
+        self.source_stats = {'batches': 0, 'records_out': 0, 'busy_seconds': 0.0, 'blocked_seconds': 0.0}
+        self.stopped = threading.Event()
+        self.errors = []
+
+    def run(self, source):
+        queues = [queue.Queue(maxsize=self.queue_depth) for _ in self.stages]
+        threads = [threading.Thread(target=in_context(self.run_source), args=(source, queues[0]), name='pipeline-source', daemon=True)]
+        for i, stage in enumerate(self.stages):
+            output = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(threading.Thread(target=in_context(self.run_stage), args=(stage, queues[i], output), name=f"pipeline-{stage.name}", daemon=True))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+        return self.get_stats(time.perf_counter() - start)
+
+    def run_source(self, source, output):
+        try:
+            records = iter(source)
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+                batch = next(records, END)
+                self.source_stats['busy_seconds'] += time.perf_counter() - start
+                if batch is END:
+                    break
+
+                self.source_stats['batches'] += 1
+                self.source_stats['records_out'] += len(batch)
+                self.put(output, batch, self.source_stats)
+        except Exception as e:
+            self.fail('source', e)
+        finally:
+            self.put(output, END, self.source_stats)
+
+    def run_stage(self, stage, input, output):
+        pending, batch = [], None
+        try:
+            while True:
+                start = time.perf_counter()
+                batch = input.get()
+                stage.stats['starved_seconds'] += time.perf_counter() - start
+                if batch is END or self.stopped.is_set():
+                    break
+
+                stage.stats['records_in'] += len(batch)
+                if stage.batch_size is None:
+                    self.process(stage, batch, output)
+                    continue
+
+                pending.extend(batch)
+                while len(pending) >= stage.batch_size:
+                    self.process(stage, pending[:stage.batch_size], output)
+                    pending = pending[stage.batch_size:]
+
+            if pending and not self.stopped.is_set():
+                self.process(stage, pending, output)
+        except Exception as e:
+            self.fail(stage.name, e)
+        finally:
+            # the previous stage may be blocked on a full queue, it is drained so it can finish
+            while batch is not END:
+                batch = input.get()
+            if output is not None:
+                self.put(output, END, stage.stats)
+
+    def process(self, stage, batch, output):
+        start = time.perf_counter()
+        result = stage.function(batch) or []
+        stage.stats['busy_seconds'] += time.perf_counter() - start
+        stage.stats['batches'] += 1
+        stage.stats['records_out'] += len(result)
+
+        if output is not None and result:
+            self.put(output, result, stage.stats)
+
+    def put(self, output, batch, stats):
+        start = time.perf_counter()
+        while True:
+            try:
+                output.put(batch, timeout=POLL_INTERVAL)
+                break
+            except queue.Full:
+                # nobody reads a failed pipeline's queues, the end marker is still delivered by the drain
+                if self.stopped.is_set() and batch is not END:
+                    break
+        stats['blocked_seconds'] += time.perf_counter() - start
+
+    def fail(self, name, error):
+        log.error(f"Pipeline stage {name} failed: {error}")
+        self.errors.append(error)
+        self.stopped.set()
+
+    def get_stats(self, seconds):
+        stats = {'seconds': round(seconds, 3)}
+        for name, stage_stats in [('source', self.source_stats)] + [(stage.name, stage.stats) for stage in self.stages]:
+            stats[name] = dict(stage_stats, records_per_second=round(stage_stats['records_out'] / seconds, 1) if seconds else 0.0)
+        return stats
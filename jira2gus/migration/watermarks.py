@@ -0,0 +1,39 @@
+import json
+import os
+import re
+import tempfile
+
+
+class WatermarkStore:
+    '''
+    The start time of the last successful migration per product tag, one json file each, with
+    the jira query it ran. A watermark only applies to the same query, a new one starts over.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get(self, product_tag, jira_query):
+        path = self.get_path(product_tag)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r") as f:
+                watermark = json.load(f)
+        except ValueError:
+            return None
+
+        return watermark['started'] if watermark.get('jira_query') == jira_query else None
+
+    def set(self, product_tag, jira_query, started):
+        os.makedirs(self.directory, exist_ok=True)
+
+        # written aside and renamed, so a crash never leaves a half written watermark
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, "w") as f:
+            json.dump({'jira_query': jira_query, 'started': started}, f)
+        os.replace(tmp_path, self.get_path(product_tag))
+
+    def get_path(self, product_tag):
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_.-]', '_', product_tag) + ".json")
@@ -0,0 +1,203 @@
+import asyncio
+import csv
+import io
+import json
+import time
+
+from jira2gus import logger_wrapper
+from jira2gus.salesforce.bulk import COLLECTIONS_MAX_RECORDS, DEFAULT_SMALL_BATCH_THRESHOLD, DEFAULT_LOCK_RETRIES, DEFAULT_LOCK_RETRY_DELAY, DEFAULT_RETRY_BATCH_SIZE, get_retry_batch_size, is_retryable_failure, to_bulk_result
+from jira2gus.salesforce.bulk2 import BULK2_API_VERSION, DEFAULT_JOB_TIMEOUT, FINAL_STATES, MAX_UPLOAD_BYTES, get_columns, iter_uploads, match_results
+
+
+log = logger_wrapper.get_logger(__name__)
+
+
+class AsyncCollectionsBackend:
+    '''
+    CollectionsBackend on an AsyncRestClient, the 200 record requests of a call are sent together.
+    '''
+
+    def __init__(self, rest_client):
+        self.rest_client = rest_client
+
+    async def insert(self, table, records):
+        return await self.send(self.rest_client.collection_create, table, records, list(range(len(records))), True)
+
+    async def upsert(self, table, records, external_id_field):
+        if external_id_field != 'Id':
+            raise ValueError(f"Upserts by {external_id_field} are not supported through sObject collections")
+
+        updates = [i for i, record in enumerate(records) if record.get('Id')]
+        creates = [i for i, record in enumerate(records) if not record.get('Id')]
+
+        update_results, create_results = await asyncio.gather(self.send(self.rest_client.collection_update, table, records, updates, False),
+                                                              self.send(self.rest_client.collection_create, table, records, creates, True))
+
+        results = [None] * len(records)
+        for indexes, indexes_results in ((updates, update_results), (creates, create_results)):
+            for index, result in zip(indexes, indexes_results):
+                results[index] = result
+        return results
+
+    async def delete(self, table, records):
+        chunks = [records[i:i + COLLECTIONS_MAX_RECORDS] for i in range(0, len(records), COLLECTIONS_MAX_RECORDS)]
+        responses = await asyncio.gather(*(self.rest_client.collection_delete([record['Id'] for record in chunk]) for chunk in chunks))
+        return [to_bulk_result(result, created=False) for response in responses for result in response]
+
+    async def send(self, operation, table, records, indexes, created):
+        chunks = [indexes[i:i + COLLECTIONS_MAX_RECORDS] for i in range(0, len(indexes), COLLECTIONS_MAX_RECORDS)]
+        responses = await asyncio.gather(*(operation(table, [records[index] for index in chunk]) for chunk in chunks))
+        return [to_bulk_result(result, created=created) for response in responses for result in response]
+
+
+class AsyncBulk2Backend:
+    '''
+    Bulk2Backend on an AsyncRestClient, jobs are submitted and polled without blocking the event loop.
+    '''
+
+    def __init__(self, rest_client, max_upload_bytes=MAX_UPLOAD_BYTES, poll_interval=0.5, max_poll_interval=5, job_timeout=DEFAULT_JOB_TIMEOUT):
+        self.rest_client = rest_client
+        self.max_upload_bytes = max_upload_bytes
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.job_timeout = job_timeout
+
+    @property
+    def ingest_url(self):
+        return self.rest_client.base_url.replace(self.rest_client.sf_version, BULK2_API_VERSION) + 'jobs/ingest/'
+
+    async def insert(self, table, records):
+        return await self.run(table, 'insert', records)
+
+    async def upsert(self, table, records, external_id_field):
+        return await self.run(table, 'upsert', records, external_id_field)
+
+    async def delete(self, table, records):
+        return await self.run(table, 'delete', [{'Id': record['Id']} for record in records])
+
+    async def run(self, table, operation, records, external_id_field=None):
+        results = [None] * len(records)
+        if not records:
+            return results
+
+        columns = get_columns(records, external_id_field)
+        for rows, upload in iter_uploads(records, columns, self.max_upload_bytes):
+            with upload:
+                job_id = await self.create_job(table, operation, external_id_field)
+                await self.upload(job_id, upload)
+            job = await self.wait_for_job(job_id)
+
+            successful_rows, failed_rows, unprocessed_rows = await asyncio.gather(self.get_result_rows(job_id, 'successfulResults'), self.get_result_rows(job_id, 'failedResults'),
+                                                                                  self.get_result_rows(job_id, 'unprocessedrecords'))
+            match_results(job, results, records, rows, columns, successful_rows, failed_rows, unprocessed_rows)
+
+        return results
+
+    async def create_job(self, table, operation, external_id_field):
+        payload = {'object': table, 'operation': operation, 'contentType': 'CSV', 'lineEnding': 'LF'}
+        if operation == 'upsert':
+            payload['externalIdFieldName'] = external_id_field
+
+        return (await self.call('POST', self.ingest_url, data=json.dumps(payload))).json()['id']
+
+    async def upload(self, job_id, upload):
+        size = upload.seek(0, io.SEEK_END)
+        await self.call('PUT', f"{self.ingest_url}{job_id}/batches", data=upload, headers={'Content-Type': 'text/csv', 'Content-Length': str(size)})
+        await self.call('PATCH', f"{self.ingest_url}{job_id}", data=json.dumps({'state': 'UploadComplete'}))
+
+    async def wait_for_job(self, job_id):
+        interval = self.poll_interval
+        deadline = time.monotonic() + self.job_timeout
+        while True:
+            job = (await self.call('GET', f"{self.ingest_url}{job_id}")).json()
+            if job['state'] in FINAL_STATES:
+                return job
+            if time.monotonic() >= deadline:
+                await self.abort_job(job_id)
+                raise RuntimeError(f"Bulk api 2.0 job {job_id} is still {job['state']} after {self.job_timeout}s, aborted it")
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+    async def abort_job(self, job_id):
+        try:
+            await self.call('PATCH', f"{self.ingest_url}{job_id}", data=json.dumps({'state': 'Aborted'}))
+        except RuntimeError:
+            log.warning(f"Could not abort bulk api 2.0 job {job_id}")
+
+    async def get_result_rows(self, job_id, result_type):
+        result = await self.call('GET', f"{self.ingest_url}{job_id}/{result_type}/")
+
+        reader = csv.reader(io.StringIO(result.content.decode('utf-8'), newline=''))
+        header = next(reader, None)
+        return [dict(zip(header, row)) for row in reader]
+
+    async def call(self, method, url, **kwargs):
+        result = await self.rest_client.request(method, url, **kwargs)
+        if result.status_code >= 300:
+            raise RuntimeError(f"Bulk api 2.0 {method} {url} failed with {result.status_code}: {result.text}")
+
+        return result
+
+
+class AsyncAutoBulkBackend:
+    '''
+    AutoBulkBackend for the async backends: up to threshold records go through the small one.
+    '''
+
+    def __init__(self, small_backend, large_backend, threshold=DEFAULT_SMALL_BATCH_THRESHOLD):
+        self.small_backend = small_backend
+        self.large_backend = large_backend
+        self.threshold = threshold
+
+    async def insert(self, table, records):
+        return await self.get_backend(records).insert(table, records)
+
+    async def upsert(self, table, records, external_id_field):
+        return await self.get_backend(records).upsert(table, records, external_id_field)
+
+    async def delete(self, table, records):
+        return await self.get_backend(records).delete(table, records)
+
+    def get_backend(self, records):
+        return self.small_backend if len(records) <= self.threshold else self.large_backend
+
+
+class AsyncLockRetryBulkBackend:
+    '''
+    LockRetryBulkBackend for the async backends, the retry batches are sent one after the other.
+    '''
+
+    def __init__(self, backend, retries=DEFAULT_LOCK_RETRIES, retry_delay=DEFAULT_LOCK_RETRY_DELAY, retry_batch_size=DEFAULT_RETRY_BATCH_SIZE):
+        self.backend = backend
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.retry_batch_size = retry_batch_size
+
+    async def insert(self, table, records):
+        return await self.run('insert', table, records)
+
+    async def upsert(self, table, records, external_id_field):
+        return await self.run('upsert', table, records, external_id_field)
+
+    async def delete(self, table, records):
+        return await self.run('delete', table, records)
+
+    async def run(self, operation, table, records, *args):
+        results = list(await getattr(self.backend, operation)(table, records, *args))
+
+        for attempt in range(1, self.retries + 1):
+            failed = [i for i, result in enumerate(results) if is_retryable_failure(result)]
+            if not failed:
+                break
+
+            batch_size = get_retry_batch_size(self.retry_batch_size, attempt)
+            log.warning(f"{len(failed)} {table} records failed on a retryable error, retrying them in batches of {batch_size} ({attempt}/{self.retries})")
+            await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+            for i in range(0, len(failed), batch_size):
+                indexes = failed[i:i + batch_size]
+                retry_results = await getattr(self.backend, operation)(table, [records[index] for index in indexes], *args)
+                for index, result in zip(indexes, retry_results):
+                    results[index] = result
+
+        return results
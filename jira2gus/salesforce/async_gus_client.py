@@ -0,0 +1,208 @@
+import asyncio
+
+from jira2gus import logger_wrapper
+from jira2gus.salesforce.async_bulk import AsyncAutoBulkBackend, AsyncBulk2Backend, AsyncCollectionsBackend, AsyncLockRetryBulkBackend
+from jira2gus.salesforce.async_rest_client import AsyncRestClient, build_async_http_session, DEFAULT_MAX_IN_FLIGHT
+from jira2gus.salesforce.bulk import BulkOutcome, DEFAULT_SMALL_BATCH_THRESHOLD
+from jira2gus.salesforce.gus_client import GusClient, EXISTING_KEYS_FULL_SCAN_THRESHOLD, LOOKUP_QUERY_CHUNK_SIZE
+from jira2gus.salesforce.session import LOGIN_BODY, LOGIN_HEADERS, parse_session_id
+from jira2gus.salesforce.soql import chunked, chunk_in_values, format_soql
+
+
+log = logger_wrapper.get_logger(__name__)
+
+
+class AsyncGusClient:
+    '''
+    The network calls of GusClient as coroutines on one aiohttp session: queries, record gets,
+    chatter posts and attachment uploads, and bulk writes through sObject collections or bulk
+    api 2.0 jobs. Any number of calls can be awaited together, max_in_flight of them are on the
+    network at a time. Used as `async with AsyncGusClient(...) as gus_client:`.
+    '''
+
+    def __init__(self, instance, user, password, cloud_id,
+                 session_cache=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, governor=None, scheme='https',
+                 small_batch_threshold=DEFAULT_SMALL_BATCH_THRESHOLD, dead_letters=None,
+                 query_prefetch=True, feed_page_size=None):
+        self.instance = instance
+        self.user = user
+        self.password = password
+        self.cloud_id = cloud_id
+        self.session_cache = session_cache
+        self.max_in_flight = max_in_flight
+        self.governor = governor
+        self.small_batch_threshold = small_batch_threshold
+        self.query_prefetch = query_prefetch
+        self.feed_page_size = feed_page_size
+        self.scheme = scheme
+        self.dead_letters = dead_letters
+        self.http_session = None
+        self.client = None
+        self.bulk = None
+        self.team_ids = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self, session_id=None):
+        self.http_session = build_async_http_session(self.max_in_flight)
+
+        # a cached session is trusted as is, it gets renewed on the first expired session response
+        if session_id is None and self.session_cache is not None:
+            session_id = self.session_cache.get(self.instance, self.user)
+        if session_id is None:
+            session_id = await self.login()
+
+        self.client = AsyncRestClient(self.instance, session_id, http_session=self.http_session, session_refresher=self.refresh_session, max_in_flight=self.max_in_flight, governor=self.governor, scheme=self.scheme)
+        self.sf_session = self.client
+        self.bulk = AsyncLockRetryBulkBackend(AsyncAutoBulkBackend(AsyncCollectionsBackend(self.client), AsyncBulk2Backend(self.client), self.small_batch_threshold))
+
+    async def close(self):
+        if self.http_session is not None:
+            await self.http_session.close()
+
+    async def login(self):
+        url = f"{self.scheme}://{self.instance}/services/Soap/c/v29.0"
+        async with self.http_session.post(url, data=LOGIN_BODY % (self.user, self.password, ''), headers=LOGIN_HEADERS) as response:
+            data = await response.text()
+
+        try:
+            session_id = parse_session_id(data)
+        except AttributeError:
+            raise Exception(f"Login Failed {data}")
+
+        if self.session_cache is not None:
+            self.session_cache.set(self.instance, self.user, session_id)
+        return session_id
+
+    async def refresh_session(self):
+        log.info(f"Salesforce session for {self.user} expired, logging in again")
+        return await self.login()
+
+    ###########################################################################
+    # Get From Gus
+    ###########################################################################
+
+    async def get_scrum_team_record(self, Scrum_Team_id):
+        return await self.sf_session.get('ADM_Scrum_Team__c', Scrum_Team_id)
+
+    async def get_product_tag_record(self, product_tag_id):
+        return await self.sf_session.get('ADM_Product_Tag__c', product_tag_id)
+
+    async def get_product_tag_teams(self, product_tag_ids):
+        queries = [format_soql("select Id, Team__c from ADM_Product_Tag__c where Id IN {ids}", ids=ids_group) for ids_group in chunked(sorted(set(product_tag_ids)), LOOKUP_QUERY_CHUNK_SIZE)]
+        return {record['Id']: record['Team__c'] for record in await self.query_concurrently(queries)}
+
+    def iter_work_item_feed(self, work_id):
+        return self.sf_session.iter_object_feed(work_id, page_size=self.feed_page_size)
+
+    async def get_work_item_feeds(self, work_ids):
+        return await self.sf_session.get_object_feeds(work_ids, page_size=self.feed_page_size)
+
+    async def get_team_ids(self):
+        if self.team_ids is None:
+            query = format_soql("select Id from ADM_Scrum_Team__c where Cloud_LU__c IN {cloud_ids}", cloud_ids=[self.cloud_id])
+            self.team_ids = [record['Id'] async for record in self.iter_query(query)]
+        return self.team_ids
+
+    async def get_existing_keys(self, keys):
+        keys = set(keys)
+        teams = await self.get_team_ids()
+
+        query = format_soql("Select Id,ftest__c,Test_Failure_Status__c from ADM_Work__c where Scrum_Team__c in {teams}", teams=teams)
+
+        valid_work_items = {}
+        invalid_work_items = []
+        for record in await self.query_work_items_by_keys(query, keys):
+            if record['Test_Failure_Status__c'] in ('Blocking', 'Signed Off'):
+                valid_work_items.setdefault(record['ftest__c'], []).append(record['Id'])
+            else:
+                invalid_work_items.append(record['Id'])
+
+        selected_valid_work_items = {jira_key: work_ids.pop() for jira_key, work_ids in valid_work_items.items()}
+
+        for work_ids in valid_work_items.values():
+            invalid_work_items.extend(work_ids)
+
+        return selected_valid_work_items, invalid_work_items
+
+    async def get_existing_keys_without_attachments(self, keys):
+        keys = set(keys)
+        teams = await self.get_team_ids()
+
+        query = format_soql("Select Id,ftest__c from ADM_Work__c where Scrum_Team__c in {teams} and Test_Failure_Status__c='Blocking'", teams=teams)
+
+        valid_work_items = {}
+        for record in await self.query_work_items_by_keys(query, keys):
+            valid_work_items.setdefault(record['ftest__c'], []).append(record['Id'])
+
+        return {jira_key: work_ids.pop() for jira_key, work_ids in valid_work_items.items()}
+
+    ###########################################################################
+    # Actions
+    ###########################################################################
+
+    async def set_issues_with_attachments(self, work_ids):
+        await self.assign_work_items([{'Id': work_id, 'Test_Failure_Status__c': 'Signed Off'} for work_id in work_ids])
+
+    async def set_issues_without_attachments(self, work_ids):
+        await self.assign_work_items([{'Id': work_id, 'Test_Failure_Status__c': 'Blocking'} for work_id in work_ids])
+
+    async def create_work_items(self, work_items):
+        work_items = [work_item for work_item in work_items if work_item]
+        if not work_items:
+            return
+
+        response = await self.bulk.upsert('ADM_Work__c', work_items, 'Id')
+        outcome = self.check_response('ADM_Work__c', 'upsert', work_items, response)
+
+        return outcome.get_ids(lambda work_item: work_item['Ftest__c'])
+
+    async def create_chatter_attachment(self, messageText, obj=None, mention_ids=(), file_name="", file_data=None, file_path=None, file_size=None):
+        return await self.client.chatter_on_object_with_attachment(messageText, obj, mention_ids, file_name, file_data, file_path, file_size)
+
+    async def create_chatter_file_link(self, messageText, obj, content_document_id):
+        return await self.client.chatter_on_object_with_existing_file(messageText, obj, content_document_id)
+
+    async def assign_work_items(self, work_items_updates):
+        return await self.assign_items('ADM_Work__c', work_items_updates)
+
+    async def assign_items(self, table, items, validate=True):
+        response = await self.bulk.upsert(table, items, 'Id')
+        return self.check_response(table, 'upsert', items, response) if validate else BulkOutcome(items, response)
+
+    async def delete_ids(self, table, ids):
+        records = [{'Id': record_id} for record_id in ids]
+        outcome = self.check_response(table, 'delete', records, await self.bulk.delete(table, records))
+        return len(outcome.succeeded)
+
+    ###########################################################################
+    # Private Methods
+    ###########################################################################
+
+    async def query_work_items_by_keys(self, query, keys):
+        if not keys:
+            return []
+
+        if len(keys) > EXISTING_KEYS_FULL_SCAN_THRESHOLD:
+            records = [record async for record in self.iter_query(query)]
+        else:
+            queries = [f"{query} and ftest__c in {format_soql('{keys}', keys=keys_group)}" for keys_group in chunk_in_values(sorted(keys), query + " and ftest__c in ")]
+            records = await self.query_concurrently(queries)
+
+        # soql compares strings case insensitively, keep only exact key matches
+        return [record for record in records if record['ftest__c'] in keys]
+
+    def iter_query(self, query):
+        return self.sf_session.iter_query(query, prefetch=self.query_prefetch)
+
+    async def query_concurrently(self, queries):
+        # every chunk query runs at once, the client keeps max_in_flight of them on the network
+        results = await asyncio.gather(*(self.sf_session.query_all(query) for query in queries))
+        return [record for result in results for record in result['records']]
+
+    check_response = GusClient.check_response
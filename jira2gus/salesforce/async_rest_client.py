@@ -0,0 +1,277 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+
+from jira2gus.salesforce.errors import _exception_handler
+from jira2gus.salesforce.multipart import MultipartStream, CHUNK_SIZE
+from jira2gus.salesforce.rest_client import RestClient, DEFAULT_FEED_CONCURRENCY, DEFAULT_FEED_PAGE_SIZE
+from jira2gus.salesforce.transport import is_expired_session, is_replayable
+
+
+API_VERSION = '36.0'
+DEFAULT_MAX_IN_FLIGHT = 100
+
+# the retry policy of build_http_session, for the requests aiohttp doesn't retry itself
+MAX_RETRIES = 10
+BACKOFF_FACTOR = 0.1
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def build_async_http_session(pool_size=DEFAULT_MAX_IN_FLIGHT):
+    # must be built inside the event loop it is used from
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=pool_size), timeout=aiohttp.ClientTimeout(total=None, sock_connect=30))
+
+
+class AsyncResponse:
+    '''
+    A fully read aiohttp response, with the attributes of a requests response the sync
+    error and throttling helpers look at.
+    '''
+
+    def __init__(self, status_code, headers, content, url):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncRestClient:
+    '''
+    The RestClient calls as coroutines on an aiohttp session. max_in_flight caps the requests
+    waiting on the network at a time, an optional RequestGovernor paces them. An expired
+    session is renewed once through session_refresher, shared by every pending request.
+    '''
+
+    def __init__(self, instance, session_id, http_session=None, session_refresher=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, governor=None, scheme='https', version=API_VERSION):
+        self.sf_instance = instance
+        self.sf_version = version
+        self.session_id = session_id
+        self.scheme = scheme
+        self.base_url = f"{scheme}://{instance}/services/data/v{version}/"
+        self.session = http_session or build_async_http_session(max_in_flight)
+        self.session_refresher = session_refresher
+        self.governor = governor
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.refresh_lock = asyncio.Lock()
+
+    @property
+    def headers(self):
+        return {'Content-Type': 'application/json', 'Authorization': 'Bearer ' + self.session_id, 'X-PrettyPrint': '1'}
+
+    # message bodies and urls are built like the sync client builds them
+    create_chatter_body = RestClient.create_chatter_body
+    create_chatter_body_for_attachment = RestClient.create_chatter_body_for_attachment
+    create_attachment_parts = RestClient.create_attachment_parts
+    get_attachment_url = RestClient.get_attachment_url
+    get_attachment_headers = RestClient.get_attachment_headers
+    get_collections_url = RestClient.get_collections_url
+
+    async def close(self):
+        await self.session.close()
+
+    async def request(self, method, url, renew_session=True, **kwargs):
+        session_id = self.session_id
+        response = await self.send(method, url, **kwargs)
+
+        if not renew_session or self.session_refresher is None or not is_expired_session(response) or not is_replayable(kwargs.get('data')):
+            return response
+
+        await self.refresh_session(session_id)
+        return await self.send(method, url, **kwargs)
+
+    async def send(self, method, url, headers=None, data=None, params=None):
+        attempt = 0
+        while True:
+            # the session id is read on every attempt, a renewed one replaces the expired one
+            request_headers = dict(self.headers, **(headers or {}))
+            request_headers['Authorization'] = 'Bearer ' + self.session_id
+
+            await self.acquire()
+            try:
+                async with self.session.request(method, url, headers=request_headers, data=get_body(data), params=params) as result:
+                    response = AsyncResponse(result.status, result.headers, await result.read(), str(result.url))
+            except aiohttp.ClientConnectionError:
+                if attempt >= MAX_RETRIES or not is_replayable(data):
+                    raise
+                response = None
+            finally:
+                self.slots.release()
+
+            attempt += 1
+            throttled = response is not None and self.governor is not None and self.governor.feedback(response)
+            if response is not None and not throttled and response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt > MAX_RETRIES or not is_replayable(data):
+                return response
+
+            await asyncio.sleep(self.governor.get_backoff(attempt, response) if throttled else BACKOFF_FACTOR * 2 ** (attempt - 1))
+
+    async def acquire(self):
+        # the governor's token bucket without its thread semaphore, slots caps the requests in flight
+        start = time.monotonic()
+        await self.slots.acquire()
+        if self.governor is None:
+            return
+
+        # a request cancelled while waiting for a token gives its slot back
+        try:
+            wait = self.governor.take_token()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.governor.take_token()
+        except BaseException:
+            self.slots.release()
+            raise
+        self.governor.record_wait(time.monotonic() - start)
+
+    async def refresh_session(self, used_session_id):
+        async with self.refresh_lock:
+            # another request may already have renewed the session this one was sent with
+            if used_session_id != self.session_id:
+                return
+            self.session_id = await self.session_refresher()
+
+    async def call(self, method, url, expected_status=200, name="", **kwargs):
+        result = await self.request(method, url, **kwargs)
+
+        if result.status_code != expected_status:
+            _exception_handler(result, name)
+
+        return result.json()
+
+    async def query_pages(self, query, prefetch=False):
+        # like RestClient.query_pages, with prefetch the next page is requested while this one is consumed
+        page = await self.call('GET', self.base_url + 'query/', name='query', params={'q': query})
+        while True:
+            next_page = None
+            if prefetch and not page['done']:
+                next_page = asyncio.ensure_future(self.call('GET', self.get_query_more_url(page), name='query'))
+
+            yield page['records']
+            if page['done']:
+                return
+            page = await (next_page or self.call('GET', self.get_query_more_url(page), name='query'))
+
+    async def iter_query(self, query, prefetch=False):
+        async for records in self.query_pages(query, prefetch):
+            for record in records:
+                yield record
+
+    async def query_all(self, query):
+        records = [record async for record in self.iter_query(query)]
+        return {'totalSize': len(records), 'done': True, 'records': records}
+
+    def get_query_more_url(self, page):
+        return f"{self.scheme}://{self.sf_instance}{page['nextRecordsUrl']}"
+
+    async def get(self, table, record_id):
+        return await self.call('GET', f"{self.base_url}sobjects/{table}/{record_id}", name=table)
+
+    async def get_chatter_profile(self, obj='me'):
+        return await self.call('GET', self.base_url + 'chatter/users/{}'.format(obj))
+
+    async def chatter_post(self, text, mention_ids=()):
+        data = json.dumps(self.create_chatter_body(text, mention_ids=mention_ids))
+        return await self.call('POST', self.base_url + 'chatter/feeds/news/me/feed-items', expected_status=201, data=data)
+
+    async def chatter_on_object(self, message, obj, mention_ids=()):
+        data = json.dumps(self.create_chatter_body(message, mention_ids=mention_ids))
+        return await self.call('POST', self.base_url + 'chatter/feeds/record/{}/feed-items'.format(obj), expected_status=201, data=data)
+
+    async def chatter_on_object_with_attachment(self, message, obj, mention_ids=(), file_name="", file_data=None, file_path=None, file_size=None):
+        head, tail = self.create_attachment_parts(message, mention_ids, file_name)
+        body = MultipartStream(head, file_data=file_data, file_path=file_path, tail=tail, file_size=file_size)
+
+        headers = self.get_attachment_headers()
+        if body.len is not None:
+            headers['Content-Length'] = str(body.len)
+
+        return await self.call('POST', self.get_attachment_url(obj), expected_status=201, data=body, headers=headers)
+
+    async def chatter_on_object_with_existing_file(self, message, obj, content_document_id, mention_ids=()):
+        body = self.create_chatter_body(message, mention_ids=mention_ids)
+        body["attachment"] = {"attachmentType": "ExistingContent", "contentDocumentId": content_document_id}
+        return await self.call('POST', self.get_attachment_url(obj), expected_status=201, data=json.dumps(body))
+
+    async def get_news_feed(self, page_size=None):
+        return await self.call('GET', self.base_url + 'chatter/feeds/news/me/feed-items', params={'pageSize': page_size or DEFAULT_FEED_PAGE_SIZE})
+
+    async def get_object_feed(self, obj, page_size=None):
+        return await self.call('GET', self.base_url + 'chatter/feeds/record/{}/feed-items'.format(obj), params={'pageSize': page_size or DEFAULT_FEED_PAGE_SIZE})
+
+    async def feed_pages(self, url, page_size=None, prefetch=False):
+        # like RestClient.feed_pages, with prefetch the next page is requested while this one is consumed
+        page = await self.call('GET', url, params={'pageSize': page_size or DEFAULT_FEED_PAGE_SIZE})
+        while True:
+            next_page = None
+            if prefetch and page.get('nextPageUrl'):
+                next_page = asyncio.ensure_future(self.call('GET', self.get_feed_page_url(page)))
+
+            yield page['elements']
+            if not page.get('nextPageUrl'):
+                return
+            page = await (next_page or self.call('GET', self.get_feed_page_url(page)))
+
+    async def iter_news_feed(self, page_size=None, prefetch=False):
+        async for feed_items in self.feed_pages(self.base_url + 'chatter/feeds/news/me/feed-items', page_size, prefetch):
+            for feed_item in feed_items:
+                yield feed_item
+
+    async def iter_object_feed(self, obj, page_size=None, prefetch=False):
+        async for feed_items in self.feed_pages(self.base_url + 'chatter/feeds/record/{}/feed-items'.format(obj), page_size, prefetch):
+            for feed_item in feed_items:
+                yield feed_item
+
+    async def get_object_feeds(self, objs, page_size=None, concurrency=DEFAULT_FEED_CONCURRENCY):
+        # obj -> feed items, the feeds of up to concurrency objects are read at once
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def read_feed(obj):
+            async with semaphore:
+                return [feed_item async for feed_item in self.iter_object_feed(obj, page_size)]
+
+        return dict(zip(objs, await asyncio.gather(*(read_feed(obj) for obj in objs))))
+
+    def get_feed_page_url(self, page):
+        return f"{self.scheme}://{self.sf_instance}{page['nextPageUrl']}"
+
+    async def collection_create(self, table, records):
+        data = json.dumps({'allOrNone': False, 'records': [dict(record, attributes={'type': table}) for record in records]})
+        return await self.call('POST', self.get_collections_url(), data=data)
+
+    async def collection_update(self, table, records):
+        data = json.dumps({'allOrNone': False, 'records': [dict(record, attributes={'type': table}) for record in records]})
+        return await self.call('PATCH', self.get_collections_url(), data=data)
+
+    async def collection_delete(self, ids):
+        params = {'ids': ','.join(ids), 'allOrNone': 'false'}
+        return await self.call('DELETE', self.get_collections_url(), params=params)
+
+
+def get_body(data):
+    # a multipart body is read in chunks off the event loop, a fresh reader on every attempt
+    if isinstance(data, MultipartStream):
+        return iter_chunks(data)
+    if hasattr(data, 'read'):
+        data.seek(0)
+        return iter_chunks(iter(lambda: data.read(CHUNK_SIZE), b''))
+    return data
+
+
+async def iter_chunks(chunks):
+    loop = asyncio.get_running_loop()
+    chunks = iter(chunks)
+    while True:
+        chunk = await loop.run_in_executor(None, next, chunks, None)
+        if chunk is None:
+            return
+        yield bytes(chunk)
@@ -1,18 +1,54 @@
-from jira2gus.salesforce.rest_client import RestClient
-from jira2gus.salesforce.session import SoapSession
+from jira2gus import logger_wrapper
+
+
+log = logger_wrapper.get_logger(__name__)
 
 
 class BaseClient:
-    def __init__(self, user, password, instance='login.salesforce.com', session_id=None):
+    def __init__(self, user, password, instance='login.salesforce.com', session_id=None, session_cache=None, http_session=None):
+        # requests and simple_salesforce are imported when the first client is built, not with jira2gus
+        from jira2gus.salesforce.rest_client import RestClient
+        from jira2gus.salesforce.session import SoapSession
+        from jira2gus.salesforce.transport import build_http_session
+
+        self.user = user
+        self.password = password
+        self.instance = instance
+        self.session_cache = session_cache
+        self.http_session = http_session or build_http_session()
+
         if session_id is not None:
-            session = SoapSession(session_id=session_id, instance=instance)
+            session = SoapSession(session_id=session_id, instance=instance, http_session=self.http_session)
             if not session.is_valid():
                 session_id = None
 
+        # a cached session is trusted as is, it gets renewed on the first expired session response
+        if session_id is None and session_cache is not None:
+            session_id = session_cache.get(instance, user)
+
         if session_id is None:
-            session = SoapSession(instance)
-            session.login(user, password)
-            session_id = session.get_session_id()
+            session_id = self.login()
+
+        self.http_session.session_refresher = self.refresh_session
+        self.client = RestClient(instance=instance, session_id=session_id, http_session=self.http_session)
+        self.session_id = session_id
+
+    def login(self):
+        from jira2gus.salesforce.session import SoapSession
+
+        session = SoapSession(self.instance, http_session=self.http_session)
+        session.login(self.user, self.password)
+        session_id = session.get_session_id()
+
+        if self.session_cache is not None:
+            self.session_cache.set(self.instance, self.user, session_id)
+
+        return session_id
+
+    def refresh_session(self):
+        log.info(f"Salesforce session for {self.user} expired, logging in again")
 
-        self.client = RestClient(instance_url=f"https://{instance}", session_id=session_id)
-        self.session_id = session_id
\ No newline at end of file
+        session_id = self.login()
+        self.session_id = session_id
+        self.client.set_session_id(session_id)
+        return session_id
@@ -0,0 +1,207 @@
+import threading
+import time
+
+from jira2gus import logger_wrapper
+
+
+log = logger_wrapper.get_logger(__name__)
+
+
+class LegacyBulkBackend:
+    '''
+    Bulk operations through simple_salesforce's bulk api 1.0 handler.
+    Every backend returns one result per input record, in input order:
+    {'success': bool, 'created': bool, 'id': str, 'errors': [{'statusCode': str, 'message': str, 'fields': list}]}
+    '''
+
+    def __init__(self, rest_client):
+        self.rest_client = rest_client
+
+    def insert(self, table, records):
+        return getattr(self.rest_client.bulk, table).insert(records)
+
+    def upsert(self, table, records, external_id_field):
+        return getattr(self.rest_client.bulk, table).upsert(records, external_id_field)
+
+    def delete(self, table, records):
+        return getattr(self.rest_client.bulk, table).delete(records)
+
+
+# the most records a single sObject collections request accepts
+COLLECTIONS_MAX_RECORDS = 200
+DEFAULT_SMALL_BATCH_THRESHOLD = 200
+
+
+class CollectionsBackend:
+    '''
+    Synchronous bulk operations through sObject collections, one round trip per 200 records.
+    '''
+
+    def __init__(self, rest_client):
+        self.rest_client = rest_client
+
+    def insert(self, table, records):
+        results = []
+        for i in range(0, len(records), COLLECTIONS_MAX_RECORDS):
+            response = self.rest_client.collection_create(table, records[i:i + COLLECTIONS_MAX_RECORDS])
+            results.extend(to_bulk_result(result, created=True) for result in response)
+        return results
+
+    def upsert(self, table, records, external_id_field):
+        if external_id_field != 'Id':
+            raise ValueError(f"Upserts by {external_id_field} are not supported through sObject collections")
+
+        # records with an Id are updated, the rest are created, results go back to input order
+        results = [None] * len(records)
+        updates = [i for i, record in enumerate(records) if record.get('Id')]
+        creates = [i for i, record in enumerate(records) if not record.get('Id')]
+
+        for i in range(0, len(updates), COLLECTIONS_MAX_RECORDS):
+            indexes = updates[i:i + COLLECTIONS_MAX_RECORDS]
+            response = self.rest_client.collection_update(table, [records[index] for index in indexes])
+            for index, result in zip(indexes, response):
+                results[index] = to_bulk_result(result, created=False)
+
+        for i in range(0, len(creates), COLLECTIONS_MAX_RECORDS):
+            indexes = creates[i:i + COLLECTIONS_MAX_RECORDS]
+            response = self.rest_client.collection_create(table, [records[index] for index in indexes])
+            for index, result in zip(indexes, response):
+                results[index] = to_bulk_result(result, created=True)
+
+        return results
+
+    def delete(self, table, records):
+        results = []
+        for i in range(0, len(records), COLLECTIONS_MAX_RECORDS):
+            response = self.rest_client.collection_delete([record['Id'] for record in records[i:i + COLLECTIONS_MAX_RECORDS]])
+            results.extend(to_bulk_result(result, created=False) for result in response)
+        return results
+
+
+class AutoBulkBackend:
+    '''
+    Sends payloads up to threshold records through the small (synchronous) backend and bigger
+    ones through the large (bulk job) backend, counting calls, records and time per path.
+    '''
+
+    def __init__(self, small_backend, large_backend, threshold=DEFAULT_SMALL_BATCH_THRESHOLD):
+        self.small_backend = small_backend
+        self.large_backend = large_backend
+        self.threshold = threshold
+        self.stats = {'collections': {'calls': 0, 'records': 0, 'seconds': 0.0}, 'bulk': {'calls': 0, 'records': 0, 'seconds': 0.0}}
+        self.lock = threading.Lock()
+
+    def insert(self, table, records):
+        return self.run('insert', records, table, records)
+
+    def upsert(self, table, records, external_id_field):
+        return self.run('upsert', records, table, records, external_id_field)
+
+    def delete(self, table, records):
+        return self.run('delete', records, table, records)
+
+    def run(self, operation, records, *args):
+        path, backend = ('collections', self.small_backend) if len(records) <= self.threshold else ('bulk', self.large_backend)
+
+        start = time.perf_counter()
+        try:
+            return getattr(backend, operation)(*args)
+        finally:
+            with self.lock:
+                self.stats[path]['calls'] += 1
+                self.stats[path]['records'] += len(records)
+                self.stats[path]['seconds'] += time.perf_counter() - start
+
+
+# record errors caused by contention with other writers or by the load of the org, they go away
+# when the record is sent again. UNPROCESSED rows were listed as unprocessed by a bulk job that ended early
+RETRYABLE_RECORD_ERRORS = ('UNABLE_TO_LOCK_ROW', 'REQUEST_LIMIT_EXCEEDED', 'REQUEST_RUNNING_TOO_LONG', 'UNPROCESSED')
+DEFAULT_LOCK_RETRIES = 3
+DEFAULT_LOCK_RETRY_DELAY = 2
+# records sent again per call on the first retry, halved on every next one
+DEFAULT_RETRY_BATCH_SIZE = COLLECTIONS_MAX_RECORDS
+
+
+class LockRetryBulkBackend:
+    '''
+    Sends the records that failed on a retryable error again, after a growing delay and in
+    smaller and smaller batches, and puts their new results in place of the failed ones.
+    '''
+
+    def __init__(self, backend, retries=DEFAULT_LOCK_RETRIES, retry_delay=DEFAULT_LOCK_RETRY_DELAY, retry_batch_size=DEFAULT_RETRY_BATCH_SIZE):
+        self.backend = backend
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.retry_batch_size = retry_batch_size
+
+    @property
+    def stats(self):
+        return getattr(self.backend, 'stats', {})
+
+    def insert(self, table, records):
+        return self.run('insert', table, records)
+
+    def upsert(self, table, records, external_id_field):
+        return self.run('upsert', table, records, external_id_field)
+
+    def delete(self, table, records):
+        return self.run('delete', table, records)
+
+    def run(self, operation, table, records, *args):
+        results = list(getattr(self.backend, operation)(table, records, *args))
+
+        for attempt in range(1, self.retries + 1):
+            failed = [i for i, result in enumerate(results) if is_retryable_failure(result)]
+            if not failed:
+                break
+
+            batch_size = get_retry_batch_size(self.retry_batch_size, attempt)
+            log.warning(f"{len(failed)} {table} records failed on a retryable error, retrying them in batches of {batch_size} ({attempt}/{self.retries})")
+            time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+            for i in range(0, len(failed), batch_size):
+                indexes = failed[i:i + batch_size]
+                retry_results = getattr(self.backend, operation)(table, [records[index] for index in indexes], *args)
+                for index, result in zip(indexes, retry_results):
+                    results[index] = result
+
+        return results
+
+
+class BulkOutcome:
+    '''
+    The results of a bulk call split per record: the indexes of the records that succeeded, of
+    the ones that still failed on a retryable error once the retries ran out, and of the ones
+    gus rejected (validation rules, invalid references...), which fail the same way if sent again.
+    '''
+
+    def __init__(self, records, results):
+        self.records = records
+        self.results = results
+        self.succeeded = [i for i, result in enumerate(results) if result['success']]
+        self.transient = [i for i, result in enumerate(results) if is_retryable_failure(result)]
+        self.rejected = [i for i, result in enumerate(results) if not result['success'] and not is_retryable_failure(result)]
+
+    @property
+    def failed(self):
+        return sorted(self.transient + self.rejected)
+
+    def get_ids(self, get_key):
+        return {get_key(self.records[i]): self.results[i]['id'] for i in self.succeeded}
+
+
+def get_retry_batch_size(retry_batch_size, attempt):
+    return max(1, retry_batch_size >> (attempt - 1))
+
+
+def is_retryable_failure(result):
+    return not result['success'] and any(error.get('statusCode') in RETRYABLE_RECORD_ERRORS for error in result['errors'])
+
+
+def to_bulk_result(result, created):
+    return {
+        'success': result['success'],
+        'created': result['success'] and result.get('created', created),
+        'id': result.get('id'),
+        'errors': result.get('errors', []),
+    }
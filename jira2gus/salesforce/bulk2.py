@@ -0,0 +1,246 @@
+import collections
+import csv
+import hashlib
+import io
+import json
+import tempfile
+import time
+
+from jira2gus import logger_wrapper
+
+
+log = logger_wrapper.get_logger(__name__)
+
+
+BULK2_API_VERSION = '47.0'
+
+# a job upload may hold 150MB once base64 encoded by salesforce, which is about 100MB of csv
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+SPOOL_MEMORY_BYTES = 1024 * 1024
+
+NULL_VALUE = '#N/A'
+FINAL_STATES = ('JobComplete', 'Failed', 'Aborted')
+
+# a job still running after this many seconds is aborted
+DEFAULT_JOB_TIMEOUT = 3600
+
+# the error of a row that got no result row gus can be matched to. It may have been written,
+# so it is not sent again
+UNMATCHED_RESULT = 'UNMATCHED_RESULT'
+
+
+class Bulk2Backend:
+    '''
+    Bulk operations through bulk api 2.0 ingest jobs. Records are written as csv to a spooled
+    file per job, so memory stays bounded, and the result csvs are mapped back to input rows.
+    '''
+
+    def __init__(self, rest_client, max_upload_bytes=MAX_UPLOAD_BYTES, poll_interval=0.5, max_poll_interval=5, job_timeout=DEFAULT_JOB_TIMEOUT):
+        self.rest_client = rest_client
+        self.max_upload_bytes = max_upload_bytes
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.job_timeout = job_timeout
+
+    @property
+    def ingest_url(self):
+        return self.rest_client.base_url.replace(self.rest_client.sf_version, BULK2_API_VERSION) + 'jobs/ingest/'
+
+    def insert(self, table, records):
+        return self.run(table, 'insert', records)
+
+    def upsert(self, table, records, external_id_field):
+        return self.run(table, 'upsert', records, external_id_field)
+
+    def delete(self, table, records):
+        return self.run(table, 'delete', [{'Id': record['Id']} for record in records])
+
+    def run(self, table, operation, records, external_id_field=None):
+        results = [None] * len(records)
+        if not records:
+            return results
+
+        columns = get_columns(records, external_id_field)
+        for rows, upload in iter_uploads(records, columns, self.max_upload_bytes):
+            with upload:
+                job_id = self.create_job(table, operation, external_id_field)
+                self.upload(job_id, upload)
+            job = self.wait_for_job(job_id)
+            self.collect_results(job, results, records, rows, columns)
+
+        return results
+
+    def create_job(self, table, operation, external_id_field):
+        payload = {'object': table, 'operation': operation, 'contentType': 'CSV', 'lineEnding': 'LF'}
+        if operation == 'upsert':
+            payload['externalIdFieldName'] = external_id_field
+
+        return self.call('POST', self.ingest_url, data=json.dumps(payload)).json()['id']
+
+    def upload(self, job_id, upload):
+        self.call('PUT', f"{self.ingest_url}{job_id}/batches", data=upload, headers={'Content-Type': 'text/csv'})
+        self.call('PATCH', f"{self.ingest_url}{job_id}", data=json.dumps({'state': 'UploadComplete'}))
+
+    def wait_for_job(self, job_id):
+        interval = self.poll_interval
+        deadline = time.monotonic() + self.job_timeout
+        while True:
+            job = self.call('GET', f"{self.ingest_url}{job_id}").json()
+            if job['state'] in FINAL_STATES:
+                return job
+            if time.monotonic() >= deadline:
+                self.abort_job(job_id)
+                raise RuntimeError(f"Bulk api 2.0 job {job_id} is still {job['state']} after {self.job_timeout}s, aborted it")
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+    def abort_job(self, job_id):
+        # the rows it already processed stay written, the rest are never applied
+        try:
+            self.call('PATCH', f"{self.ingest_url}{job_id}", data=json.dumps({'state': 'Aborted'}))
+        except RuntimeError:
+            log.warning(f"Could not abort bulk api 2.0 job {job_id}")
+
+    def collect_results(self, job, results, records, rows, columns):
+        match_results(job, results, records, rows, columns, self.iter_result_rows(job['id'], 'successfulResults'), self.iter_result_rows(job['id'], 'failedResults'),
+                      self.iter_result_rows(job['id'], 'unprocessedrecords'))
+
+    def iter_result_rows(self, job_id, result_type):
+        response = self.call('GET', f"{self.ingest_url}{job_id}/{result_type}/", stream=True)
+        response.raw.decode_content = True
+        response.raw.auto_close = False
+
+        # read straight from the socket, quoted values may span lines so the csv reader splits the rows
+        with io.TextIOWrapper(response.raw, encoding='utf-8', newline='') as lines:
+            reader = csv.reader(lines)
+            header = next(reader, None)
+            for row in reader:
+                yield dict(zip(header, row))
+
+    def call(self, method, url, **kwargs):
+        headers = dict(self.rest_client.headers)
+        headers.update(kwargs.pop('headers', {}))
+
+        result = self.rest_client.session.request(method, url, headers=headers, **kwargs)
+        if result.status_code >= 300:
+            raise RuntimeError(f"Bulk api 2.0 {method} {url} failed with {result.status_code}: {result.text}")
+
+        return result
+
+
+def iter_uploads(records, columns, max_upload_bytes):
+    header = encode_row(columns)
+    upload, first_row = None, 0
+
+    for i, record in enumerate(records):
+        row = encode_row([get_cell(record, column) for column in columns])
+        if upload is not None and upload.tell() + len(row) > max_upload_bytes:
+            upload.seek(0)
+            yield range(first_row, i), upload
+            upload = None
+
+        if upload is None:
+            upload, first_row = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES), i
+            upload.write(header)
+        upload.write(row)
+
+    upload.seek(0)
+    yield range(first_row, len(records)), upload
+
+
+def match_results(job, results, records, rows, columns, successful_rows, failed_rows, unprocessed_rows):
+    # result rows echo the uploaded columns, identical rows are matched in input order
+    pending_rows = {}
+    for i in rows:
+        digest = row_digest(get_cell(records[i], column) for column in columns)
+        if digest not in pending_rows:
+            pending_rows[digest] = i
+        elif isinstance(pending_rows[digest], int):
+            pending_rows[digest] = collections.deque((pending_rows[digest], i))
+        else:
+            pending_rows[digest].append(i)
+    unmatched = 0
+
+    for row in successful_rows:
+        result = {'success': True, 'created': row['sf__Created'] == 'true', 'id': row['sf__Id'], 'errors': []}
+        unmatched += not assign_result(result, row, columns, pending_rows, results)
+
+    for row in failed_rows:
+        result = {'success': False, 'created': False, 'id': row['sf__Id'] or None, 'errors': [parse_error(row['sf__Error'])]}
+        unmatched += not assign_result(result, row, columns, pending_rows, results)
+
+    # only the rows the job lists as unprocessed were never applied, they can be sent again
+    unprocessed_error = {'statusCode': 'UNPROCESSED', 'message': job.get('errorMessage') or f"Job {job['id']} ended as {job['state']} before processing this row", 'fields': []}
+    for row in unprocessed_rows:
+        unmatched += not assign_result({'success': False, 'created': False, 'id': None, 'errors': [unprocessed_error]}, row, columns, pending_rows, results)
+
+    # a result row that matches no input row can't be told apart from another one, its id is
+    # never given to a row. The rows left without a result may have been written, they fail
+    # with an error that is not retried
+    if unmatched:
+        log.warning(f"{unmatched} result rows of bulk api 2.0 job {job['id']} match no uploaded row, ignoring them")
+
+    unmatched_error = {'statusCode': UNMATCHED_RESULT, 'message': f"No result of job {job['id']} ({job['state']}) matches this row, it may have been written", 'fields': []}
+    for indexes in pending_rows.values():
+        for i in ([indexes] if isinstance(indexes, int) else indexes):
+            results[i] = {'success': False, 'created': False, 'id': None, 'errors': [unmatched_error]}
+
+
+def assign_result(result, row, columns, pending_rows, results):
+    digest = row_digest(row.get(column, '') for column in columns)
+    indexes = pending_rows.get(digest)
+    if indexes is None:
+        return False
+    if isinstance(indexes, int):
+        results[pending_rows.pop(digest)] = result
+    else:
+        results[indexes.popleft()] = result
+        if not indexes:
+            del pending_rows[digest]
+    return True
+
+
+def parse_error(error):
+    # STATUS_CODE:message:field1,field2--
+    status_code, _, detail = error.partition(':')
+    if detail.endswith('--'):
+        message, _, fields = detail[:-2].rpartition(':')
+    else:
+        message, fields = detail, ''
+    return {'statusCode': status_code, 'message': message, 'fields': [field for field in fields.split(',') if field]}
+
+
+def row_digest(values):
+    # a short digest instead of the row values keeps the lookup small for big jobs
+    return hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=16).digest()
+
+
+def get_columns(records, external_id_field=None):
+    # an upsert needs the external id column even when no record has a value for it
+    columns = {external_id_field: None} if external_id_field else {}
+    for record in records:
+        for column in record:
+            if column != 'attributes':
+                columns[column] = None
+    return list(columns)
+
+
+def get_cell(record, column):
+    # a column the record does not have is left empty, which keeps the field as it is
+    return format_value(record[column]) if column in record else ''
+
+
+def format_value(value):
+    if value is None:
+        return NULL_VALUE
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return str(value)
+
+
+def encode_row(values):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(values)
+    return buffer.getvalue().encode('utf-8')
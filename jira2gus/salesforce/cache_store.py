@@ -0,0 +1,117 @@
+import contextlib
+import fcntl
+import json
+import os
+import re
+import tempfile
+
+from datetime import datetime, timedelta
+
+from jira2gus.salesforce.compact_map import CompactMap
+
+
+class CacheStore:
+    '''
+    On-disk snapshots of GUS lookup tables, one json file per org, table and key field.
+    A snapshot younger than the ttl is refreshed incrementally using LastModifiedDate,
+    an older one is reloaded from scratch. compact snapshots keep their entries in a
+    CompactMap file next to the json, which is opened with mmap instead of being parsed.
+    Writes hold an exclusive lock on a .lock file next to the snapshot, so processes sharing
+    the directory merge their entries instead of overwriting each other's.
+    '''
+
+    def __init__(self, directory, org, ttl=timedelta(hours=24), compact=False):
+        self.directory = os.path.join(directory, _safe_name(org))
+        self.ttl = ttl
+        self.compact = compact
+
+    def load(self, table, key_field, scope=''):
+        path = self.get_path(table, key_field, scope)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r") as f:
+                snapshot = json.load(f)
+        except ValueError:
+            return None
+
+        if snapshot.get('compact'):
+            map_path = self.get_map_path(path)
+            if not self.compact or not os.path.exists(map_path):
+                return None
+            snapshot['entries'] = CompactMap.open(map_path)
+            return snapshot
+
+        snapshot['entries'] = {_to_key(key): value for key, value in snapshot['entries']}
+        return snapshot
+
+    def is_expired(self, snapshot):
+        created = datetime.strptime(snapshot['created'], "%Y-%m-%dT%H:%M:%S")
+        return datetime.utcnow() - created > self.ttl
+
+    def save(self, table, key_field, entries, watermark=None, scope='', created=None):
+        with self.lock(table, key_field, scope):
+            self.write(table, key_field, entries, watermark, scope, created)
+
+    def write(self, table, key_field, entries, watermark=None, scope='', created=None):
+        snapshot = {
+            'created': created or datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S"),
+            'watermark': watermark,
+            'entries': [] if self.compact else [[_from_key(key), value] for key, value in entries.items()],
+            'compact': self.compact,
+        }
+
+        if self.compact:
+            # the entries go first, a json pointing at a missing map is read as no snapshot
+            (entries if isinstance(entries, CompactMap) else CompactMap(entries)).save(self.get_map_path(self.get_path(table, key_field, scope)))
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.get_path(table, key_field, scope))
+
+    def update(self, table, key_field, entries, scope=''):
+        if not entries:
+            return
+
+        # the snapshot is read again under the lock, entries another process saved meanwhile are kept
+        with self.lock(table, key_field, scope):
+            snapshot = self.load(table, key_field, scope)
+            if snapshot is None:
+                self.write(table, key_field, entries, scope=scope)
+                return
+
+            snapshot['entries'].update(entries)
+            self.write(table, key_field, snapshot['entries'], snapshot['watermark'], scope, snapshot['created'])
+
+    @contextlib.contextmanager
+    def lock(self, table, key_field, scope=''):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.get_path(table, key_field, scope)[:-len(".json")] + ".lock", "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def get_path(self, table, key_field, scope=''):
+        name = f"{table}.{key_field}"
+        if scope:
+            name += f".{_safe_name(scope)}"
+        return os.path.join(self.directory, f"{name}.json")
+
+    @staticmethod
+    def get_map_path(path):
+        return path[:-len(".json")] + ".map"
+
+
+def _safe_name(value):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', value)
+
+
+def _from_key(key):
+    return list(key) if isinstance(key, tuple) else key
+
+
+def _to_key(key):
+    return tuple(key) if isinstance(key, list) else key
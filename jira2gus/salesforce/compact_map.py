@@ -0,0 +1,162 @@
+import array
+import bisect
+import itertools
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+from collections.abc import MutableMapping
+
+
+MAGIC = b'J2GM'
+VERSION = 1
+
+# magic, version, number of entries, bytes of packed keys, bytes of packed values
+HEADER = struct.Struct('<4sIQQQ')
+
+# entries set after packing stay in a dict until they are as many as the packed ones, at least this many
+MIN_COMPACT_SIZE = 1024
+
+# joins the parts of a tuple key, e.g. (team id, sprint name)
+TUPLE_SEPARATOR = '\x1f'
+
+
+class CompactMap(MutableMapping):
+    '''
+    A mapping of str (or tuple of str) keys to str values packed into a few flat buffers: keys
+    and values utf-8 encoded back to back, their offsets, and a stable 32 bit hash per key, all
+    sorted by hash and looked up with a binary search. Entries set later are kept in a dict until
+    compact() packs them too. A map saved to a file is opened with mmap, so every process reading
+    the same file shares its pages instead of holding a copy. Not thread safe, a reader must not
+    run while compact() repacks the buffers.
+    '''
+
+    def __init__(self, entries=()):
+        self.added = {}
+        self.pack(entries.items() if hasattr(entries, 'items') else entries)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        magic, version, count, keys_size, values_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a compact map file")
+
+        compact_map = cls.__new__(cls)
+        compact_map.added = {}
+        compact_map.count = count
+
+        position = HEADER.size
+        for name, size, item_format in (('hashes', 4 * count, 'I'), ('key_offsets', 4 * (count + 1), 'I'), ('value_offsets', 4 * (count + 1), 'I'), ('key_bytes', keys_size, None), ('value_bytes', values_size, None)):
+            view = buffer[position:position + size]
+            setattr(compact_map, name, view.cast(item_format) if item_format else view)
+            position += size
+        return compact_map
+
+    def save(self, path):
+        self.compact()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # written aside and renamed, processes that mapped the previous file keep reading it
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.count, len(self.key_bytes), len(self.value_bytes)))
+            for buffer in (self.hashes, self.key_offsets, self.value_offsets, self.key_bytes, self.value_bytes):
+                f.write(buffer)
+        os.replace(tmp_path, path)
+
+    def pack(self, entries):
+        items = sorted((stable_hash(key), key, value) for key, value in ((encode(key), encode(value)) for key, value in entries))
+
+        self.count = len(items)
+        self.hashes = array.array('I', (item[0] for item in items))
+        self.key_offsets = array.array('I', itertools.accumulate((len(item[1]) for item in items), initial=0))
+        self.value_offsets = array.array('I', itertools.accumulate((len(item[2]) for item in items), initial=0))
+        self.key_bytes = b''.join(item[1] for item in items)
+        self.value_bytes = b''.join(item[2] for item in items)
+
+    def compact(self):
+        if not self.added:
+            return
+
+        added, self.added = self.added, {}
+        self.pack(itertools.chain(((key, value) for key, value in self.iter_packed() if key not in added), added.items()))
+
+    def find(self, key):
+        encoded = encode(key)
+        key_hash = stable_hash(encoded)
+        i = bisect.bisect_left(self.hashes, key_hash)
+        while i < self.count and self.hashes[i] == key_hash:
+            if self.key_bytes[self.key_offsets[i]:self.key_offsets[i + 1]] == encoded:
+                return i
+            i += 1
+        return -1
+
+    def iter_packed(self):
+        for i in range(self.count):
+            yield decode(self.key_bytes[self.key_offsets[i]:self.key_offsets[i + 1]]), decode(self.value_bytes[self.value_offsets[i]:self.value_offsets[i + 1]])
+
+    def __getitem__(self, key):
+        if key in self.added:
+            return self.added[key]
+
+        i = self.find(key)
+        if i < 0:
+            raise KeyError(key)
+        return decode(self.value_bytes[self.value_offsets[i]:self.value_offsets[i + 1]])
+
+    def __contains__(self, key):
+        return key in self.added or self.find(key) >= 0
+
+    def __setitem__(self, key, value):
+        self.added[key] = value
+        if len(self.added) >= max(MIN_COMPACT_SIZE, self.count):
+            self.compact()
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+
+        entries = [(other_key, value) for other_key, value in self.items() if other_key != key]
+        self.added = {}
+        self.pack(entries)
+
+    def __iter__(self):
+        for key, _ in self.iter_packed():
+            if key not in self.added:
+                yield key
+        yield from list(self.added)
+
+    def __len__(self):
+        return self.count + sum(1 for key in self.added if self.find(key) < 0)
+
+    def update(self, entries=(), **kwargs):
+        self.added.update(entries, **kwargs)
+        if len(self.added) >= max(MIN_COMPACT_SIZE, self.count):
+            self.compact()
+
+
+def stable_hash(data):
+    # the same in every process, unlike hash() of a str. Keys sharing a hash are told apart by the bytes
+    return zlib.crc32(data)
+
+
+def encode(value):
+    if value is None:
+        return b'n'
+    if isinstance(value, tuple):
+        return b't' + TUPLE_SEPARATOR.join(value).encode()
+    return b's' + value.encode()
+
+
+def decode(data):
+    data = bytes(data)
+    if data == b'n':
+        return None
+    text = data[1:].decode()
+    return tuple(text.split(TUPLE_SEPARATOR)) if data[:1] == b't' else text
@@ -0,0 +1,38 @@
+import json
+import os
+import threading
+import time
+
+
+class DeadLetterFile:
+    '''
+    Append-only jsonl file of the records a bulk call could not write, one line each with the
+    table, the operation, the record as it was sent and the errors gus returned. retryable is
+    true for records that failed on contention until the retries ran out, they can be sent
+    again as they are. Every call is synced before returning.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "a")
+
+    def record(self, table, operation, outcome):
+        transient = set(outcome.transient)
+        lines = [json.dumps({'time': time.time(), 'table': table, 'operation': operation, 'record': outcome.records[i], 'errors': outcome.results[i]['errors'],
+                             'retryable': i in transient}, default=str) + "\n" for i in outcome.failed]
+        if not lines:
+            return
+
+        with self.lock:
+            self.file.writelines(lines)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.count += len(lines)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
@@ -0,0 +1,76 @@
+def _exception_handler(result, name=""):
+    url = result.url
+    try:
+        response_content = result.json()
+    except Exception:
+        response_content = result.text
+
+    if result.status_code == 300:
+        message = f"More than one record for {url}. Response content: {response_content}"
+        raise SalesforceMoreThanOneRecord(message)
+    elif result.status_code == 400:
+        message = f"Malformed request {url}. Response content: {response_content}"
+        raise SalesforceMalformedRequest(message)
+    elif result.status_code == 401:
+        message = f"Expired session for {url}. Response content: {response_content}"
+        raise SalesforceExpiredSession(message)
+    elif result.status_code == 403:
+        message = f"Request refused for {url}. Resonse content: {response_content}"
+        raise SalesforceRefusedRequest(message)
+    elif result.status_code == 404:
+        message = f"Resource {name} Not Found. Response content: {response_content}"
+        raise SalesforceResourceNotFound(message)
+    else:
+        message = f"Error Code {result.status_code}. Response content: {response_content}"
+        raise SalesforceGeneralError(message)
+
+
+class SalesforceMoreThanOneRecord(Exception):
+    '''
+    Error Code: 300
+    The value returned when an external ID exists in more than one record. The
+    response body contains the list of matching records.
+    '''
+    pass
+
+
+class SalesforceMalformedRequest(Exception):
+    '''
+    Error Code: 400
+    The request couldn't be understood, usually becaue the JSON or XML body contains an error.
+    '''
+    pass
+
+
+class SalesforceExpiredSession(Exception):
+    '''
+    Error Code: 401
+    The session ID or OAuth token used has expired or is invalid. The response
+    body contains the message and errorCode.
+    '''
+    pass
+
+
+class SalesforceRefusedRequest(Exception):
+    '''
+    Error Code: 403
+    The request has been refused. Verify that the logged-in user has
+    appropriate permissions.
+    '''
+    pass
+
+
+class SalesforceResourceNotFound(Exception):
+    '''
+    Error Code: 404
+    The requested resource couldn't be found. Check the URI for errors, and
+    verify that there are no sharing issues.
+    '''
+    pass
+
+
+class SalesforceGeneralError(Exception):
+    '''
+    A non-specific Salesforce error.
+    '''
+    pass
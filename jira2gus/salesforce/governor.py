@@ -0,0 +1,111 @@
+import random
+import threading
+import time
+
+from jira2gus import logger_wrapper
+from jira2gus.salesforce.telemetry import LIMIT_INFO
+
+
+log = logger_wrapper.get_logger(__name__)
+
+DEFAULT_RATE = 50
+DEFAULT_MIN_RATE = 1
+DEFAULT_MAX_CONCURRENCY = 20
+DEFAULT_MAX_RETRIES = 5
+MAX_BACKOFF = 60
+
+# above this share of the daily api limit the rate tapers down towards the minimum
+API_USAGE_THRESHOLD = 0.8
+
+THROTTLING_ERRORS = (b'REQUEST_LIMIT_EXCEEDED', b'ExceededQuota')
+
+
+class RequestGovernor:
+    '''
+    Paces the requests of every client sharing an http session: a token bucket caps the
+    request rate and a semaphore the requests in flight. The rate is halved on throttling
+    and server errors, tapers when the org nears its daily api limit and climbs back
+    additively while requests succeed.
+    '''
+
+    def __init__(self, rate=DEFAULT_RATE, max_concurrency=DEFAULT_MAX_CONCURRENCY, min_rate=DEFAULT_MIN_RATE, max_retries=DEFAULT_MAX_RETRIES):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.ceiling = rate
+        self.max_retries = max_retries
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.stats = {'requests': 0, 'throttled': 0, 'wait_seconds': 0.0}
+
+    def acquire(self):
+        start = time.monotonic()
+        self.slots.acquire()
+
+        wait = self.take_token()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.take_token()
+
+        self.record_wait(time.monotonic() - start)
+
+    def release(self):
+        self.slots.release()
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['wait_seconds'] += seconds
+
+    def take_token(self):
+        with self.lock:
+            now = time.monotonic()
+            # the bucket holds at most a second worth of requests
+            self.tokens = min(max(self.rate, 1), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def feedback(self, response):
+        throttled = is_throttled(response)
+        limit_info = LIMIT_INFO.search(response.headers.get('Sforce-Limit-Info', ''))
+
+        with self.lock:
+            if limit_info:
+                usage = int(limit_info.group(1)) / max(int(limit_info.group(2)), 1)
+                self.ceiling = self.max_rate if usage < API_USAGE_THRESHOLD else max(self.min_rate, self.max_rate * (1 - usage) / (1 - API_USAGE_THRESHOLD))
+
+            if throttled or response.status_code >= 500:
+                self.rate = max(self.min_rate, self.rate / 2)
+                if throttled:
+                    self.stats['throttled'] += 1
+                    log.warning(f"Salesforce throttled a request ({response.status_code}), slowing down to {self.rate:.1f} requests per second")
+            else:
+                self.rate = min(self.ceiling, self.rate + self.max_rate / 20)
+
+            self.rate = min(self.rate, self.ceiling)
+
+        return throttled
+
+    def get_backoff(self, attempt, response):
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(int(retry_after), MAX_BACKOFF)
+        return min(MAX_BACKOFF, 2 ** attempt) * random.uniform(0.5, 1)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, rate=self.rate)
+
+
+def is_throttled(response):
+    if response.status_code == 429:
+        return True
+    if response.status_code not in (400, 403, 503):
+        return False
+    return any(error in response.content for error in THROTTLING_ERRORS)
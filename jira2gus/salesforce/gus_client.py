@@ -1,31 +1,89 @@
 import collections
 import functools
-import math
+import threading
+import time
 
-from datetime import datetime, timedelta, date
-
-import numpy
-
-from simple_salesforce import format_soql
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 
+from jira2gus import logger_wrapper
 from jira2gus.salesforce.base_client import BaseClient
+from jira2gus.salesforce.bulk import AutoBulkBackend, BulkOutcome, CollectionsBackend, LegacyBulkBackend, LockRetryBulkBackend, DEFAULT_SMALL_BATCH_THRESHOLD
+from jira2gus.salesforce.compact_map import CompactMap
+from jira2gus.salesforce.soql import chunked, chunk_in_values, format_soql
+from jira2gus.salesforce.sprint_index import SprintIntervalIndex, DEFAULT_HORIZON_START, DEFAULT_HORIZON_END
+from jira2gus.salesforce.telemetry import in_context
+
+
+log = logger_wrapper.get_logger(__name__)
+
+# table -> (key field, value field), loaded on construction or on first use in lazy mode
+LOOKUP_TABLES = {
+    'ADM_Frequency__c': ('Name', 'Id'),
+    'ADM_Impact__c': ('Name', 'Id'),
+    'RecordType': ('Name', 'Id'),
+    'User': ('Email', 'Id'),
+    'ADM_Scrum_Team__c': ('Id', 'Name'),
+}
+
+LOOKUP_QUERY_CHUNK_SIZE = 200
+
+# above this many keys a single scan of the teams' work items is cheaper than the chunked key queries
+EXISTING_KEYS_FULL_SCAN_THRESHOLD = 20000
+QUERY_CONCURRENCY = 4
+
+# tables holding the children of a work item, and the field pointing at the work item
+WORK_CONNECTED_TABLES = (
+    ('ADM_Work__Feed', 'ParentId'),
+    ('ADM_Task__c', 'Work__c'),
+    ('ADM_Acceptance_Criterion__c', 'Work__c'),
+    ('ADM_Change_List__c', 'Work__c'),
+    ('ADM_Theme_Assignment__c', 'Work__c'),
+)
+WORK_IDS_CHUNK_SIZE = 200
+DELETE_BATCH_SIZE = 10000
 
 
 class GusClient(BaseClient):
 
-    def __init__(self, instance, user, password, cloud_id):
-        BaseClient.__init__(self, user=user, password=password, instance=instance)
+    def __init__(self, instance, user, password, cloud_id,
+                 cache_store=None, lazy=False, compact_cache=False,
+                 session_cache=None, http_session=None,
+                 bulk_backend=None, small_batch_threshold=DEFAULT_SMALL_BATCH_THRESHOLD, dead_letters=None,
+                 sprint_horizon=(DEFAULT_HORIZON_START, DEFAULT_HORIZON_END),
+                 query_prefetch=True, feed_page_size=None):
+        BaseClient.__init__(self, user=user, password=password, instance=instance, session_cache=session_cache, http_session=http_session)
 
         self.sf_session = self.client
+        self.bulk = bulk_backend(self.sf_session) if bulk_backend else LegacyBulkBackend(self.sf_session)
+        if small_batch_threshold:
+            self.bulk = AutoBulkBackend(CollectionsBackend(self.sf_session), self.bulk, small_batch_threshold)
+        self.bulk = LockRetryBulkBackend(self.bulk)
         self.server = f"https://{instance}"
         self.cloud_id = cloud_id
-
-        self.cache = collections.defaultdict(functools.partial(collections.defaultdict, dict))
-        self.populate_gus_cache('ADM_Frequency__c', 'Name', 'Id')
-        self.populate_gus_cache('ADM_Impact__c', 'Name', 'Id')
-        self.populate_gus_cache('RecordType', 'Name', 'Id')
-        self.populate_gus_cache('User', 'Email', 'Id')
-        self.populate_gus_cache('ADM_Scrum_Team__c', 'Id', 'Name', 'Cloud_LU__c', [self.cloud_id])
+        self.cache_store = cache_store
+        self.lazy = lazy
+        self.sprint_horizon = sprint_horizon
+        self.query_prefetch = query_prefetch
+        self.feed_page_size = feed_page_size
+        self.dead_letters = dead_letters
+
+        self.cache = collections.defaultdict(functools.partial(collections.defaultdict, CompactMap if compact_cache else dict))
+        # the sprint indexes per team are objects, not ids
+        self.cache['ADM_Sprint__c']['Scrum_Team__c'] = {}
+        self.loaded_tables = set()
+        self.resolved_keys = collections.defaultdict(set)
+        # the rows of a job share the client from several threads, a cached table is read and
+        # filled under its lock so a miss is resolved, or an item created, once
+        self.cache_locks = collections.defaultdict(threading.RLock)
+        self.cache_locks_guard = threading.Lock()
+
+        if not lazy:
+            self.warm_lookup_tables()
+
+        self.load_saved_cache_entries('ADM_Epic__c', 'Team__c_Name')
+        self.load_saved_cache_entries('ADM_Theme__c', 'Name')
+        self.load_saved_cache_entries('ADM_Sprint__c', 'Scrum_Team__c_Name')
 
     ###########################################################################
     # Get From Gus
@@ -38,23 +96,47 @@ class GusClient(BaseClient):
     def get_product_tag_record(self, product_tag_id):
         return self.sf_session.ADM_Product_Tag__c.get(product_tag_id)
 
+    def iter_work_item_feed(self, work_id):
+        return self.sf_session.iter_object_feed(work_id, page_size=self.feed_page_size)
+
+    def get_work_item_feeds(self, work_ids):
+        return self.sf_session.get_object_feeds(work_ids, page_size=self.feed_page_size)
+
+    def get_product_tag_teams(self, product_tag_ids):
+        queries = [format_soql("select Id, Team__c from ADM_Product_Tag__c where Id IN {ids}", ids=ids_group) for ids_group in chunked(sorted(set(product_tag_ids)), LOOKUP_QUERY_CHUNK_SIZE)]
+        return {record['Id']: record['Team__c'] for record in self.query_concurrently(queries)}
+
+    def get_work_item_fields(self, work_ids, fields):
+        queries = [f"select Id, {', '.join(fields)} from ADM_Work__c where Id IN {format_soql('{ids}', ids=ids_group)}" for ids_group in chunked(sorted(set(work_ids)), LOOKUP_QUERY_CHUNK_SIZE)]
+        return {record['Id']: record for record in self.query_concurrently(queries)}
+
+    def get_theme_assignments(self, work_ids):
+        queries = [f"select Work__c, Theme__c from ADM_Theme_Assignment__c where Work__c IN {format_soql('{ids}', ids=ids_group)}" for ids_group in chunked(sorted(set(work_ids)), LOOKUP_QUERY_CHUNK_SIZE)]
+        return {(record['Work__c'], record['Theme__c']) for record in self.query_concurrently(queries)}
+
     def get_existing_keys(self, keys):
+        existing_work_items, invalid_work_items = self.get_existing_work_items(keys)
+        return {jira_key: record['Id'] for jira_key, record in existing_work_items.items()}, invalid_work_items
+
+    def get_existing_work_items(self, keys):
+        # the Id and Test_Failure_Status__c of the work item kept per jira key, and the ids of the others
         keys = set(keys)
         teams = self.get_team_ids()
 
-        result = self.sf_session.query_all(format_soql("Select Id,ftest__c,Test_Failure_Status__c from ADM_Work__c where Scrum_Team__c in {teams}", teams=teams))
-        relevant_records = [record for record in result['records'] if record['ftest__c'] in keys]
+        query = format_soql("Select Id,ftest__c,Test_Failure_Status__c from ADM_Work__c where Scrum_Team__c in {teams}", teams=teams)
 
         valid_work_items = collections.defaultdict(list)
-        for record in relevant_records:
+        invalid_work_items = []
+        for record in self.query_work_items_by_keys(query, keys):
             if record['Test_Failure_Status__c'] in ('Blocking', 'Signed Off'):
-                valid_work_items[record['ftest__c']].append(record['Id'])
+                valid_work_items[record['ftest__c']].append(record)
+            else:
+                invalid_work_items.append(record['Id'])
 
-        selected_valid_work_items = {jira_key: work_ids.pop() for jira_key, work_ids in valid_work_items.items()}
+        selected_valid_work_items = {jira_key: records.pop() for jira_key, records in valid_work_items.items()}
 
-        invalid_work_items = [record['Id'] for record in relevant_records if record['Test_Failure_Status__c'] not in ('Blocking', 'Signed Off')]
-        for work_ids in valid_work_items.values():
-            invalid_work_items.extend(work_ids)
+        for records in valid_work_items.values():
+            invalid_work_items.extend(record['Id'] for record in records)
 
         return selected_valid_work_items, invalid_work_items
 
@@ -62,11 +144,10 @@ class GusClient(BaseClient):
         keys = set(keys)
         teams = self.get_team_ids()
 
-        result = self.sf_session.query_all(format_soql("Select Id,ftest__c from ADM_Work__c where Scrum_Team__c in {teams} and Test_Failure_Status__c='Blocking'", teams=teams))
-        relevant_records = [record for record in result['records'] if record['ftest__c'] in keys]
+        query = format_soql("Select Id,ftest__c from ADM_Work__c where Scrum_Team__c in {teams} and Test_Failure_Status__c='Blocking'", teams=teams)
 
         valid_work_items = collections.defaultdict(list)
-        for record in relevant_records:
+        for record in self.query_work_items_by_keys(query, keys):
             valid_work_items[record['ftest__c']].append(record['Id'])
 
         work_items = {jira_key: work_ids.pop() for jira_key, work_ids in valid_work_items.items()}
@@ -91,151 +172,311 @@ class GusClient(BaseClient):
 
     def clear_work_items(self, work_ids):
         if not work_ids:
-            return
+            return {}
+
+        stats = self.delete_connected_items(WORK_CONNECTED_TABLES, work_ids)
+        for table, table_stats in stats.items():
+            log.info(f"Cleared {table_stats['deleted']} {table} records (query {table_stats['query_seconds']:.1f}s, delete {table_stats['delete_seconds']:.1f}s)")
 
-        self.delete_work_connected_items('ADM_Work__Feed', 'ParentId', work_ids)
-        self.delete_work_connected_items('ADM_Task__c', 'Work__c', work_ids)
-        self.delete_work_connected_items('ADM_Acceptance_Criterion__c', 'Work__c', work_ids)
-        self.delete_work_connected_items('ADM_Change_List__c', 'Work__c', work_ids)
-        self.delete_work_connected_items('ADM_Theme_Assignment__c', 'Work__c', work_ids)
+        return stats
 
     def create_work_items(self, work_items):
         work_items = [work_item for work_item in work_items if work_item]
         if not work_items:
             return
 
-        response = self.sf_session.bulk.ADM_Work__c.upsert(work_items, 'Id')
-        self.check_response(response)
-
-        result = {}
-        for i in range(len(work_items)):
-            result[work_items[i]['Ftest__c']] = response[i]['id']
+        response = self.bulk.upsert('ADM_Work__c', work_items, 'Id')
+        outcome = self.check_response('ADM_Work__c', 'upsert', work_items, response)
 
-        return result
+        # only the work items gus accepted are mapped, the failed ones are in the dead letters
+        return outcome.get_ids(lambda work_item: work_item['Ftest__c'])
 
     def create_epics(self, epics):
-        self.create_items('ADM_Epic__c', 'Name', epics)
+        # an epic belongs to a team, the same name in another team is another epic
+        with self.cache_lock('ADM_Epic__c'):
+            cache = self.cache['ADM_Epic__c']['Team__c_Name']
+            unknown_epics = [epic for epic in epics if (epic['Team__c'], epic['Name']) not in cache]
+            if not unknown_epics:
+                return
+
+            teams = sorted({epic['Team__c'] for epic in unknown_epics})
+            new_entries = {}
+            for names_group in chunked(sorted({epic['Name'] for epic in unknown_epics}), LOOKUP_QUERY_CHUNK_SIZE):
+                query = format_soql("select Id, Name, Team__c from ADM_Epic__c where Team__c IN {teams} and Name IN {names}", teams=teams, names=names_group)
+                for record in self.iter_query(query):
+                    new_entries[(record['Team__c'], record['Name'])] = record['Id']
+            cache.update(new_entries)
+
+            new_epics = [epic for epic in unknown_epics if (epic['Team__c'], epic['Name']) not in cache]
+            if new_epics:
+                response = self.bulk.insert('ADM_Epic__c', new_epics)
+                outcome = self.check_response('ADM_Epic__c', 'insert', new_epics, response)
+                for i in outcome.succeeded:
+                    new_entries[(new_epics[i]['Team__c'], new_epics[i]['Name'])] = response[i]['id']
+                cache.update(new_entries)
+
+            self.save_cache_entries('ADM_Epic__c', 'Team__c_Name', new_entries)
 
     def create_themes(self, themes):
         self.create_items('ADM_Theme__c', 'Name', themes, True)
 
     def create_sprints(self, sprints):
-        unknown_sprints = [sprint for sprint in sprints if (sprint['Scrum_Team__c'], sprint['Name']) not in self.cache['ADM_Sprint__c']['Scrum_Team__c_Name']]
-        if not unknown_sprints:
-            return
+        with self.cache_lock('ADM_Sprint__c'):
+            unknown_sprints = [sprint for sprint in sprints if (sprint['Scrum_Team__c'], sprint['Name']) not in self.cache['ADM_Sprint__c']['Scrum_Team__c_Name']]
+            if not unknown_sprints:
+                return
 
-        teams = [sprint['Scrum_Team__c'] for sprint in sprints]
-        self.update_sprint_cache(teams)
+            teams = [sprint['Scrum_Team__c'] for sprint in sprints]
+            self.update_sprint_cache(teams)
 
-        new_sprints = [sprint for sprint in unknown_sprints if (sprint['Scrum_Team__c'], sprint['Name']) not in self.cache['ADM_Sprint__c']['Scrum_Team__c_Name']]
+            new_sprints = [sprint for sprint in unknown_sprints if (sprint['Scrum_Team__c'], sprint['Name']) not in self.cache['ADM_Sprint__c']['Scrum_Team__c_Name']]
 
-        if not new_sprints:
-            return
+            if not new_sprints:
+                self.save_cache_entries('ADM_Sprint__c', 'Scrum_Team__c_Name', self.cache['ADM_Sprint__c']['Scrum_Team__c_Name'])
+                return
 
-        for i in range(len(new_sprints)):
-            new_sprints[i]['Start_Date__c'], new_sprints[i]['End_Date__c'] = self.allocate_sprint_range(new_sprints[i]['Scrum_Team__c'], new_sprints[i]['Start_Date__c'], new_sprints[i]['End_Date__c'])
-            team_name = self.get_team_name(new_sprints[i]['Scrum_Team__c'])
-            new_sprints[i]['Name'] = self.generate_sprint_name(new_sprints[i]['Start_Date__c'], new_sprints[i]['Name'], team_name)
+            for i in range(len(new_sprints)):
+                new_sprints[i]['Start_Date__c'], new_sprints[i]['End_Date__c'] = self.allocate_sprint_range(new_sprints[i]['Scrum_Team__c'], new_sprints[i]['Start_Date__c'], new_sprints[i]['End_Date__c'])
+                team_name = self.get_team_name(new_sprints[i]['Scrum_Team__c'])
+                new_sprints[i]['Name'] = self.generate_sprint_name(new_sprints[i]['Start_Date__c'], new_sprints[i]['Name'], team_name)
 
-        response = self.sf_session.bulk.ADM_Sprint__c.insert(new_sprints)
-        self.check_response(response)
+            response = self.bulk.insert('ADM_Sprint__c', new_sprints)
+            outcome = self.check_response('ADM_Sprint__c', 'insert', new_sprints, response)
 
-        for i in range(len(new_sprints)):
-            team_name = self.get_team_name(new_sprints[i]['Scrum_Team__c'])
-            sprint_name = new_sprints[i]['Name'][10:-len(team_name)-3]
-            self.cache['ADM_Sprint__c']['Scrum_Team__c_Name'][(new_sprints[i]['Scrum_Team__c'], sprint_name)] = response[i]['id']
+            for i in outcome.succeeded:
+                team_name = self.get_team_name(new_sprints[i]['Scrum_Team__c'])
+                sprint_name = new_sprints[i]['Name'][10:-len(team_name)-3]
+                self.cache['ADM_Sprint__c']['Scrum_Team__c_Name'][(new_sprints[i]['Scrum_Team__c'], sprint_name)] = response[i]['id']
 
-    def create_chatter_attachment(self, messageText, obj=None, mention_ids=(), file_name="", file_data=None):
-        return self.client.chatter_on_object_with_attachment(messageText, obj, mention_ids, file_name, file_data)
+            self.save_cache_entries('ADM_Sprint__c', 'Scrum_Team__c_Name', self.cache['ADM_Sprint__c']['Scrum_Team__c_Name'])
+
+    def create_chatter_attachment(self, messageText, obj=None, mention_ids=(), file_name="", file_data=None, file_path=None, file_size=None):
+        return self.client.chatter_on_object_with_attachment(messageText, obj, mention_ids, file_name, file_data, file_path, file_size)
+
+    def create_chatter_file_link(self, messageText, obj, content_document_id):
+        return self.client.chatter_on_object_with_existing_file(messageText, obj, content_document_id)
 
     def create_items(self, table, identifier, items, lower=False):
-        unknown_items = self.filter_values_not_in_cache(table, identifier, items, lower)
-        unknown_items_values = [item[identifier] for item in unknown_items]
-        self.populate_gus_cache(table, identifier, 'Id', identifier, unknown_items_values, lower)
-        new_items = self.filter_values_not_in_cache(table, identifier, unknown_items, lower)
+        with self.cache_lock(table):
+            unknown_items = self.filter_values_not_in_cache(table, identifier, items, lower)
+            unknown_items_values = [item[identifier] for item in unknown_items]
+            found_entries = self.populate_gus_cache(table, identifier, 'Id', identifier, unknown_items_values, lower)
+            new_items = self.filter_values_not_in_cache(table, identifier, unknown_items, lower)
 
-        if not new_items:
-            return
+            if not new_items:
+                self.save_cache_entries(table, identifier, found_entries)
+                return
 
-        response = getattr(self.sf_session.bulk, table).insert(new_items)
-        self.check_response(response)
+            response = self.bulk.insert(table, new_items)
+            outcome = self.check_response(table, 'insert', new_items, response)
 
-        for i in range(len(new_items)):
-            if lower:
-                self.cache[table][identifier][new_items[i][identifier].lower()] = response[i]['id']
-            else:
-                self.cache[table][identifier][new_items[i][identifier]] = response[i]['id']
+            new_entries = dict(found_entries)
+            for i in outcome.succeeded:
+                key = new_items[i][identifier].lower() if lower else new_items[i][identifier]
+                self.cache[table][identifier][key] = response[i]['id']
+                new_entries[key] = response[i]['id']
+
+            self.save_cache_entries(table, identifier, new_entries)
 
     ###########################################################################
     # Assignments
     ###########################################################################
 
     def assign_themes(self, theme_assignments):
-        self.assign_items('ADM_Theme_Assignment__c', theme_assignments)
+        return self.assign_items('ADM_Theme_Assignment__c', theme_assignments)
 
     def assign_feeds(self, feeds):
-        self.assign_items('FeedItem', feeds)
+        return self.assign_items('FeedItem', feeds)
 
     def assign_changes(self, changes):
-        self.assign_items('ADM_Change_List__c', changes, False)
+        return self.assign_items('ADM_Change_List__c', changes, False)
 
     def assign_tasks(self, tasks):
-        self.assign_items('ADM_Task__c', tasks)
+        return self.assign_items('ADM_Task__c', tasks)
 
     def assign_acceptance_criterias(self, acceptance_criterias):
-        self.assign_items('ADM_Acceptance_Criterion__c', acceptance_criterias)
+        return self.assign_items('ADM_Acceptance_Criterion__c', acceptance_criterias)
 
     def assign_work_items(self, work_items_updates):
-        self.assign_items('ADM_Work__c', work_items_updates)
+        return self.assign_items('ADM_Work__c', work_items_updates)
 
     def assign_items(self, table, items, validate=True):
-        response = getattr(self.sf_session.bulk, table).upsert(items, 'Id')
-        if validate:
-            self.check_response(response)
+        response = self.bulk.upsert(table, items, 'Id')
+        return self.check_response(table, 'upsert', items, response) if validate else BulkOutcome(items, response)
 
     ###########################################################################
     # Get From Cache
     ###########################################################################
 
     def get_record_type_id(self, name):
-        return self.cache['RecordType']['Name'][name]
+        with self.cache_lock('RecordType'):
+            self.ensure_lookup_key('RecordType', name)
+            return self.cache['RecordType']['Name'][name]
 
-    def get_epic_id(self, name):
-        return self.cache['ADM_Epic__c']['Name'][name]
+    def get_epic_id(self, team, name):
+        # None for an epic gus failed to create, the caller decides what to write without it
+        with self.cache_lock('ADM_Epic__c'):
+            return self.cache['ADM_Epic__c']['Team__c_Name'].get((team, name))
 
     def get_theme_id(self, name):
-        return self.cache['ADM_Theme__c']['Name'][name.lower()]
+        # None for a theme gus failed to create, the caller decides what to write without it
+        with self.cache_lock('ADM_Theme__c'):
+            return self.cache['ADM_Theme__c']['Name'].get(name.lower())
 
     def get_sprint_id(self, team, name):
-        return self.cache['ADM_Sprint__c']['Scrum_Team__c_Name'][(team, name)]
+        with self.cache_lock('ADM_Sprint__c'):
+            return self.cache['ADM_Sprint__c']['Scrum_Team__c_Name'][(team, name)]
 
     def get_user_id(self, name):
-        return self.cache['User']['Email'].get(name, None)
+        with self.cache_lock('User'):
+            self.ensure_lookup_key('User', name)
+            return self.cache['User']['Email'].get(name, None)
 
     def get_impact_id(self, name):
-        return self.cache['ADM_Impact__c']['Name'][name]
+        with self.cache_lock('ADM_Impact__c'):
+            self.ensure_lookup_key('ADM_Impact__c', name)
+            return self.cache['ADM_Impact__c']['Name'][name]
 
     def get_frequency_id(self, name):
-        return self.cache['ADM_Frequency__c']['Name'][name]
+        with self.cache_lock('ADM_Frequency__c'):
+            self.ensure_lookup_key('ADM_Frequency__c', name)
+            return self.cache['ADM_Frequency__c']['Name'][name]
 
     def get_team_name(self, team_id):
-        return self.cache['ADM_Scrum_Team__c']['Id'][team_id]
+        with self.cache_lock('ADM_Scrum_Team__c'):
+            self.ensure_lookup_key('ADM_Scrum_Team__c', team_id)
+            return self.cache['ADM_Scrum_Team__c']['Id'][team_id]
 
     def get_team_ids(self):
-        return list(self.cache['ADM_Scrum_Team__c']['Id'].keys())
+        with self.cache_lock('ADM_Scrum_Team__c'):
+            self.load_lookup_table('ADM_Scrum_Team__c')
+            return list(self.cache['ADM_Scrum_Team__c']['Id'].keys())
+
+    def get_bulk_stats(self):
+        return getattr(self.bulk, 'stats', {})
+
+    ###########################################################################
+    # Lazy Lookups
+    ###########################################################################
+
+    def prefetch_user_ids(self, emails):
+        self.resolve_lookup_keys('User', emails)
+
+    def resolve_lookup_keys(self, table, keys):
+        with self.cache_lock(table):
+            if table in self.loaded_tables:
+                return
+
+            key_field, value_field, filter_field, filter_values = self.get_lookup_table_spec(table)
+            unknown_keys = {key for key in keys if key not in self.cache[table][key_field] and key not in self.resolved_keys[table]}
+
+            for keys_group in chunked(sorted(unknown_keys), LOOKUP_QUERY_CHUNK_SIZE):
+                query = f"select {key_field}, {value_field} from {table} where {key_field} IN {format_soql('{keys}', keys=keys_group)}"
+                if filter_values:
+                    query += f" and {filter_field} IN {format_soql('{filter_values}', filter_values=filter_values)}"
+
+                for record in self.iter_query(query):
+                    self.cache[table][key_field][record[key_field]] = record[value_field]
+
+            # keys missing from gus are remembered so they don't trigger a full table load
+            self.resolved_keys[table].update(unknown_keys)
+
+    def ensure_lookup_key(self, table, key):
+        # a key a lazy cache does not have is queried alone, the whole table is only loaded on request
+        self.resolve_lookup_keys(table, [key])
+
+    def warm_lookup_tables(self):
+        for table in LOOKUP_TABLES:
+            self.load_lookup_table(table)
+
+    def load_lookup_table(self, table):
+        with self.cache_lock(table):
+            if table in self.loaded_tables:
+                return
+
+            self.warm_gus_cache(table, *self.get_lookup_table_spec(table))
+            self.loaded_tables.add(table)
+
+    def cache_lock(self, table):
+        with self.cache_locks_guard:
+            return self.cache_locks[table]
+
+    def get_lookup_table_spec(self, table):
+        key_field, value_field = LOOKUP_TABLES[table]
+        if table == 'ADM_Scrum_Team__c':
+            return key_field, value_field, 'Cloud_LU__c', [self.cloud_id]
+        return key_field, value_field, None, None
 
     ###########################################################################
     # Private Methods
     ###########################################################################
 
     def populate_gus_cache(self, table, key_field, value_field, filter_field=None, filter_values=None, lower=False):
+        entries = {}
         if filter_values is not None and len(filter_values) == 0:
-            return
+            return entries
 
         for key_field_value, value_field_value in self.query_all(table, key_field, value_field, filter_field, filter_values):
             if lower:
                 key_field_value = key_field_value.lower()
             self.cache[table][key_field][key_field_value] = value_field_value
+            entries[key_field_value] = value_field_value
+
+        return entries
+
+    def warm_gus_cache(self, table, key_field, value_field, filter_field=None, filter_values=None):
+        if self.cache_store is None:
+            self.populate_gus_cache(table, key_field, value_field, filter_field, filter_values)
+            self.compact_cache(table, key_field)
+            return
+
+        scope = ','.join(filter_values or [])
+        snapshot = self.cache_store.load(table, key_field, scope)
+        if snapshot is None or snapshot['watermark'] is None or self.cache_store.is_expired(snapshot):
+            entries, watermark, created = {}, None, None
+        else:
+            entries, watermark, created = snapshot['entries'], snapshot['watermark'], snapshot['created']
+
+        # only rows changed since the last snapshot are fetched, the rest comes from disk
+        changed = False
+        for key_field_value, value_field_value, last_modified in self.query_modified_since(table, key_field, value_field, filter_field, filter_values, watermark):
+            entries[key_field_value] = value_field_value
+            changed = True
+            if watermark is None or last_modified > watermark:
+                watermark = last_modified
+
+        self.set_cache_entries(table, key_field, entries)
+        if changed or created is None:
+            self.cache_store.save(table, key_field, entries, watermark, scope, created)
+
+    def load_saved_cache_entries(self, table, key_field):
+        if self.cache_store is None:
+            return
+
+        snapshot = self.cache_store.load(table, key_field)
+        if snapshot is None or self.cache_store.is_expired(snapshot):
+            return
+
+        self.set_cache_entries(table, key_field, snapshot['entries'])
+
+    def set_cache_entries(self, table, key_field, entries):
+        # a compact snapshot becomes the cache itself, so its mmap'ed pages are shared with other processes
+        if isinstance(entries, CompactMap) and not self.cache[table][key_field]:
+            self.cache[table][key_field] = entries
+            return
+
+        self.cache[table][key_field].update(entries)
+        self.compact_cache(table, key_field)
+
+    def compact_cache(self, table, key_field):
+        if isinstance(self.cache[table][key_field], CompactMap):
+            self.cache[table][key_field].compact()
+
+    def save_cache_entries(self, table, key_field, entries):
+        if self.cache_store is None:
+            return
+
+        self.cache_store.update(table, key_field, entries)
 
     def filter_values_not_in_cache(self, table, identifier, items, lower):
         if lower:
@@ -250,72 +491,157 @@ class GusClient(BaseClient):
         else:
             query = f"select {key_field}, {value_field} from {table}"
 
-        result = self.sf_session.query_all(query)
-        return [(record[key_field], record[value_field]) for record in result['records']]
+        for record in self.iter_query(query):
+            yield record[key_field], record[value_field]
 
-    def delete_work_connected_items(self, table, work_id_field, work_ids):
-        records = []
-        for work_ids_group in numpy.array_split(work_ids, math.ceil(len(work_ids) / 200)):
-            work_ids_group = list(work_ids_group)
-            query = f"Select Id from {table} where {work_id_field} in {format_soql('{work_ids}', work_ids=work_ids_group)}"
-            result = self.sf_session.query_all(query)
-            records.extend(result['records'])
+    def query_modified_since(self, table, key_field, value_field, filter_field, filter_values, watermark):
+        conditions = []
+        if filter_values:
+            conditions.append(f"{filter_field} IN {format_soql('{filter_values}', filter_values=filter_values)}")
+        if watermark:
+            conditions.append(f"LastModifiedDate >= {watermark}")
+
+        query = f"select {key_field}, {value_field}, LastModifiedDate from {table}"
+        if conditions:
+            query += " where " + " and ".join(conditions)
 
-        items_to_delete = [{'Id': record['Id']} for record in records]
-        response = getattr(self.sf_session.bulk, table).delete(items_to_delete)
-        self.check_response(response)
+        for record in self.iter_query(query):
+            yield record[key_field], record[value_field], record['LastModifiedDate']
+
+    def query_work_items_by_keys(self, query, keys):
+        if not keys:
+            return
+
+        if len(keys) > EXISTING_KEYS_FULL_SCAN_THRESHOLD:
+            records = self.iter_query(query)
+        else:
+            queries = [f"{query} and ftest__c in {format_soql('{keys}', keys=keys_group)}" for keys_group in chunk_in_values(sorted(keys), query + " and ftest__c in ")]
+            records = self.query_concurrently(queries)
+
+        # soql compares strings case insensitively, keep only exact key matches
+        for record in records:
+            if record['ftest__c'] in keys:
+                yield record
+
+    def iter_query(self, query):
+        return self.sf_session.iter_query(query, prefetch=self.query_prefetch)
+
+    def query_concurrently(self, queries):
+        if len(queries) == 1:
+            yield from self.iter_query(queries[0])
+            return
+
+        # each query is a chunk of keys, so its records are few enough to hold until they are consumed
+        with ThreadPoolExecutor(max_workers=QUERY_CONCURRENCY, thread_name_prefix='query') as executor:
+            for records in executor.map(in_context(lambda query: list(self.sf_session.iter_query(query))), queries):
+                yield from records
+
+    def delete_work_connected_items(self, table, work_id_field, work_ids):
+        return self.delete_connected_items(((table, work_id_field),), work_ids)[table]
+
+    def delete_connected_items(self, tables, work_ids):
+        stats = {table: {'deleted': 0, 'query_seconds': 0.0, 'delete_seconds': 0.0} for table, _ in tables}
+        pending_ids = collections.defaultdict(list)
+        delete_futures = []
+
+        # the id queries of all tables run together, ids go to a bulk delete as soon as a batch is full
+        with ThreadPoolExecutor(max_workers=QUERY_CONCURRENCY, thread_name_prefix='clear-query') as query_executor, \
+                ThreadPoolExecutor(max_workers=len(tables), thread_name_prefix='clear-delete') as delete_executor:
+            query_futures = {}
+            for table, work_id_field in tables:
+                for work_ids_group in chunked(work_ids, WORK_IDS_CHUNK_SIZE):
+                    query_futures[query_executor.submit(in_context(self.query_connected_ids), table, work_id_field, work_ids_group)] = table
+
+            for future in as_completed(query_futures):
+                table = query_futures[future]
+                ids, seconds = future.result()
+                stats[table]['query_seconds'] += seconds
+                pending_ids[table].extend(ids)
+
+                if len(pending_ids[table]) >= DELETE_BATCH_SIZE:
+                    delete_futures.append(delete_executor.submit(in_context(self.delete_ids), table, pending_ids.pop(table)))
+
+            for table, ids in pending_ids.items():
+                if ids:
+                    delete_futures.append(delete_executor.submit(in_context(self.delete_ids), table, ids))
+
+            for future in delete_futures:
+                table, deleted, seconds = future.result()
+                stats[table]['deleted'] += deleted
+                stats[table]['delete_seconds'] += seconds
+
+        return stats
+
+    def query_connected_ids(self, table, work_id_field, work_ids):
+        start = time.perf_counter()
+        query = f"Select Id from {table} where {work_id_field} in {format_soql('{work_ids}', work_ids=work_ids)}"
+        ids = [record['Id'] for record in self.sf_session.iter_query(query)]
+        return ids, time.perf_counter() - start
+
+    def delete_ids(self, table, ids):
+        start = time.perf_counter()
+        records = [{'Id': record_id} for record_id in ids]
+        outcome = self.check_response(table, 'delete', records, self.bulk.delete(table, records))
+        return table, len(outcome.succeeded), time.perf_counter() - start
 
     def update_sprint_cache(self, teams):
         for team_id in teams:
-            self.cache['ADM_Sprint__c']['Scrum_Team__c'][team_id] = []
+            self.cache['ADM_Sprint__c']['Scrum_Team__c'][team_id] = SprintIntervalIndex(*self.sprint_horizon)
 
         query = format_soql("select Id, Name, Scrum_Team__c, Start_Date__c, End_Date__c from ADM_Sprint__c where Scrum_Team__c IN {teams}", teams=teams)
-        result = self.sf_session.query_all(query)
-
-        for record in result['records']:
+        team_ranges = collections.defaultdict(list)
+        for record in self.iter_query(query):
             team_name = self.get_team_name(record['Scrum_Team__c'])
             sprint_name = record['Name'][10:-len(team_name)][:-3]
             self.cache['ADM_Sprint__c']['Scrum_Team__c_Name'][(record['Scrum_Team__c'], sprint_name)] = record['Id']
 
             start_date = datetime.strptime(record['Start_Date__c'], "%Y-%m-%d").date()
             end_date = datetime.strptime(record['End_Date__c'], "%Y-%m-%d").date()
-            self.cache['ADM_Sprint__c']['Scrum_Team__c'][record['Scrum_Team__c']].append((start_date, end_date))
+            team_ranges[record['Scrum_Team__c']].append((start_date, end_date))
+
+        # sorted once per team instead of inserting the sprints one by one
+        for team_id, ranges in team_ranges.items():
+            self.cache['ADM_Sprint__c']['Scrum_Team__c'][team_id].add_all(ranges)
 
     def allocate_sprint_range(self, team_id, start_date, end_date):
-        if start_date is None or end_date is None:
-            start_date, end_date = self.get_available_sprint_date_range(team_id)
-            start_date, end_date = start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+        sprint_index = self.get_sprint_index(team_id)
 
-        start_date = datetime.strptime(start_date[:10], "%Y-%m-%d").date()
-        end_date = datetime.strptime(end_date[:10], "%Y-%m-%d").date()
+        if start_date is None or end_date is None:
+            start_date, end_date = sprint_index.find_free_slot()
+        else:
+            start_date = datetime.strptime(start_date[:10], "%Y-%m-%d").date()
+            end_date = datetime.strptime(end_date[:10], "%Y-%m-%d").date()
 
         if end_date - start_date >= timedelta(days=30):
             end_date = start_date + timedelta(days=30)
 
-        for date_range in self.cache['ADM_Sprint__c']['Scrum_Team__c'][team_id]:
-            if start_date == date_range[1]:
-                start_date = start_date + timedelta(days=1)
-            if end_date == date_range[0]:
-                end_date = end_date - timedelta(days=1)
-
-            if date_range[0] <= start_date <= date_range[1] or date_range[0] <= end_date <= date_range[1] or start_date <= date_range[0] <= end_date or start_date <= date_range[1] <= end_date:
-                start_date, end_date = self.get_available_sprint_date_range(team_id)
-                break
-
-        self.cache['ADM_Sprint__c']['Scrum_Team__c'][team_id].append((start_date, end_date))
+        start_date, end_date = sprint_index.allocate(start_date, end_date)
         return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
 
     def get_available_sprint_date_range(self, team_id):
-        optional_date_ranges = set((date(year=year, month=month, day=1), date(year=year, month=month, day=28)) for year in range(2020, 2022) for month in range(1, 13))
-        available_date_ranges = optional_date_ranges.difference(self.cache['ADM_Sprint__c']['Scrum_Team__c'][team_id])
-        return available_date_ranges.pop()
+        with self.cache_lock('ADM_Sprint__c'):
+            return self.get_sprint_index(team_id).find_free_slot()
+
+    def get_sprint_index(self, team_id):
+        sprint_indexes = self.cache['ADM_Sprint__c']['Scrum_Team__c']
+        if team_id not in sprint_indexes:
+            sprint_indexes[team_id] = SprintIntervalIndex(*self.sprint_horizon)
+        return sprint_indexes[team_id]
 
     @staticmethod
     def generate_sprint_name(start_date, sprint_name, team_name):
         return f"{start_date[:4]}.{start_date[5:7]} - {sprint_name} - {team_name}"
 
-    @staticmethod
-    def check_response(response):
-        for item in response:
-            if not item['success']:
-                raise RuntimeError(item['errors'])
+    def check_response(self, table, operation, records, response):
+        # with dead letters a failed record does not fail the call, it is logged and written there
+        outcome = BulkOutcome(records, response)
+        if not outcome.failed:
+            return outcome
+
+        first_errors = response[outcome.failed[0]]['errors']
+        if self.dead_letters is None:
+            raise RuntimeError(first_errors)
+
+        log.error(f"{len(outcome.failed)} of {len(records)} {table} records failed to {operation}, {len(outcome.rejected)} rejected and {len(outcome.transient)} retryable, written to {self.dead_letters.path}. First errors: {first_errors}")
+        self.dead_letters.record(table, operation, outcome)
+        return outcome
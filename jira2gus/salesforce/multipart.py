@@ -0,0 +1,87 @@
+import os
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class MultipartStream:
+    '''
+    A request body made of an encoded head, a file and an encoded tail, read in chunks while
+    it is sent. The file may be bytes, a path, a binary file object or an iterator of chunks.
+    requests reads the size from `len` to send a Content-Length, without it the body is chunked.
+    '''
+
+    def __init__(self, head, file_data=None, file_path=None, tail=b'', file_size=None, chunk_size=CHUNK_SIZE):
+        self.head = head
+        self.tail = tail
+        self.file_data = file_data
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.file_size = file_size if file_size is not None else self.get_file_size()
+        self.start_position = file_data.tell() if is_seekable(file_data) else None
+        self.consumed = False
+
+    @property
+    def len(self):
+        if self.file_size is None:
+            return None
+        return len(self.head) + self.file_size + len(self.tail)
+
+    @property
+    def replayable(self):
+        return self.file_path is not None or isinstance(self.file_data, (bytes, bytearray, memoryview)) or self.start_position is not None
+
+    def __iter__(self):
+        if self.consumed and not self.replayable:
+            raise RuntimeError("The attachment stream was already sent and can't be read again")
+        self.consumed = True
+
+        yield self.head
+        yield from self.iter_file()
+        yield self.tail
+
+    def iter_file(self):
+        if self.file_path is not None:
+            with open(self.file_path, "rb") as f:
+                yield from iter_file_object(f, self.chunk_size)
+        elif isinstance(self.file_data, (bytes, bytearray, memoryview)):
+            view = memoryview(self.file_data)
+            for i in range(0, len(view), self.chunk_size):
+                yield view[i:i + self.chunk_size]
+        elif hasattr(self.file_data, 'read'):
+            if self.start_position is not None:
+                self.file_data.seek(self.start_position)
+            yield from iter_file_object(self.file_data, self.chunk_size)
+        elif self.file_data is not None:
+            for chunk in self.file_data:
+                if chunk:
+                    yield chunk
+
+    def get_file_size(self):
+        if self.file_path is not None:
+            return os.path.getsize(self.file_path)
+        if self.file_data is None:
+            return 0
+        if isinstance(self.file_data, (bytes, bytearray, memoryview)):
+            return memoryview(self.file_data).nbytes
+        if is_seekable(self.file_data):
+            position = self.file_data.tell()
+            size = self.file_data.seek(0, os.SEEK_END) - position
+            self.file_data.seek(position)
+            return size
+        return None
+
+
+def iter_file_object(f, chunk_size):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def is_seekable(file_data):
+    try:
+        return hasattr(file_data, 'read') and file_data.seekable()
+    except (AttributeError, ValueError):
+        return False
@@ -1,29 +1,79 @@
-import requests
 import json
 
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 
 from simple_salesforce import Salesforce
 
+from jira2gus.salesforce.errors import _exception_handler
+from jira2gus.salesforce.multipart import MultipartStream
+from jira2gus.salesforce.telemetry import in_context
+from jira2gus.salesforce.transport import build_http_session
 
-class RestClient(Salesforce):
-    def __init__(self, **kwargs):
-        session = requests.Session()
 
-        retries = Retry(total=10,
-                        backoff_factor=0.1,
-                        status_forcelist=[500, 502, 503, 504])
+# sObject collections need api 42.0 and up
+COLLECTIONS_API_VERSION = '47.0'
+
+# chatter returns 25 feed items per page unless asked for more, 100 at most
+DEFAULT_FEED_PAGE_SIZE = 100
+DEFAULT_FEED_CONCURRENCY = 8
 
-        session.mount('https://', HTTPAdapter(max_retries=retries))
+
+class RestClient(Salesforce):
+    def __init__(self, http_session=None, **kwargs):
+        session = http_session or build_http_session()
 
         Salesforce.__init__(self, version="36.0", session=session, **kwargs)
+        session.session_id = self.session_id
+
+    def set_session_id(self, session_id):
+        self.session_id = session_id
+        self.headers['Authorization'] = 'Bearer ' + session_id
+
+    def query_pages(self, query, prefetch=False):
+        # one page of records at a time, with prefetch the next page is fetched while this one is consumed
+        page = self.get_query_page(self.base_url + 'query/', params={'q': query})
+        for page in self.iter_pages(page, self.get_query_page, lambda page: None if page['done'] else self.get_query_more_url(page), prefetch):
+            yield page['records']
+
+    def iter_query(self, query, prefetch=False):
+        for records in self.query_pages(query, prefetch):
+            yield from records
+
+    def iter_pages(self, page, get_page, get_next_url, prefetch=False):
+        if not prefetch:
+            while True:
+                yield page
+                next_url = get_next_url(page)
+                if next_url is None:
+                    return
+                page = get_page(next_url)
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='page-prefetch') as executor:
+            while True:
+                next_url = get_next_url(page)
+                next_page = None if next_url is None else executor.submit(in_context(get_page), next_url)
+                yield page
+                if next_page is None:
+                    return
+                page = next_page.result()
+
+    def get_query_page(self, url, params=None):
+        result = self.session.get(url, headers=self.headers, params=params)
+
+        if result.status_code != 200:
+            _exception_handler(result, 'query')
+
+        # plain dicts, an OrderedDict per record costs twice the memory
+        return result.json()
+
+    def get_query_more_url(self, page):
+        return f"https://{self.sf_instance}{page['nextRecordsUrl']}"
 
     def get_chatter_profile(self, obj='me'):
         url = self.base_url + 'chatter/users/{}'.format(obj)
         params = {}
 
-        result = requests.get(url, headers=self.headers, params=params)
+        result = self.session.get(url, headers=self.headers, params=params)
 
         if result.status_code != 200:
             _exception_handler(result)
@@ -75,7 +125,7 @@ class RestClient(Salesforce):
 
         data = json.dumps(body)
 
-        result = requests.post(url, data=data, headers=self.headers)
+        result = self.session.post(url, data=data, headers=self.headers)
 
         if result.status_code != 201:
             _exception_handler(result)
@@ -88,23 +138,55 @@ class RestClient(Salesforce):
         body = self.create_chatter_body(message, mention_ids=mention_ids)
         data = json.dumps(body)
 
-        result = requests.post(url, data=data, headers=self.headers)
+        result = self.session.post(url, data=data, headers=self.headers)
 
         if result.status_code != 201:
             _exception_handler(result)
 
         return result.json()
 
-    def chatter_on_object_with_attachment(self, message, obj, mention_ids=(), file_name="", file_data=None):
-        boundary = 'F9jBDELnfBLAVmLNbnLIYibT5Icp0h3VJ7mkI'
-        attachment_headers = {
+    def chatter_on_object_with_attachment(self, message, obj, mention_ids=(), file_name="", file_data=None, file_path=None, file_size=None):
+        url = self.get_attachment_url(obj)
+        head, tail = self.create_attachment_parts(message, mention_ids, file_name)
+
+        # the file is streamed between the encoded head and tail instead of being copied into one body
+        binarydata = MultipartStream(head, file_data=file_data, file_path=file_path, tail=tail, file_size=file_size)
+
+        result = self.session.post(url, data=binarydata, headers=self.get_attachment_headers())
+
+        if result.status_code != 201:
+            _exception_handler(result)
+
+        return result.json()
+
+    def chatter_on_object_with_existing_file(self, message, obj, content_document_id, mention_ids=()):
+        # links a file already in salesforce to a new feed item, nothing is uploaded
+        url = self.get_attachment_url(obj)
+
+        body = self.create_chatter_body(message, mention_ids=mention_ids)
+        body["attachment"] = {"attachmentType": "ExistingContent", "contentDocumentId": content_document_id}
+        data = json.dumps(body)
+
+        result = self.session.post(url, data=data, headers=self.headers)
+
+        if result.status_code != 201:
+            _exception_handler(result)
+
+        return result.json()
+
+    def get_attachment_url(self, obj):
+        return self.base_url.replace(self.sf_version, '30.0') + 'chatter/feeds/record/{}/feed-items'.format(obj)
+
+    def get_attachment_headers(self):
+        return {
             'Content-Type': 'multipart/form-data; boundary=F9jBDELnfBLAVmLNbnLIYibT5Icp0h3VJ7mkI',  # abcdeedcbaabcdeedcba'
             'Accept': 'application/json',
             'Authorization': 'Bearer ' + self.session_id,
             'X-PrettyPrint': '1'
         }
 
-        url = self.base_url.replace(self.sf_version, '30.0') + 'chatter/feeds/record/{}/feed-items'.format(obj)
+    def create_attachment_parts(self, message, mention_ids=(), file_name=""):
+        boundary = 'F9jBDELnfBLAVmLNbnLIYibT5Icp0h3VJ7mkI'
 
         body_prefix = '--' + boundary + "\r\n"
         body_prefix += 'Content-Disposition: form-data; name="json"' + "\r\n"
@@ -145,116 +227,78 @@ class RestClient(Salesforce):
         content_type = supported_types[ending] if ending in supported_types else "application/octet-stream"
         body_suffix += 'Content-Type: ' + content_type + "\r\n\r\n"
 
-        binaryBodySuffix = body_suffix.encode()
-        binaryBodySuffix += file_data
         boundary = "\r\n" + '--' + boundary + '--' + "\r\n"
-        BinaryBoundary = boundary.encode()
-        binaryBodySuffix += BinaryBoundary
 
-        binarydata = data.encode()
-        binarydata += binaryBodySuffix
+        return (data + body_suffix).encode(), boundary.encode()
 
-        result = requests.post(url, data=binarydata, headers=attachment_headers)
+    def get_news_feed(self, page_size=None):
+        return self.get_feed_page(self.base_url + 'chatter/feeds/news/me/feed-items', params={'pageSize': page_size or DEFAULT_FEED_PAGE_SIZE})
 
-        if result.status_code != 201:
+    def get_object_feed(self, obj, page_size=None):
+        return self.get_feed_page(self.base_url + 'chatter/feeds/record/{}/feed-items'.format(obj), params={'pageSize': page_size or DEFAULT_FEED_PAGE_SIZE})
+
+    def feed_pages(self, url, page_size=None, prefetch=False):
+        # the feed items of a page, following nextPageUrl to the oldest item
+        page = self.get_feed_page(url, params={'pageSize': page_size or DEFAULT_FEED_PAGE_SIZE})
+        for page in self.iter_pages(page, self.get_feed_page, lambda page: self.get_feed_page_url(page) if page.get('nextPageUrl') else None, prefetch):
+            yield page['elements']
+
+    def iter_news_feed(self, page_size=None, prefetch=False):
+        for feed_items in self.feed_pages(self.base_url + 'chatter/feeds/news/me/feed-items', page_size, prefetch):
+            yield from feed_items
+
+    def iter_object_feed(self, obj, page_size=None, prefetch=False):
+        for feed_items in self.feed_pages(self.base_url + 'chatter/feeds/record/{}/feed-items'.format(obj), page_size, prefetch):
+            yield from feed_items
+
+    def get_object_feeds(self, objs, page_size=None, concurrency=DEFAULT_FEED_CONCURRENCY):
+        # obj -> feed items, the feeds of up to concurrency objects are read at once
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='feeds') as executor:
+            return dict(zip(objs, executor.map(in_context(lambda obj: list(self.iter_object_feed(obj, page_size))), objs)))
+
+    def get_feed_page(self, url, params=None):
+        result = self.session.get(url, headers=self.headers, params=params)
+
+        if result.status_code != 200:
             _exception_handler(result)
 
         return result.json()
 
-    def get_news_feed(self):
-        url = self.base_url + 'chatter/feeds/news/me/feed-items'
-        params = {}
-        result = requests.get(url, headers=self.headers, params=params)
+    def get_feed_page_url(self, page):
+        return f"https://{self.sf_instance}{page['nextPageUrl']}"
+
+    def collection_create(self, table, records):
+        url = self.get_collections_url()
+        data = json.dumps({'allOrNone': False, 'records': [dict(record, attributes={'type': table}) for record in records]})
+
+        result = self.session.post(url, data=data, headers=self.headers)
 
         if result.status_code != 200:
             _exception_handler(result)
 
         return result.json()
 
-    def get_object_feed(self, obj):
-        url = self.base_url + 'chatter/feeds/record/{}/feed-items'.format(obj)
+    def collection_update(self, table, records):
+        url = self.get_collections_url()
+        data = json.dumps({'allOrNone': False, 'records': [dict(record, attributes={'type': table}) for record in records]})
 
-        result = requests.get(url, headers=self.headers)
+        result = self.session.patch(url, data=data, headers=self.headers)
 
         if result.status_code != 200:
             _exception_handler(result)
 
         return result.json()
 
+    def collection_delete(self, ids):
+        url = self.get_collections_url()
+        params = {'ids': ','.join(ids), 'allOrNone': 'false'}
+
+        result = self.session.delete(url, params=params, headers=self.headers)
+
+        if result.status_code != 200:
+            _exception_handler(result)
+
+        return result.json()
 
-def _exception_handler(result, name=""):
-    url = result.url
-    try:
-        response_content = result.json()
-    except Exception:
-        response_content = result.text
-
-    if result.status_code == 300:
-        message = f"More than one record for {url}. Response content: {response_content}"
-        raise SalesforceMoreThanOneRecord(message)
-    elif result.status_code == 400:
-        message = f"Malformed request {url}. Response content: {response_content}"
-        raise SalesforceMalformedRequest(message)
-    elif result.status_code == 401:
-        message = f"Expired session for {url}. Response content: {response_content}"
-        raise SalesforceExpiredSession(message)
-    elif result.status_code == 403:
-        message = f"Request refused for {url}. Resonse content: {response_content}"
-        raise SalesforceRefusedRequest(message)
-    elif result.status_code == 404:
-        message = f"Resource {name} Not Found. Response content: {response_content}"
-        raise SalesforceResourceNotFound(message)
-    else:
-        message = f"Error Code {result.status_code}. Response content: {response_content}"
-        raise SalesforceGeneralError(message)
-
-
-class SalesforceMoreThanOneRecord(Exception):
-    '''
-    Error Code: 300
-    The value returned when an external ID exists in more than one record. The
-    response body contains the list of matching records.
-    '''
-    pass
-
-
-class SalesforceMalformedRequest(Exception):
-    '''
-    Error Code: 400
-    The request couldn't be understood, usually becaue the JSON or XML body contains an error.
-    '''
-    pass
-
-
-class SalesforceExpiredSession(Exception):
-    '''
-    Error Code: 401
-    The session ID or OAuth token used has expired or is invalid. The response
-    body contains the message and errorCode.
-    '''
-    pass
-
-
-class SalesforceRefusedRequest(Exception):
-    '''
-    Error Code: 403
-    The request has been refused. Verify that the logged-in user has
-    appropriate permissions.
-    '''
-    pass
-
-
-class SalesforceResourceNotFound(Exception):
-    '''
-    Error Code: 404
-    The requested resource couldn't be found. Check the URI for errors, and
-    verify that there are no sharing issues.
-    '''
-    pass
-
-
-class SalesforceGeneralError(Exception):
-    '''
-    A non-specific Salesforce error.
-    '''
-    pass
+    def get_collections_url(self):
+        return self.base_url.replace(self.sf_version, COLLECTIONS_API_VERSION) + 'composite/sobjects'
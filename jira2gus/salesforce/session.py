@@ -1,32 +1,33 @@
-import re, requests
+import re
+
+from jira2gus.salesforce.transport import build_http_session
+
+
+LOGIN_HEADERS = {
+    'User-Agent'      : 'shawns-client',
+    'Accept'          : 'text/html,application/xhtml+xml,application/xml',
+    'Accept-Encoding' : 'none',
+    'Accept-Charset'  : 'utf-8',
+    'Content-Type'    : 'text/xml; charset=utf-8',
+    'SOAPAction'      : '"urn:enterprise.soap.sforce.com/login"'}
+LOGIN_BODY = '''
+            <soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tns="urn:enterprise.soap.sforce.com" xmlns:fns="urn:fault.enterprise.soap.sforce.com" xmlns:ens="urn:sobject.enterprise.soap.sforce.com"><soap:Header></soap:Header><soap:Body><tns:login><username>%s</username><password>%s%s</password></tns:login></soap:Body></soap:Envelope>
+                '''
+SESSION_ID = re.compile(str("<sessionId>(.*)</sessionId>"), re.MULTILINE)
 
 
 class SoapSession:
-    def __init__(self, instance='login.salesforce.com', session_id=None):
+    def __init__(self, instance='login.salesforce.com', session_id=None, http_session=None):
         self.instance = instance
         self.sessionId = session_id
         self.version = "0.1.6"
+        self.http_session = http_session or build_http_session()
         
     def login(self, user, password, security_token=''):
-
-        headers = {
-            'User-Agent'      : 'shawns-client',
-            'Accept'          : 'text/html,application/xhtml+xml,application/xml',
-            'Accept-Encoding' : 'none',
-            'Accept-Charset'  : 'utf-8',
-            'Connection'      : 'close',
-            'Content-Type'    : 'text/xml; charset=utf-8',
-            'SOAPAction'      : '"urn:enterprise.soap.sforce.com/login"'}
-        body = '''
-            <soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tns="urn:enterprise.soap.sforce.com" xmlns:fns="urn:fault.enterprise.soap.sforce.com" xmlns:ens="urn:sobject.enterprise.soap.sforce.com"><soap:Header></soap:Header><soap:Body><tns:login><username>%s</username><password>%s%s</password></tns:login></soap:Body></soap:Envelope>
-                ''' % (user, password, security_token)
-        r = requests.post("https://{}/services/Soap/c/v29.0".format(self.instance), data=body, headers=headers)
+        r = self.http_session.post("https://{}/services/Soap/c/v29.0".format(self.instance), data=LOGIN_BODY % (user, password, security_token), headers=LOGIN_HEADERS, renew_session=False)
         data = r.text
         try:
-            regex = re.compile(str("<sessionId>(.*)</sessionId>"), re.MULTILINE)
-            match = regex.search(data)
-            sessionId = match.group(1)
-            self.sessionId = str(sessionId)
+            self.sessionId = parse_session_id(data)
         except:
             self.sessionId = None
             raise Exception(f"Login Failed {data}")
@@ -34,7 +35,7 @@ class SoapSession:
     def is_valid(self):
         headers = {'Authorization':'Bearer {}'.format(self.sessionId)}
         url = "https://{}/services/data/v29.0/chatter/users/me".format(self.instance)
-        r = requests.get(url, headers=headers)
+        r = self.http_session.get(url, headers=headers, renew_session=False)
         if r.status_code == 200:
             return True
         else:
@@ -42,3 +43,7 @@ class SoapSession:
         
     def get_session_id(self):
         return self.sessionId
+
+
+def parse_session_id(data):
+    return str(SESSION_ID.search(data).group(1))
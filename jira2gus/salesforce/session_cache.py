@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import threading
+
+
+class SessionCache:
+    '''
+    Keeps salesforce session ids between runs in a json file readable by the owner only,
+    keyed by instance and user.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def get(self, instance, user):
+        return self.read().get(self.get_key(instance, user))
+
+    def set(self, instance, user, session_id):
+        with self.lock:
+            sessions = self.read()
+            sessions[self.get_key(instance, user)] = session_id
+            self.write(sessions)
+
+    def remove(self, instance, user):
+        with self.lock:
+            sessions = self.read()
+            if sessions.pop(self.get_key(instance, user), None) is not None:
+                self.write(sessions)
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return {}
+
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def write(self, sessions):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+        # mkstemp creates the file with 0600 so the token is never world readable
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, "w") as f:
+            json.dump(sessions, f)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def get_key(instance, user):
+        return f"{user}@{instance}"
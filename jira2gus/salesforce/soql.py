@@ -0,0 +1,41 @@
+from urllib.parse import quote_plus
+
+
+# queries are sent as a GET parameter, salesforce rejects request uris longer than 16384 bytes
+MAX_QUERY_URL_LENGTH = 16000
+QUERY_URL_RESERVE = 200
+
+
+def format_soql(query, *args, **kwargs):
+    # simple_salesforce takes a fifth of a second to import, it is loaded by the first query
+    from simple_salesforce import format_soql
+    return format_soql(query, *args, **kwargs)
+
+
+def chunked(values, size):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def chunk_in_values(values, base_query, max_items=None):
+    '''
+    Splits values into groups whose IN (...) clause keeps base_query under the url length limit.
+    '''
+    budget = MAX_QUERY_URL_LENGTH - QUERY_URL_RESERVE - len(quote_plus(base_query))
+    if budget <= 0:
+        raise ValueError("The query is too long to add an IN filter to it")
+
+    from simple_salesforce.format import quote_soql_value
+
+    group, group_length = [], 0
+    for value in values:
+        value_length = len(quote_plus(quote_soql_value(value))) + len(quote_plus(','))
+        if group and (group_length + value_length > budget or (max_items and len(group) >= max_items)):
+            yield group
+            group, group_length = [], 0
+        group.append(value)
+        group_length += value_length
+
+    if group:
+        yield group
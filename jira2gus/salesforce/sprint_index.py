@@ -0,0 +1,97 @@
+import bisect
+
+from datetime import date, timedelta
+
+
+DEFAULT_HORIZON_START = date(2020, 1, 1)
+DEFAULT_HORIZON_END = date(2029, 12, 31)
+SPRINT_SLOT_LAST_DAY = 28
+
+
+class SprintIntervalIndex:
+    '''
+    The date ranges taken by the sprints of one team, kept as sorted, merged and inclusive
+    intervals so overlap checks and free slot lookups are a bisect instead of a scan.
+    Free slots are the 1st to the 28th of a month inside the horizon. The intervals are two
+    python lists, so add() finds its place in O(log n) but inserting shifts the list, O(n);
+    add_all() adds many ranges with one sort, e.g. when the sprints of a team are loaded.
+    '''
+
+    def __init__(self, horizon_start=DEFAULT_HORIZON_START, horizon_end=DEFAULT_HORIZON_END):
+        self.horizon_start = horizon_start
+        self.horizon_end = horizon_end
+        self.starts = []
+        self.ends = []
+        # every month slot before the cursor is known to be taken, ranges are never released
+        self.cursor = _first_month_from(horizon_start)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start_date, end_date):
+        i = bisect.bisect_left(self.ends, start_date - timedelta(days=1))
+        j = bisect.bisect_right(self.starts, end_date + timedelta(days=1))
+
+        if i < j:
+            start_date = min(start_date, self.starts[i])
+            end_date = max(end_date, self.ends[j - 1])
+
+        self.starts[i:j] = [start_date]
+        self.ends[i:j] = [end_date]
+
+    def add_all(self, ranges):
+        merged_starts, merged_ends = [], []
+        for start_date, end_date in sorted(list(zip(self.starts, self.ends)) + list(ranges)):
+            if merged_ends and start_date <= merged_ends[-1] + timedelta(days=1):
+                merged_ends[-1] = max(merged_ends[-1], end_date)
+            else:
+                merged_starts.append(start_date)
+                merged_ends.append(end_date)
+
+        self.starts, self.ends = merged_starts, merged_ends
+
+    def find_overlap(self, start_date, end_date):
+        i = bisect.bisect_right(self.starts, end_date) - 1
+        if i >= 0 and self.ends[i] >= start_date:
+            return self.starts[i], self.ends[i]
+        return None
+
+    def overlaps(self, start_date, end_date):
+        return self.find_overlap(start_date, end_date) is not None
+
+    def allocate(self, start_date, end_date):
+        overlap = self.find_overlap(start_date, start_date)
+        if overlap and overlap[1] == start_date:
+            start_date = start_date + timedelta(days=1)
+
+        overlap = self.find_overlap(end_date, end_date)
+        if overlap and overlap[0] == end_date:
+            end_date = end_date - timedelta(days=1)
+
+        if start_date > end_date or self.overlaps(start_date, end_date):
+            start_date, end_date = self.find_free_slot()
+
+        self.add(start_date, end_date)
+        return start_date, end_date
+
+    def find_free_slot(self):
+        month = self.cursor
+        while True:
+            slot_end = month.replace(day=SPRINT_SLOT_LAST_DAY)
+            if slot_end > self.horizon_end:
+                raise RuntimeError(f"No free sprint slot left between {self.horizon_start} and {self.horizon_end}")
+
+            overlap = self.find_overlap(month, slot_end)
+            if overlap is None:
+                self.cursor = month
+                return month, slot_end
+
+            month = _first_month_from(overlap[1] + timedelta(days=1))
+
+
+def _first_month_from(day):
+    if day.day == 1:
+        return day
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
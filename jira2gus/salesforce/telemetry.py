@@ -0,0 +1,239 @@
+import bisect
+import collections
+import contextvars
+import functools
+import inspect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+
+# upper bounds in seconds, the last bucket takes everything slower
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+# record ids (15 or 18 chars with a digit), query cursors and api versions are folded so urls group by endpoint
+RECORD_ID = re.compile(r'/(?=[A-Za-z]*\d)[A-Za-z0-9]{15}(?:[A-Za-z0-9]{3})?(?:-\d+)?(?=/|$)')
+API_VERSION = re.compile(r'/v?\d+\.\d+(?=/|$)')
+LIMIT_INFO = re.compile(r'api-usage=(\d+)/(\d+)')
+
+# the instrumented methods being run, innermost last. A context variable rather than a thread
+# local, so work handed to other threads through in_context() is counted for the method too
+CURRENT_METHODS = contextvars.ContextVar('jira2gus_telemetry_methods', default=())
+
+
+class Telemetry:
+    '''
+    Counts, latency histograms, bytes and retries of the salesforce requests, per endpoint
+    and per instrumented GusClient method, plus the last org api usage reported by salesforce.
+    Nothing is collected unless an instance is attached to the http session.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = collections.defaultdict(new_stats)
+        self.methods = collections.defaultdict(new_stats)
+        self.session_renewals = 0
+        self.api_usage = None
+        self.api_limit = None
+
+    def record_request(self, method, url, seconds, response=None, streamed=False):
+        endpoint = f"{method} {get_endpoint(url)}"
+        request_bytes = response_bytes = retries = 0
+        status = 'error'
+
+        if response is not None:
+            status = str(response.status_code)
+            request_bytes = int(response.request.headers.get('Content-Length') or 0)
+            response_bytes = get_response_size(response, streamed)
+            retries = get_retries(response)
+            limit_info = LIMIT_INFO.search(response.headers.get('Sforce-Limit-Info', ''))
+
+        with self.lock:
+            for stats in (self.endpoints[endpoint], self.methods[self.get_current_method()]):
+                stats['calls'] += 1
+                stats['seconds'] += seconds
+                stats['request_bytes'] += request_bytes
+                stats['response_bytes'] += response_bytes
+                stats['retries'] += retries
+                stats['statuses'][status] += 1
+                stats['latency'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+            if response is not None and limit_info:
+                self.api_usage, self.api_limit = int(limit_info.group(1)), int(limit_info.group(2))
+
+    def record_session_renewal(self):
+        with self.lock:
+            self.session_renewals += 1
+
+    def record_method(self, name, seconds):
+        with self.lock:
+            stats = self.methods[name]
+            stats['method_calls'] += 1
+            stats['method_seconds'] += seconds
+
+    def get_current_method(self):
+        methods = CURRENT_METHODS.get()
+        return methods[-1] if methods else '-'
+
+    def measure(self, name, function):
+        @functools.wraps(function)
+        def measured(*args, **kwargs):
+            token = CURRENT_METHODS.set(CURRENT_METHODS.get() + (name,))
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                self.record_method(name, time.perf_counter() - start)
+                raise
+            finally:
+                CURRENT_METHODS.reset(token)
+
+            # a generator is timed until it is exhausted, its requests count for the caller
+            if inspect.isgenerator(result):
+                return self.measure_generator(name, result, start)
+
+            self.record_method(name, time.perf_counter() - start)
+            return result
+
+        return measured
+
+    def measure_generator(self, name, generator, start):
+        try:
+            yield from generator
+        finally:
+            self.record_method(name, time.perf_counter() - start)
+
+    def instrument(self, obj):
+        # wraps the public methods of this one object, the class and other instances are untouched
+        for name in dir(type(obj)):
+            if name.startswith('_') or not callable(getattr(type(obj), name)):
+                continue
+            setattr(obj, name, self.measure(f"{type(obj).__name__}.{name}", getattr(obj, name)))
+        return obj
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'api_usage': self.api_usage,
+                'api_limit': self.api_limit,
+                'session_renewals': self.session_renewals,
+                'endpoints': {endpoint: export_stats(stats) for endpoint, stats in self.endpoints.items()},
+                'methods': {name: export_stats(stats) for name, stats in self.methods.items()},
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+
+        if snapshot['api_usage'] is not None:
+            lines.append("# TYPE jira2gus_org_api_usage gauge")
+            lines.append(f"jira2gus_org_api_usage {snapshot['api_usage']}")
+            lines.append("# TYPE jira2gus_org_api_limit gauge")
+            lines.append(f"jira2gus_org_api_limit {snapshot['api_limit']}")
+
+        lines.append("# TYPE jira2gus_session_renewals_total counter")
+        lines.append(f"jira2gus_session_renewals_total {snapshot['session_renewals']}")
+
+        for group, label in (('endpoints', 'endpoint'), ('methods', 'method')):
+            metric = f"jira2gus_{group[:-1]}"
+            stats_by_labels = [(f'{label}="{escape_label(name)}"', stats) for name, stats in snapshot[group].items()]
+
+            lines.append(f"# TYPE {metric}_requests_total counter")
+            for labels, stats in stats_by_labels:
+                for status, count in stats['statuses'].items():
+                    lines.append(f'{metric}_requests_total{{{labels},status="{status}"}} {count}')
+
+            for key in ('request_bytes', 'response_bytes', 'retries'):
+                lines.append(f"# TYPE {metric}_{key}_total counter")
+                for labels, stats in stats_by_labels:
+                    lines.append(f"{metric}_{key}_total{{{labels}}} {stats[key]}")
+
+            lines.append(f"# TYPE {metric}_request_seconds histogram")
+            for labels, stats in stats_by_labels:
+                for bound, count in stats['latency'].items():
+                    lines.append(f'{metric}_request_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{metric}_request_seconds_sum{{{labels}}} {stats['seconds']}")
+                lines.append(f"{metric}_request_seconds_count{{{labels}}} {stats['calls']}")
+
+        method_stats = [(f'method="{escape_label(name)}"', stats) for name, stats in snapshot['methods'].items() if stats['method_calls']]
+        for key in ('method_calls', 'method_seconds'):
+            lines.append(f"# TYPE jira2gus_{key}_total counter")
+            lines.extend(f"jira2gus_{key}_total{{{labels}}} {stats[key]}" for labels, stats in method_stats)
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # .prom files are for the node exporter textfile collector, anything else gets json
+        content = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+def in_context(function):
+    # threads start with an empty context, function runs in a copy of the one it was wrapped in
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def run(*args, **kwargs):
+        # a context can't be entered by two threads at once, every call gets its own copy
+        return context.copy().run(function, *args, **kwargs)
+
+    return run
+
+
+def new_stats():
+    return {
+        'calls': 0,
+        'seconds': 0.0,
+        'request_bytes': 0,
+        'response_bytes': 0,
+        'retries': 0,
+        'statuses': collections.Counter(),
+        'latency': [0] * len(LATENCY_BUCKETS),
+        'method_calls': 0,
+        'method_seconds': 0.0,
+    }
+
+
+def export_stats(stats):
+    # histogram buckets are cumulative, like prometheus expects them
+    cumulative = 0
+    latency = {}
+    for bound, count in zip(LATENCY_BUCKETS, stats['latency']):
+        cumulative += count
+        latency['+Inf' if bound == float('inf') else str(bound)] = cumulative
+
+    return dict(stats, statuses=dict(stats['statuses']), latency=latency)
+
+
+def get_endpoint(url):
+    path = url.split('?', 1)[0].split('://', 1)[-1]
+    path = path[path.find('/'):] if '/' in path else '/'
+    return API_VERSION.sub('/{version}', RECORD_ID.sub('/{id}', path))
+
+
+def get_response_size(response, streamed):
+    if response.headers.get('Content-Length'):
+        return int(response.headers['Content-Length'])
+    # a streamed body is read by the caller, reading it here would consume it
+    return 0 if streamed else len(response.content)
+
+
+def get_retries(response):
+    retries = getattr(response.raw, 'retries', None)
+    return len(retries.history) if retries is not None else 0
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
@@ -0,0 +1,153 @@
+import threading
+import time
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+SESSION_HEADERS = ('Authorization', 'X-SFDC-Session')
+
+DEFAULT_POOL_SIZE = 10
+
+
+def build_http_session(pool_size=DEFAULT_POOL_SIZE, session_refresher=None, telemetry=None, governor=None):
+    session = SalesforceSession(session_refresher)
+    session.telemetry = telemetry
+    session.governor = governor
+
+    retries = Retry(total=10,
+                    backoff_factor=0.1,
+                    status_forcelist=[500, 502, 503, 504])
+
+    # one keep-alive pool per host, shared by the soap, rest, bulk and chatter calls
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
+
+
+class SalesforceSession(requests.Session):
+    '''
+    A requests session that renews an expired salesforce session once and replays the request.
+    Every client built on top of it (rest, bulk, chatter) shares the renewed session id.
+    With a telemetry attached, every request is also recorded there. With a governor attached,
+    every request waits for its turn and throttled requests are retried after a backoff.
+    '''
+
+    def __init__(self, session_refresher=None):
+        requests.Session.__init__(self)
+        self.session_refresher = session_refresher
+        self.session_id = None
+        self.expired_session_ids = set()
+        self.refresh_lock = threading.Lock()
+        self.telemetry = None
+        self.governor = None
+
+    def request(self, method, url, renew_session=True, **kwargs):
+        if self.telemetry is None:
+            return self.send_request(method, url, renew_session, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            response = self.send_request(method, url, renew_session, **kwargs)
+        except Exception:
+            self.telemetry.record_request(method, url, time.perf_counter() - start)
+            raise
+
+        self.telemetry.record_request(method, url, time.perf_counter() - start, response, kwargs.get('stream', False))
+        return response
+
+    def send_request(self, method, url, renew_session=True, **kwargs):
+        kwargs['headers'] = self.replace_expired_session(kwargs.get('headers'))
+        response = self.send_governed(method, url, **kwargs)
+
+        if not renew_session or self.session_refresher is None or not is_expired_session(response):
+            return response
+
+        self.refresh_session(get_session_id(kwargs['headers']))
+
+        # a consumed stream can't be sent again, the caller gets the error but the next call has a valid session
+        if not is_replayable(kwargs.get('data')):
+            return response
+
+        kwargs['headers'] = self.replace_expired_session(kwargs['headers'])
+        return self.send_governed(method, url, **kwargs)
+
+    def send_governed(self, method, url, **kwargs):
+        if self.governor is None:
+            return requests.Session.request(self, method, url, **kwargs)
+
+        attempt = 0
+        while True:
+            self.governor.acquire()
+            try:
+                response = requests.Session.request(self, method, url, **kwargs)
+            finally:
+                self.governor.release()
+
+            throttled = self.governor.feedback(response)
+            attempt += 1
+            if not throttled or attempt > self.governor.max_retries or not is_replayable(kwargs.get('data')):
+                return response
+
+            time.sleep(self.governor.get_backoff(attempt, response))
+
+    def refresh_session(self, used_session_id):
+        with self.refresh_lock:
+            # another thread may already have renewed the session this request was sent with
+            if used_session_id in self.expired_session_ids:
+                return
+
+            if self.session_id is not None:
+                self.expired_session_ids.add(self.session_id)
+            if used_session_id is not None:
+                self.expired_session_ids.add(used_session_id)
+
+            self.session_id = self.session_refresher()
+            if self.telemetry is not None:
+                self.telemetry.record_session_renewal()
+
+    def replace_expired_session(self, headers):
+        if not headers or not self.expired_session_ids:
+            return headers
+
+        headers = dict(headers)
+        for name in SESSION_HEADERS:
+            value = headers.get(name)
+            if value is None:
+                continue
+            for expired_session_id in self.expired_session_ids:
+                if expired_session_id in value:
+                    headers[name] = value.replace(expired_session_id, self.session_id)
+                    break
+
+        return headers
+
+
+def is_expired_session(response):
+    if response.status_code == 401:
+        return True
+
+    # the bulk api reports an expired session as a 400 with an InvalidSessionId exception code
+    return response.status_code == 400 and b'InvalidSessionId' in response.content
+
+
+def is_replayable(data):
+    return data is None or isinstance(data, (bytes, str, dict, list, tuple)) or getattr(data, 'replayable', False)
+
+
+def get_session_id(headers):
+    if not headers:
+        return None
+
+    if headers.get('X-SFDC-Session'):
+        return headers['X-SFDC-Session']
+
+    authorization = headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        return authorization[len('Bearer '):]
+
+    return None
@@ -0,0 +1,38 @@
+import json
+import os
+import sys
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(DIRECTORY)
+
+from jira2gus import logger_wrapper
+from jira2gus.migration.migrator_setup import setup_job_scheduler, load_job_rows, load_from_properties
+
+
+log = logger_wrapper.get_logger(__name__)
+
+
+def run():
+    # properties.json may set log_level, it is loaded before logging is configured
+    load_from_properties()
+    logger_wrapper.configure_logging()
+    job_scheduler = setup_job_scheduler()
+    rows = load_job_rows(os.environ["job_key"])
+
+    results = job_scheduler.run(rows)
+
+    summary = json.dumps([result._asdict() for result in results], indent=2)
+    log.info(f"Job summary: {summary}")
+
+    summary_output = os.environ.get("job_summary_output")
+    if summary_output:
+        with open(summary_output, "w") as f:
+            f.write(summary)
+        log.info(f"Job summary written to {summary_output}")
+
+    if not all(result.succeeded for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    run()
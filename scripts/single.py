@@ -4,16 +4,17 @@ import sys
 DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(DIRECTORY)
 
-from jira2gus.migration.migrator_setup import setup_migrator
+from jira2gus import logger_wrapper
+from jira2gus.migration.migrator_setup import setup_migrator, load_from_properties
 
 def run():
-    
+    # properties.json may set log_level, it is loaded before logging is configured
+    load_from_properties()
+    logger_wrapper.configure_logging()
     migrator = setup_migrator()
     product_tag = os.environ["product_tag"]
     
-    migrator.run(product_tag)
-
-    print ("test")
+    migrator.run(product_tag, os.environ.get("jira_query"), os.environ.get("mapping_key"), os.environ.get("overwrite", "false").lower() == "true")
 
 if __name__ == '__main__':
     run()